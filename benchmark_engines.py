@@ -0,0 +1,100 @@
+"""
+Benchmark: Paddle Inference vs ONNX Runtime cho fast mode (cùng model PP-OCR)
+
+Chạy từng backend trên toàn bộ ảnh trong test_images/ (warm-up 1 ảnh trước khi đo).
+Kết quả Paddle làm chuẩn: CER của ONNX so với Paddle, số dòng khớp, độ trễ từng ảnh.
+
+Số đo được ghi vào <OCR_ONNX_DIR>/benchmark.json (kèm phiên bản paddle / onnxruntime)
+để đưa vào commit / issue khi đổi OCR_BACKEND mặc định.
+
+Usage:
+    python ocr_engine.py export          # lần đầu: export model ONNX
+    python benchmark_engines.py [image_dir]
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from importlib.metadata import version
+
+from ocr_engine import ONNX_MODEL_DIR, char_error_rate, create_engine, resolve_backend, result_text
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+REPORT_FILE = 'benchmark.json'
+
+
+def run_backend(backend, images):
+    engine = create_engine(backend, enable_mkldnn=False)
+    engine.ocr(images[0], cls=False)   # warm-up
+
+    texts, durations = [], []
+    for path in images:
+        start = time.perf_counter()
+        result = engine.ocr(path, cls=False)
+        durations.append(time.perf_counter() - start)
+        texts.append(result_text(result))
+    return texts, durations
+
+
+if __name__ == "__main__":
+    image_dir = sys.argv[1] if len(sys.argv) > 1 else 'test_images'
+    images = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        print(f"❌ No images in {image_dir}")
+        exit(1)
+    if resolve_backend('onnx') != 'onnx':
+        print("❌ ONNX backend unavailable (pip install onnxruntime paddle2onnx && python ocr_engine.py export)")
+        exit(1)
+
+    print("=" * 70)
+    print("🏁 FAST MODE ENGINE BENCHMARK: Paddle Inference vs ONNX Runtime")
+    print("=" * 70)
+    print(f"Images: {image_dir} ({len(images)} files)\n")
+
+    paddle_texts, paddle_times = run_backend('paddle', images)
+    onnx_texts, onnx_times = run_backend('onnx', images)
+
+    print(f"{'Image':44s}{'Paddle (s)':>11s}{'ONNX (s)':>10s}{'CER':>8s}{'Lines':>9s}")
+    print("-" * 82)
+    cers = []
+    for path, p_text, o_text, p_time, o_time in zip(images, paddle_texts, onnx_texts, paddle_times, onnx_times):
+        cer = char_error_rate(p_text, o_text)
+        cers.append(cer)
+        lines = f"{len(o_text.splitlines())}/{len(p_text.splitlines())}"
+        name = os.path.basename(path)
+        name = name if len(name) <= 42 else name[:19] + '…' + name[-22:]
+        print(f"{name:44s}{p_time:>11.2f}{o_time:>10.2f}{cer * 100:>7.2f}%{lines:>9s}")
+
+    identical = sum(p == o for p, o in zip(paddle_texts, onnx_texts))
+    print("\n" + "=" * 70)
+    print(f"{'':28s}{'Paddle':>14s}{'ONNX':>14s}")
+    print(f"{'Mean latency (s)':28s}{statistics.mean(paddle_times):>14.2f}{statistics.mean(onnx_times):>14.2f}")
+    print(f"{'Median latency (s)':28s}{statistics.median(paddle_times):>14.2f}{statistics.median(onnx_times):>14.2f}")
+    print(f"{'Total (s)':28s}{sum(paddle_times):>14.2f}{sum(onnx_times):>14.2f}")
+    print(f"\nSpeedup: {sum(paddle_times) / sum(onnx_times):.2f}x")
+    print(f"Mean CER ONNX vs Paddle: {statistics.mean(cers) * 100:.2f}%  (max {max(cers) * 100:.2f}%)")
+    print(f"Identical output: {identical}/{len(images)} images")
+
+    report = {
+        'images': len(images),
+        'image_dir': image_dir,
+        'cpu': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'paddle': version('paddlepaddle'),
+        'onnxruntime': version('onnxruntime'),
+        'latency_mean': {'paddle': round(statistics.mean(paddle_times), 3),
+                         'onnx': round(statistics.mean(onnx_times), 3)},
+        'latency_median': {'paddle': round(statistics.median(paddle_times), 3),
+                           'onnx': round(statistics.median(onnx_times), 3)},
+        'speedup': round(sum(paddle_times) / sum(onnx_times), 2),
+        'cer_mean': round(statistics.mean(cers), 4),
+        'cer_max': round(max(cers), 4),
+        'identical': identical,
+    }
+    report_path = os.path.join(ONNX_MODEL_DIR, REPORT_FILE)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report: {report_path}")
@@ -4,6 +4,7 @@ from PIL import Image
 from paddleocr import PaddleOCR
 import ollama
 import os
+from grounding_parser import parse_grounding_output
 
 def benchmark_tesseract(image_path):
     """Tesseract OCR - Fastest"""
@@ -39,11 +40,7 @@ def benchmark_deepseek(image_path):
     text = response['message']['content']
     
     # Parse grounding tags
-    import re
-    pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-    matches = re.findall(pattern, text, re.DOTALL)
-    if matches:
-        text = '\n'.join([match[0] for match in matches])
+    text = parse_grounding_output(text)
     
     duration = time.time() - start
     return text, duration
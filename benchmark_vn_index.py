@@ -0,0 +1,204 @@
+"""
+Benchmark: VietnameseIndex (skeleton bỏ dấu) vs SymSpell (delete index, edit distance 2)
+
+Bộ test:
+- Cặp lỗi thật từ learned_vocabulary.json / correction_map.json (từ đơn)
+- Lỗi OCR sinh từ từ điển: mất dấu, sai dấu thanh, j thay i, hoa/thường lẫn lộn, sai 1 chữ cái
+- Từ ĐÚNG không có trong từ điển (text layer của các PDF mẫu / file .txt): mọi thay đổi là sửa sai
+
+Đo: độ chính xác top-1 trên từ lỗi, tỉ lệ sửa sai trên từ đúng, thời gian tra trung bình (µs),
+kích thước index (pickle). Thời gian / kích thước chỉ có ý nghĩa với từ điển lớn.
+
+Usage:
+    python benchmark_vn_index.py [dictionary_path] [clean_text.pdf|.txt ...]
+"""
+import glob
+import json
+import os
+import pickle
+import random
+import re
+import sys
+import time
+import unicodedata
+
+import fitz  # PyMuPDF
+from symspellpy import SymSpell, Verbosity
+
+from text_corrector import load_dictionary
+from vn_index import TONE_MARKS, VietnameseIndex, clear_winner, has_error_signal, skeleton
+
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+# Từ điển nhỏ hơn -> thời gian tra / kích thước index không đại diện cho production
+REPRESENTATIVE_SIZE = 10000
+
+random.seed(42)
+
+
+def strip_marks(word):
+    return skeleton(word)
+
+
+def change_tone(word):
+    decomposed = unicodedata.normalize('NFD', word)
+    tones = [i for i, ch in enumerate(decomposed) if ch in TONE_MARKS]
+    if not tones:
+        # Thêm một dấu thanh sai vào nguyên âm đầu tiên
+        vowels = [i for i, ch in enumerate(decomposed) if ch in 'aeiouy']
+        if not vowels:
+            return None
+        i = vowels[0]
+        return unicodedata.normalize('NFC', decomposed[:i + 1] + '\u0301' + decomposed[i + 1:])
+    i = tones[0]
+    other = random.choice(sorted(TONE_MARKS - {decomposed[i]}))
+    return unicodedata.normalize('NFC', decomposed[:i] + other + decomposed[i + 1:])
+
+
+def i_to_j(word):
+    return word.replace('i', 'j') if 'i' in word else None
+
+
+def random_case(word):
+    i = random.randrange(len(word))
+    return strip_marks(word)[:i] + strip_marks(word)[i].upper() + strip_marks(word)[i + 1:]
+
+
+def substitute_letter(word):
+    if len(word) < 4:
+        return None
+    i = random.randrange(len(word))
+    return word[:i] + random.choice('abcdeghklmnopqrstuvxy') + word[i + 1:]
+
+
+CORRUPTIONS = [strip_marks, change_tone, i_to_j, random_case, substitute_letter]
+
+
+def build_cases(words):
+    """-> [(từ lỗi, từ đúng, loại lỗi)]"""
+    cases = []
+    for path in ('learned_vocabulary.json', 'correction_map.json'):
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for wrong, correct in json.load(f).items():
+                    if ' ' not in wrong and ' ' not in correct and correct.lower() in words:
+                        cases.append((wrong, correct.lower(), 'real'))
+    for word in sorted(words):
+        for corrupt in CORRUPTIONS:
+            wrong = corrupt(word)
+            if wrong and wrong.lower() != word:
+                cases.append((wrong, word, corrupt.__name__))
+    return cases
+
+
+def read_text(path):
+    if path.lower().endswith('.pdf'):
+        with fitz.open(path) as doc:
+            return '\n'.join(page.get_text() for page in doc)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def build_clean_cases(words, sources):
+    """Từ đúng (văn bản thật) không có trong từ điển -> [(từ, từ, 'clean_oov')]"""
+    clean = set()
+    for path in sources:
+        for token in WORD_PATTERN.findall(unicodedata.normalize('NFC', read_text(path))):
+            if token.lower() not in words:
+                clean.add(token)
+    return [(token, token.lower(), 'clean_oov') for token in sorted(clean)]
+
+
+def run(name, lookup, cases, clean_cases):
+    """
+    lookup(token giữ hoa/thường) -> từ sửa (lowercase) hoặc None (giữ nguyên).
+    Từ lỗi: đúng khi trả về từ gốc. Từ đúng: sửa sai khi trả về từ khác.
+    """
+    correct = 0
+    by_kind = {}
+    start = time.perf_counter()
+    results = [lookup(wrong) for wrong, _, _ in cases]
+    clean_results = [lookup(word) for word, _, _ in clean_cases]
+    elapsed = time.perf_counter() - start
+
+    for (wrong, expected, kind), got in zip(cases, results):
+        ok = got == expected
+        correct += ok
+        hit, total = by_kind.get(kind, (0, 0))
+        by_kind[kind] = (hit + ok, total + 1)
+    false_corrections = [(word, got) for (word, expected, _), got in zip(clean_cases, clean_results)
+                         if got is not None and got != expected]
+
+    print(f"\n{name}")
+    print(f"  Accuracy:          {correct}/{len(cases)} ({correct / len(cases) * 100:.1f}%)")
+    for kind, (hit, total) in sorted(by_kind.items()):
+        print(f"    {kind:18s} {hit}/{total}")
+    if clean_cases:
+        print(f"  False corrections: {len(false_corrections)}/{len(clean_cases)} "
+              f"({len(false_corrections) / len(clean_cases) * 100:.1f}%)")
+        if false_corrections:
+            print("    " + ", ".join(f"{word} -> {got}" for word, got in false_corrections[:8]))
+    print(f"  Lookup:            {elapsed / (len(cases) + len(clean_cases)) * 1e6:.1f} µs/word")
+    return correct, len(false_corrections), elapsed
+
+
+if __name__ == "__main__":
+    dictionary_path = sys.argv[1] if len(sys.argv) > 1 else 'vn_dictionary.txt'
+    clean_sources = sys.argv[2:] or sorted(glob.glob('*.pdf'))
+    if not os.path.exists(dictionary_path):
+        print(f"❌ Dictionary not found: {dictionary_path}")
+        exit(1)
+
+    print("=" * 70)
+    print("🏁 VIETNAMESE CORRECTION INDEX BENCHMARK")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    index = VietnameseIndex.from_dictionary(dictionary_path)
+    index_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+    load_dictionary(sym_spell, dictionary_path)
+    symspell_build = time.perf_counter() - start
+
+    cases = build_cases(set(index.words))
+    clean_cases = build_clean_cases(set(index.words), clean_sources)
+    print(f"Dictionary: {dictionary_path} ({len(index)} words), {len(cases)} corrupted words, "
+          f"{len(clean_cases)} correct out-of-dictionary words")
+
+    def symspell_lookup(word):
+        suggestions = sym_spell.lookup(word.lower(), Verbosity.TOP, max_edit_distance=2)
+        return suggestions[0].term if suggestions else None
+
+    def symspell_guarded_lookup(word):
+        """Cùng điều kiện sửa với VietnameseIndex.lookup: tín hiệu lỗi + ứng viên thắng rõ"""
+        lower = word.lower()
+        if lower in sym_spell.words:
+            return lower
+        if not has_error_signal(word):
+            return None
+        suggestions = sym_spell.lookup(lower, Verbosity.CLOSEST, max_edit_distance=2)
+        return clear_winner([(s.term, s.distance, s.count) for s in suggestions])
+
+    vn_correct, vn_false, vn_time = run("⚡ VietnameseIndex (skeleton + guard)", index.lookup, cases, clean_cases)
+    ss_correct, ss_false, ss_time = run("🔤 SymSpell (edit distance 2)", symspell_lookup, cases, clean_cases)
+    sg_correct, sg_false, sg_time = run("🛡️ SymSpell + guard", symspell_guarded_lookup, cases, clean_cases)
+
+    total = len(cases) + len(clean_cases)
+    clean_total = max(len(clean_cases), 1)
+    vn_size = len(pickle.dumps((index.words, dict(index.skeletons), dict(index.deletes))))
+    ss_size = len(pickle.dumps((sym_spell._words, sym_spell._deletes)))
+
+    print("\n" + "=" * 70)
+    print(f"{'':28s}{'VietnameseIndex':>18s}{'SymSpell':>14s}{'SymSpell+guard':>16s}")
+    print(f"{'Accuracy (corrupted)':28s}{vn_correct / len(cases) * 100:>17.1f}%"
+          f"{ss_correct / len(cases) * 100:>13.1f}%{sg_correct / len(cases) * 100:>15.1f}%")
+    print(f"{'False corrections (clean)':28s}{vn_false / clean_total * 100:>17.1f}%"
+          f"{ss_false / clean_total * 100:>13.1f}%{sg_false / clean_total * 100:>15.1f}%")
+    print(f"{'Lookup (µs/word)':28s}{vn_time / total * 1e6:>18.1f}{ss_time / total * 1e6:>14.1f}"
+          f"{sg_time / total * 1e6:>16.1f}")
+    print(f"{'Build (ms)':28s}{index_build * 1000:>18.1f}{symspell_build * 1000:>14.1f}")
+    print(f"{'Index size (KB)':28s}{vn_size / 1024:>18.1f}{ss_size / 1024:>14.1f}")
+    print(f"{'Index keys':28s}{len(index.skeletons) + len(index.deletes):>18d}{len(sym_spell._deletes):>14d}")
+    if len(index) < REPRESENTATIVE_SIZE:
+        print(f"⚠️ {len(index)} words < {REPRESENTATIVE_SIZE}: lookup time / build / size are not representative")
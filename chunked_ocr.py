@@ -5,6 +5,10 @@ import time
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+from generation_guard import guarded_chat, merge_generation_stats
+from model_manager import get_model_manager
+from grounding_parser import parse_grounding_output, parse_grounding_lines
+from ocr_layout import OcrLayout
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
@@ -21,10 +25,13 @@ class ChunkedOCR:
     - Scalable với nhiều CPU cores
     """
     
-    def __init__(self, model_name="deepseek-ocr", keep_alive="60m"):
+    def __init__(self, model_name="deepseek-ocr", keep_alive="60m", model_manager=None):
         self.client = ollama.Client(host='http://127.0.0.1:11434')
         self.model_name = model_name
-        self.keep_alive = keep_alive
+        self.models = model_manager or get_model_manager()
+        self.models.register_ollama(model_name, keep_alive=keep_alive)
+        self.last_generation_stats = None
+        self.last_layout = None
         logging.info(f"🚀 Chunked OCR initialized: {self.model_name}")
     
     def split_image(self, image_path, rows=2, cols=2):
@@ -66,7 +73,8 @@ class ChunkedOCR:
                 chunks.append({
                     'bytes': chunk_bytes,
                     'position': (row, col),
-                    'bounds': (left, top, right, bottom)
+                    'bounds': (left, top, right, bottom),
+                    'page_size': (width, height)
                 })
                 
                 logging.info(f"  ✂️  Chunk [{row},{col}]: {right-left}×{bottom-top}px")
@@ -76,30 +84,37 @@ class ChunkedOCR:
     def ocr_chunk(self, chunk_data, chunk_id):
         """OCR một chunk"""
         try:
-            response = self.client.chat(
-                model=self.model_name,
+            text, stats = guarded_chat(
+                self.client,
+                self.model_name,
                 messages=[{
                     'role': 'user',
                     'content': 'Free OCR.',
                     'images': [chunk_data['bytes']]
                 }],
                 options={'temperature': 0.0},
-                keep_alive=self.keep_alive
+                keep_alive=self.models.keep_alive(self.model_name),
+                image=chunk_data['bytes']
             )
             
-            text = response['message']['content']
+            # Boxes theo toạ độ trang (cộng offset của chunk)
+            left, top, right, bottom = chunk_data['bounds']
+            layout = OcrLayout.from_grounding(
+                parse_grounding_lines(text),
+                *chunk_data['page_size'],
+                offset=(left, top),
+                region_size=(right - left, bottom - top)
+            )
             
             # Parse grounding tags if any
-            import re
-            pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-            matches = re.findall(pattern, text, re.DOTALL)
-            if matches:
-                text = '\n'.join([match[0] for match in matches])
+            text = parse_grounding_output(text)
             
             return {
                 'chunk_id': chunk_id,
                 'position': chunk_data['position'],
-                'text': text
+                'text': text,
+                'layout': layout,
+                'generation': stats
             }
             
         except Exception as e:
@@ -107,7 +122,9 @@ class ChunkedOCR:
             return {
                 'chunk_id': chunk_id,
                 'position': chunk_data['position'],
-                'text': ''
+                'text': '',
+                'layout': None,
+                'generation': None
             }
     
     def merge_results(self, chunk_results, rows, cols):
@@ -160,6 +177,7 @@ class ChunkedOCR:
         logging.info(f"✂️  Splitting into {rows}×{cols} = {rows*cols} chunks")
         
         start_time = time.time()
+        self.models.get(self.model_name)   # Một request cho keep_alive thích ứng (không tính theo chunk)
         
         # Step 1: Split image
         chunks = self.split_image(image_path, rows, cols)
@@ -190,9 +208,17 @@ class ChunkedOCR:
         ocr_time = time.time()
         logging.info(f"⏱️  OCR time: {ocr_time - split_time:.2f}s\n")
         
+        self.last_generation_stats = merge_generation_stats(
+            [r['generation'] for r in chunk_results if r['generation']]
+        )
+        logging.info(f"🔢 Tokens generated: {self.last_generation_stats['tokens_generated']}, "
+                     f"saved: {self.last_generation_stats['tokens_saved']}")
+        
         # Step 3: Merge results
         logging.info("🔗 Merging chunks...")
         merged_text = self.merge_results(chunk_results, rows, cols)
+        # Layout toàn trang theo thứ tự đọc (cho region re-OCR / layout-aware merging)
+        self.last_layout = OcrLayout.concat([r['layout'] for r in chunk_results]).reading_order()
         
         total_time = time.time() - start_time
         
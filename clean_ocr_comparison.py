@@ -11,18 +11,14 @@ from paddleocr import PaddleOCR
 import ollama
 import time
 import os
-import re
+from grounding_parser import parse_grounding_output
 
 TEST_IMAGE = "unnamed.jpg"
 PROMPT = "Free OCR."  # Cùng prompt cho tất cả
 
 def parse_grounding_tags(text):
     """Remove grounding tags"""
-    pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-    matches = re.findall(pattern, text, re.DOTALL)
-    if matches:
-        return '\n'.join([match[0] for match in matches])
-    return text
+    return parse_grounding_output(text)
 
 def test_tesseract(image_path):
     print("\n" + "="*70)
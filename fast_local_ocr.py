@@ -3,8 +3,9 @@ import time
 import cv2
 import json
 import logging
-from paddleocr import PaddleOCR
-from symspellpy import SymSpell
+from ocr_engine import create_engine
+from text_corrector import TextCorrector
+from paddle_batch import BatchOCR
 try:
     import ollama
     HAS_OLLAMA = True
@@ -15,7 +16,7 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class LocalOCR:
-    def __init__(self, dictionary_path='vn_dictionary.txt', use_ollama=False):
+    def __init__(self, dictionary_path='vn_dictionary.txt', use_ollama=False, backend=None):
         self.use_ollama = use_ollama
         
         logging.info("🚀 Initializing Local OCR Pro Max...")
@@ -23,46 +24,89 @@ class LocalOCR:
         
         # 1. Load OCR Engine (In-Memory)
         # use_angle_cls=False for speed
-        # enable_mkldnn=True for CPU Optimization
-        self.ocr = PaddleOCR(use_angle_cls=False, lang='vi', use_gpu=False, enable_mkldnn=True, show_log=False, ocr_version='PP-OCRv4')
+        # enable_mkldnn=True for CPU Optimization (Paddle backend)
+        # backend: 'paddle' | 'onnx' (None = OCR_BACKEND)
+        self.ocr = create_engine(backend, enable_mkldnn=True, ocr_version='PP-OCRv4')
         
-        # 2. Load Dictionary (In-Memory)
-        self.sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
-        if os.path.exists(dictionary_path):
-            self.sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1, separator=" ", encoding="utf-8")
-            logging.info(f"✅ Dictionary loaded: {dictionary_path}")
-        else:
-            logging.warning("⚠️ Dictionary not found. Corrections might be weak.")
+        # 2. Load Dictionary (lexicon artifact mmap, dùng chung RAM giữa các process)
+        # Correction có cache, bỏ qua dòng confidence cao
+        self.corrector = TextCorrector.from_lexicon(dictionary_path=dictionary_path)
+        self.last_timing = None
+        # Batch API (bulk job): recognition gom crop của nhiều trang
+        self.batch_ocr = BatchOCR(self.ocr)
             
         logging.info(f"⚡ Initialization complete in {time.time() - start_init:.2f}s")
 
-    def _ocr_raw(self, img_path):
-        """Standard raw OCR extraction"""
+    def _ocr_lines(self, img_path):
+        """Raw OCR extraction -> list[(text, confidence)]"""
         start = time.time()
-        result = self.ocr.ocr(img_path, cls=False)
+        # Detection hai độ phân giải (xem paddle_batch.BatchOCR)
+        result = self.batch_ocr.ocr(img_path)
+        logging.info(f"📷 OCR Raw Processing time: {time.time() - start:.2f}s")
+        return self._result_lines(result)
+
+    @staticmethod
+    def _result_lines(result):
         if not result or not result[0]:
             return []
         
         # Sort top-to-bottom
         lines = sorted(result[0], key=lambda x: x[0][1])
-        text_lines = [line[1][0] for line in lines]
-        logging.info(f"📷 OCR Raw Processing time: {time.time() - start:.2f}s")
-        return text_lines
+        return [(line[1][0], line[1][1]) for line in lines]
+
+    def ocr_lines_batch(self, img_paths, batch_pages=8):
+        """
+        Bulk OCR: detection từng trang, recognition chung cho batch_pages trang.
+
+        Yields:
+            (img_path, list[(text, confidence)]) - None nếu ảnh lỗi
+        """
+        img_paths = list(img_paths)
+        for i in range(0, len(img_paths), batch_pages):
+            chunk = img_paths[i:i + batch_pages]
+            start = time.time()
+            try:
+                results = self.batch_ocr.ocr_batch(chunk)
+            except Exception as e:
+                # Một ảnh hỏng không làm hỏng cả batch -> chạy lại từng ảnh
+                logging.warning(f"⚠️ Batch OCR failed ({e}), retrying one by one")
+                for img_path in chunk:
+                    try:
+                        yield img_path, self._ocr_lines(img_path)
+                    except Exception as e:
+                        logging.error(f"❌ OCR failed for {img_path}: {e}")
+                        yield img_path, None
+                continue
+            timing = self.batch_ocr.last_timing
+            logging.info(f"📷 Batch OCR: {len(chunk)} pages, {timing['crops']} lines in {time.time() - start:.2f}s "
+                         f"(det {timing['detection']:.2f}s, rec {timing['recognition']:.2f}s)")
+            for img_path, result in zip(chunk, results):
+                yield img_path, self._result_lines(result)
+
+    def ocr_raw_batch(self, img_paths, batch_pages=8):
+        """Như ocr_lines_batch() nhưng chỉ lấy text"""
+        for img_path, lines in self.ocr_lines_batch(img_paths, batch_pages):
+            yield img_path, [text for text, _ in lines] if lines is not None else None
+
+    def _ocr_raw(self, img_path):
+        """Standard raw OCR extraction"""
+        return [text for text, _ in self._ocr_lines(img_path)]
 
     def process_fast(self, img_path):
         """
         Hot Path: OCR + SymSpell (Speed Focus)
         Best for: Real-time scanning, simple docs
         """
-        raw_lines = self._ocr_raw(img_path)
+        start = time.time()
+        raw_lines = self._ocr_lines(img_path)
+        ocr_time = time.time() - start
         
-        corrected_lines = []
-        for line in raw_lines:
-            suggestions = self.sym_spell.lookup_compound(line, max_edit_distance=2)
-            if suggestions:
-                corrected_lines.append(suggestions[0].term)
-            else:
-                corrected_lines.append(line)
+        corrected_lines, page_stats = self.corrector.correct_page([text for text, _ in raw_lines],
+                                                                  [score for _, score in raw_lines])
+        self.last_timing = {'ocr': round(ocr_time, 3), 'correction': page_stats['duration'],
+                            'lines_skipped': page_stats['skipped']}
+        logging.info(f"✍️ Correction time: {page_stats['duration']:.3f}s "
+                     f"({page_stats['skipped']}/{page_stats['lines']} lines skipped)")
         
         return "\n".join(corrected_lines)
 
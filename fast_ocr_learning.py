@@ -2,6 +2,7 @@ import json
 import os
 import time
 from paddleocr import PaddleOCR
+from paddle_batch import BatchOCR
 import difflib
 
 class FastOCRLearning:
@@ -12,6 +13,7 @@ class FastOCRLearning:
         # lang='vi', use_angle_cls=True
         print("Initializing PaddleOCR...")
         self.ocr = PaddleOCR(use_angle_cls=True, lang='vi', show_log=False) 
+        self.batch_ocr = None
 
     def _load_map(self):
         if os.path.exists(self.map_file):
@@ -69,6 +71,31 @@ class FastOCRLearning:
             print("No text detected.")
             return
 
+        final_text = self._format_result(result)
+        
+        end_time = time.time()
+        print(f"Total time: {end_time - start_time:.2f} seconds")
+        
+        return final_text
+
+    def process_images(self, img_paths, batch_pages=8):
+        """
+        Bulk mode: recognition gom dòng của nhiều ảnh (BatchOCR).
+
+        Yields:
+            (img_path, final_text) - None nếu không đọc được / không có chữ
+        """
+        if self.batch_ocr is None:
+            self.batch_ocr = BatchOCR(self.ocr, cls=True)
+
+        start_time = time.time()
+        count = 0
+        for img_path, result in self.batch_ocr.iter_ocr(img_paths, batch_pages):
+            count += 1
+            yield img_path, self._format_result(result) if result and result[0] else None
+        print(f"Total time: {time.time() - start_time:.2f} seconds for {count} images")
+
+    def _format_result(self, result):
         blocks = []
         for line in result[0]:
             text_content = line[1][0]
@@ -89,12 +116,7 @@ class FastOCRLearning:
         sorted_lines = self._smart_sort(blocks)
         
         # 4. Format Output
-        final_text = self._format_layout(sorted_lines)
-        
-        end_time = time.time()
-        print(f"Total time: {end_time - start_time:.2f} seconds")
-        
-        return final_text
+        return self._format_layout(sorted_lines)
 
     def _smart_sort(self, blocks):
         # Sắp xếp theo Y
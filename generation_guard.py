@@ -0,0 +1,281 @@
+"""
+Generation Guard cho DeepSeek-OCR (Ollama)
+
+DeepSeek-OCR thỉnh thoảng rơi vào vòng lặp (repetition loop) trên ảnh scan nhiễu:
+cùng một dòng / một cụm token được sinh lại liên tục tới khi hết context.
+Module này chuyển mọi lời gọi sang streaming, theo dõi luồng token và:
+1. Phát hiện n-gram lặp lại suy biến (degenerate repetition)
+2. Phát hiện độ dài vượt xa lượng chữ ước lượng của ảnh (runaway length)
+3. Huỷ request ngay khi phát hiện và cắt bỏ phần lặp ở đuôi
+"""
+import io
+import logging
+import re
+import time
+
+import numpy as np
+from PIL import Image
+
+# DeepSeek-OCR context là 8192 token -> dùng làm trần cứng cho num_predict
+DEFAULT_MAX_TOKENS = 8192
+
+DET_TAG_PATTERN = re.compile(r'<\|det\|\>.*?<\|/det\|\>', re.DOTALL)
+TAG_PATTERN = re.compile(r'<\|/?\w+\|\>')
+
+
+def estimate_text_chars(image, probe_width=1024):
+    """
+    Ước lượng số ký tự trong ảnh bằng horizontal projection profile.
+
+    Args:
+        image: Đường dẫn ảnh, bytes hoặc PIL.Image
+
+    Returns:
+        (estimated_chars, estimated_lines)
+    """
+    if isinstance(image, Image.Image):
+        img = image
+    elif isinstance(image, (bytes, bytearray)):
+        img = Image.open(io.BytesIO(image))
+    else:
+        img = Image.open(image)
+
+    img = img.convert('L')
+    width, height = img.size
+    if width > probe_width:
+        img = img.resize((probe_width, max(1, int(height * probe_width / width))))
+
+    gray = np.asarray(img, dtype=np.uint8)
+    ink = gray < gray.mean() * 0.75
+
+    # Hàng có mực = hàng thuộc một dòng chữ
+    text_rows = ink.sum(axis=1) > max(1, ink.shape[1] // 100)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], text_rows.astype(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+
+    chars = 0.0
+    lines = 0
+    for start, end in zip(starts, ends):
+        line_height = end - start
+        if line_height < 2:
+            continue
+        cols = np.flatnonzero(ink[start:end].any(axis=0))
+        span = cols[-1] - cols[0] + 1
+        # Bề rộng một ký tự ~ 0.55 chiều cao dòng
+        chars += span / (0.55 * line_height)
+        lines += 1
+
+    return int(chars), lines
+
+
+def estimate_token_budget(image, length_factor=3.0, min_tokens=1024, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Ngân sách token hợp lý cho một ảnh: lượng chữ ước lượng × hệ số an toàn.
+    Mỗi dòng grounding (<|ref|>..<|det|>[[..]]<|/det|>) tốn thêm ~24 token.
+    """
+    try:
+        chars, lines = estimate_text_chars(image)
+    except Exception as e:
+        logging.warning(f"⚠️ Text estimate failed, using max budget: {e}")
+        return max_tokens
+
+    expected_tokens = chars * 0.6 + lines * 24
+    return int(min(max_tokens, max(min_tokens, expected_tokens * length_factor)))
+
+
+class RepetitionGuard:
+    """
+    Theo dõi luồng token và phát hiện vòng lặp.
+
+    - Token-level: đuôi chuỗi là một n-gram (n <= max_ngram) lặp >= min_repeats lần
+      và tổng độ dài đoạn lặp >= min_span token
+    - Line-level: cùng một dòng (bỏ toạ độ det) lặp liên tiếp >= max_line_repeats lần
+    - Length: vượt token_budget
+    """
+
+    def __init__(self, max_ngram=48, min_repeats=4, min_span=64,
+                 max_line_repeats=6, token_budget=None):
+        self.max_ngram = max_ngram
+        self.min_repeats = min_repeats
+        self.min_span = min_span
+        self.max_line_repeats = max_line_repeats
+        self.token_budget = token_budget
+
+        self.tokens = []
+        self.reason = None
+        self._trim_to = None
+
+        self._current_line = []
+        self._last_line = None
+        self._line_repeats = 0
+        self._first_repeat_start = None
+        self._last_line_end = 0
+
+    def feed(self, token):
+        """Thêm một token. Trả về lý do dừng (str) hoặc None."""
+        if self.reason:
+            return self.reason
+
+        self.tokens.append(token)
+
+        if '\n' in token:
+            self._check_line(token)
+        else:
+            self._current_line.append(token)
+
+        if not self.reason:
+            self._check_ngram()
+
+        if not self.reason and self.token_budget and len(self.tokens) > self.token_budget:
+            self.reason = f"length>{self.token_budget}"
+            self._trim_to = len(self.tokens)
+
+        return self.reason
+
+    def _check_line(self, token):
+        head, _, tail = token.partition('\n')
+        self._current_line.append(head)
+        line = TAG_PATTERN.sub('', DET_TAG_PATTERN.sub('', ''.join(self._current_line))).strip()
+        self._current_line = [tail] if tail else []
+
+        if not line:
+            return
+
+        if line == self._last_line:
+            self._line_repeats += 1
+            if self._line_repeats == 2:
+                # Vị trí kết thúc lần xuất hiện đầu tiên = điểm cắt
+                self._first_repeat_start = self._last_line_end
+            if self._line_repeats >= self.max_line_repeats:
+                self.reason = f"line_repeat×{self._line_repeats}"
+                self._trim_to = self._first_repeat_start
+        else:
+            self._last_line = line
+            self._line_repeats = 1
+        self._last_line_end = len(self.tokens)
+
+    def _check_ngram(self):
+        tokens = self.tokens
+        total = len(tokens)
+        last = tokens[-1]
+
+        for n in range(1, self.max_ngram + 1):
+            if total < n * self.min_repeats:
+                break
+            # Lọc nhanh: token cuối phải trùng token cách n vị trí
+            if total <= n or tokens[-1 - n] != last:
+                continue
+
+            tail = tokens[total - n:]
+            repeats = 1
+            while (repeats + 1) * n <= total and tokens[total - (repeats + 1) * n:total - repeats * n] == tail:
+                repeats += 1
+
+            if repeats >= self.min_repeats and repeats * n >= self.min_span:
+                self.reason = f"ngram_repeat(n={n}×{repeats})"
+                # Giữ lại một bản của n-gram
+                self._trim_to = total - (repeats - 1) * n
+                return
+
+    @property
+    def trimmed_tokens(self):
+        """Số token bị cắt bỏ ở đuôi"""
+        if self._trim_to is None:
+            return 0
+        return len(self.tokens) - self._trim_to
+
+    def text(self):
+        """Văn bản đã cắt phần lặp"""
+        end = self._trim_to if self._trim_to is not None else len(self.tokens)
+        return ''.join(self.tokens[:end])
+
+
+def guarded_chat(client, model, messages, options=None, keep_alive=None,
+                 image=None, max_tokens=DEFAULT_MAX_TOKENS, guard=None,
+                 on_token=None, cancel_event=None):
+    """
+    Gọi client.chat ở chế độ stream với repetition guard.
+
+    Args:
+        client: ollama.Client (hoặc module ollama)
+        image: Ảnh (path/bytes) dùng để ước lượng ngân sách token. None = chỉ dùng max_tokens
+        max_tokens: Trần cứng, được truyền xuống Ollama qua num_predict
+        on_token: Callback(token) cho từng token hợp lệ
+        cancel_event: threading.Event để huỷ từ bên ngoài
+
+    Returns:
+        (content, stats) với stats gồm tokens_generated, tokens_saved, aborted, reason
+    """
+    options = dict(options or {})
+    options['num_predict'] = max_tokens
+
+    if guard is None:
+        budget = estimate_token_budget(image, max_tokens=max_tokens) if image is not None else None
+        guard = RepetitionGuard(token_budget=budget)
+
+    kwargs = {'model': model, 'messages': messages, 'options': options, 'stream': True}
+    if keep_alive is not None:
+        kwargs['keep_alive'] = keep_alive
+
+    start = time.time()
+    eval_count = None
+    stream = client.chat(**kwargs)
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                guard.reason = guard.reason or "cancelled"
+                break
+
+            token = chunk['message']['content']
+            if token:
+                if guard.feed(token):
+                    break
+                if on_token:
+                    on_token(token)
+
+            if chunk.get('done'):
+                eval_count = chunk.get('eval_count')
+    except Exception:
+        # Huỷ từ bên ngoài bằng cách đóng connection -> stream raise lỗi đọc
+        if cancel_event is None or not cancel_event.is_set():
+            raise
+        guard.reason = guard.reason or "cancelled"
+    finally:
+        # Đóng stream = đóng HTTP connection -> Ollama dừng sinh token
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+    generated = eval_count or len(guard.tokens)
+    aborted = guard.reason is not None
+    stats = {
+        'tokens_generated': generated,
+        # Phần ngân sách num_predict không phải sinh nữa nhờ dừng sớm
+        'tokens_saved': max(0, max_tokens - generated) if aborted else 0,
+        'tokens_trimmed': guard.trimmed_tokens,
+        'token_budget': guard.token_budget,
+        'aborted': aborted,
+        'reason': guard.reason,
+        'duration': round(time.time() - start, 2),
+    }
+
+    if aborted:
+        logging.warning(
+            f"✂️ Generation stopped ({guard.reason}): {generated} tokens generated, "
+            f"~{stats['tokens_saved']} saved, {stats['tokens_trimmed']} trimmed"
+        )
+    else:
+        logging.info(f"🔢 Tokens generated: {generated}")
+
+    return guard.text(), stats
+
+
+def merge_generation_stats(stats_list):
+    """Gộp stats của nhiều lần gọi (multi-page PDF, chunks)"""
+    return {
+        'tokens_generated': sum(s['tokens_generated'] for s in stats_list),
+        'tokens_saved': sum(s['tokens_saved'] for s in stats_list),
+        'tokens_trimmed': sum(s['tokens_trimmed'] for s in stats_list),
+        'aborted': sum(1 for s in stats_list if s['aborted']),
+        'calls': len(stats_list),
+    }
@@ -0,0 +1,148 @@
+"""
+Grounding Parser cho output của DeepSeek-OCR
+
+Output có dạng: <|ref|>nội dung<|/ref|><|det|>[[x1, y1, x2, y2]]<|/det|>
+(toạ độ chuẩn hoá 0-999 theo kích thước ảnh).
+
+- parse_grounding_output(): parse toàn bộ response (thay cho regex copy-paste cũ)
+- GroundingStreamParser: parse tăng dần trên token stream của Ollama,
+  trả về từng dòng + det boxes ngay khi tag đóng
+"""
+import re
+from collections import namedtuple
+
+REF_OPEN = '<|ref|>'
+REF_CLOSE = '<|/ref|>'
+DET_OPEN = '<|det|>'
+DET_CLOSE = '<|/det|>'
+
+GROUNDING_PATTERN = re.compile(r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>', re.DOTALL)
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+GroundingLine = namedtuple('GroundingLine', ['text', 'boxes'])
+
+
+def parse_det_boxes(det_content):
+    """'[[10, 20, 300, 40], [..]]' -> [[10, 20, 300, 40], ...]"""
+    numbers = [float(n) for n in NUMBER_PATTERN.findall(det_content)]
+    return [numbers[i:i + 4] for i in range(0, len(numbers) - 3, 4)]
+
+
+def parse_grounding_output(raw_output):
+    """Parse grounding tags -> clean text (giữ nguyên raw nếu không có tag)"""
+    matches = GROUNDING_PATTERN.findall(raw_output)
+    clean_text = '\n'.join(match[0] for match in matches)
+    return clean_text if clean_text else raw_output
+
+
+def parse_grounding_lines(raw_output, corrector=None):
+    """Parse toàn bộ response -> list[GroundingLine]"""
+    parser = GroundingStreamParser(corrector=corrector)
+    lines = parser.feed(raw_output)
+    lines.extend(parser.close())
+    return lines
+
+
+class GroundingStreamParser:
+    """
+    Parser tăng dần cho token stream.
+
+    Usage:
+        parser = GroundingStreamParser(corrector=ocr._apply_vocabulary_corrections)
+        for token in stream:
+            for line in parser.feed(token):
+                handle(line.text, line.boxes)
+        for line in parser.close():
+            handle(line.text, line.boxes)
+
+    Nếu model trả về văn bản thường (không có tag), mỗi dòng hoàn chỉnh được
+    emit với boxes rỗng.
+    """
+
+    def __init__(self, corrector=None):
+        self.corrector = corrector
+        self.buffer = ''
+        self.lines = []
+
+    def _emit(self, text, boxes, out):
+        text = text.strip()
+        if not text:
+            return
+        if self.corrector:
+            text = self.corrector(text)
+        line = GroundingLine(text, boxes)
+        self.lines.append(line)
+        out.append(line)
+
+    def _emit_plain(self, text, out):
+        for part in text.split('\n'):
+            self._emit(part, [], out)
+
+    def feed(self, chunk):
+        """Thêm token/chunk. Trả về các dòng vừa hoàn chỉnh."""
+        self.buffer += chunk
+        out = []
+
+        while self.buffer:
+            ref_start = self.buffer.find(REF_OPEN)
+
+            if ref_start == -1:
+                # Văn bản thường: chỉ emit tới newline cuối (tag không chứa newline,
+                # nên phần tag dở dang nếu có luôn nằm sau điểm cắt)
+                cut = self.buffer.rfind('\n')
+                if cut == -1:
+                    break
+                self._emit_plain(self.buffer[:cut], out)
+                self.buffer = self.buffer[cut + 1:]
+                continue
+
+            if ref_start > 0:
+                self._emit_plain(self.buffer[:ref_start], out)
+                self.buffer = self.buffer[ref_start:]
+                continue
+
+            ref_end = self.buffer.find(REF_CLOSE)
+            if ref_end == -1:
+                break
+            text = self.buffer[len(REF_OPEN):ref_end]
+            rest = self.buffer[ref_end + len(REF_CLOSE):]
+            stripped = rest.lstrip()
+
+            if not stripped:
+                break
+            if not stripped.startswith(DET_OPEN):
+                if DET_OPEN.startswith(stripped):
+                    break  # '<|de' -> chờ thêm token
+                # ref không kèm det
+                self._emit(text, [], out)
+                self.buffer = rest
+                continue
+
+            det_end = stripped.find(DET_CLOSE)
+            if det_end == -1:
+                break
+            boxes = parse_det_boxes(stripped[len(DET_OPEN):det_end])
+            self._emit(text, boxes, out)
+            self.buffer = stripped[det_end + len(DET_CLOSE):]
+
+        return out
+
+    def close(self):
+        """Kết thúc stream: flush phần còn lại trong buffer"""
+        out = []
+        remaining = self.buffer
+        self.buffer = ''
+        if remaining.startswith(REF_OPEN):
+            # Tag bị cắt giữa chừng (ví dụ generation bị dừng) -> giữ phần text
+            text = remaining[len(REF_OPEN):].split(REF_CLOSE)[0]
+            self._emit(text, [], out)
+        else:
+            self._emit_plain(remaining, out)
+        return out
+
+    @property
+    def has_grounding(self):
+        return any(line.boxes for line in self.lines)
+
+    def text(self):
+        return '\n'.join(line.text for line in self.lines)
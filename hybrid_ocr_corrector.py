@@ -1,40 +1,37 @@
+import asyncio
 import os
 import time
 import cv2
-from paddleocr import PaddleOCR
-from symspellpy import SymSpell, Verbosity
+from ocr_engine import create_engine
+from text_corrector import TextCorrector
+from tile_pipeline import TilePipeline, iter_fixed_tiles, plan_gutter_tiles
 
 class HybridOCR:
-    def __init__(self, dictionary_path='vn_dictionary.txt'):
+    def __init__(self, dictionary_path='vn_dictionary.txt', ocr_provider=None):
         print("⚡ Initializing Engines...")
         
-        # 1. OCR Engine
-        self.ocr = PaddleOCR(use_angle_cls=False, lang='vi')
+        # 1. OCR Engine (ocr_provider: Callable() -> PaddleOCR dùng chung, None = tạo riêng)
+        if ocr_provider is None:
+            engine = create_engine(use_angle_cls=False)
+            ocr_provider = lambda: engine
+        self.ocr_provider = ocr_provider
         
-        # 2. Correction Engine (SymSpell)
-        # max_dictionary_edit_distance=2 cho phép sai tối đa 2 ký tự (đủ để sửa dấu)
-        self.sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
-        
-        # Load dictionary
-        if os.path.exists(dictionary_path):
-            # Term index is the column of the term and count index is the column of the term frequency
-            self.sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1, separator=" ", encoding="utf-8")
-            print("✅ Dictionary Loaded.")
-        else:
-            print("⚠️ Warning: Dictionary file not found.")
+        # 2. Correction Engine (SymSpell có cache theo dòng/từ)
+        # max_edit_distance=2 cho phép sai tối đa 2 ký tự (đủ để sửa dấu)
+        self.corrector = TextCorrector.from_lexicon(dictionary_path=dictionary_path, max_edit_distance=2)
 
-    def correct_text(self, text):
+    def correct_text(self, text, confidence=None):
         """
         Sửa lỗi chính tả sử dụng SymSpell
+        (bỏ qua dòng confidence cao, từ đã có trong từ điển; kết quả được cache)
         """
-        # lookup_compound hỗ trợ sửa lỗi trong cả câu dài (chia từ tự động)
-        suggestions = self.sym_spell.lookup_compound(text, max_edit_distance=2)
-        if suggestions:
-            # suggestions[0].term chứa câu đã sửa
-            return suggestions[0].term
-        return text
-
-    def process_tiled_stream(self, img_path, tile_height=1000, overlap=100):
+        return self.corrector.correct(text, confidence)
+
+    @property
+    def ocr(self):
+        return self.ocr_provider()
+
+    def process_tiled_stream(self, img_path, tile_height=1000, overlap=100, snap_to_gutters=True):
         if not os.path.exists(img_path):
             yield f"Error: {img_path} not found."
             return
@@ -47,48 +44,85 @@ class HybridOCR:
             yield "Error reading image."
             return
             
-        h, w, _ = img.shape
+        # Dây chuyền: cắt tile | PaddleOCR | SymSpell chạy trên các thread riêng
+        pipeline, tiles = self._build_pipeline(img, tile_height, overlap, snap_to_gutters)
+        for line in pipeline.run(img, tiles):
+            yield line
+
+        yield f"\n✅ Done in {time.time() - start_time:.2f}s"
+
+    async def aprocess_tiled_stream(self, img_path, tile_height=1000, overlap=100, snap_to_gutters=True,
+                                    executor=None, progress=True):
+        """
+        Bản async của process_tiled_stream(): PaddleOCR chạy trong inference executor
+        dùng chung, SymSpell trong default executor, event loop không bị block.
+
+        progress=False: chỉ yield các dòng text (lỗi -> raise)
+        """
+        if not os.path.exists(img_path):
+            if not progress:
+                raise FileNotFoundError(img_path)
+            yield f"Error: {img_path} not found."
+            return
+
+        if progress:
+            yield f"🚀 Processing {img_path} with Hybrid Correction...\n"
+        start_time = time.time()
+
+        loop = asyncio.get_running_loop()
+        img = await loop.run_in_executor(None, cv2.imread, img_path)
+        if img is None:
+            if not progress:
+                raise ValueError(f"Error reading image: {img_path}")
+            yield "Error reading image."
+            return
+
+        pipeline, tiles = await loop.run_in_executor(
+            None, self._build_pipeline, img, tile_height, overlap, snap_to_gutters)
+        async for line in pipeline.arun(img, tiles, executor):
+            yield line
+
+        if progress:
+            yield f"\n✅ Done in {time.time() - start_time:.2f}s"
+
+    def _build_pipeline(self, img, tile_height, overlap, snap_to_gutters):
+        # Cắt tại khe trắng giữa các dòng (overlap chỉ khi không có khe)
+        if snap_to_gutters:
+            tiles = plan_gutter_tiles(img, tile_height, overlap)
+        else:
+            tiles = iter_fixed_tiles(img.shape[0], tile_height, overlap)
+
+        engine = self.ocr
+        pipeline = TilePipeline(
+            ocr_fn=lambda tile_img: engine.ocr(tile_img, cls=False),
+            group_fn=self._group_tile_lines,
+            correct_fn=self._process_line
+        )
+        return pipeline, tiles
+
+    def _group_tile_lines(self, lines):
+        # Toạ độ toàn trang, vùng overlap đã được NMS trong TilePipeline
+        buffers = []
+        blocks = sorted(lines, key=lambda x: x[0][0][1])
         
-        current_y = 0
+        line_buffer = []
+        curr_line_y = -1
         
-        while current_y < h:
-            y_end = min(current_y + tile_height, h)
-            y_start = max(0, current_y - overlap) if current_y > 0 else 0
-            
-            tile_img = img[y_start:y_end, 0:w]
-            
-            # OCR
-            result = self.ocr.ocr(tile_img, cls=True)
-            
-            if result and result[0]:
-                blocks = sorted(result[0], key=lambda x: x[0][1])
+        for line in blocks:
+            text_content = line[1][0]
+            global_y = line[0][0][1]
                 
+            # Gom dòng
+            if curr_line_y != -1 and abs(global_y - curr_line_y) > 15:
+                buffers.append(line_buffer)
                 line_buffer = []
-                curr_line_y = -1
-                
-                for line in blocks:
-                    text_content = line[1][0]
-                    box = line[0]
-                    local_y = box[0][1]
-                    
-                    # Skip overlap to avoid duplicates
-                    if current_y > 0 and local_y < overlap:
-                        continue
-                        
-                    # Gom dòng
-                    if curr_line_y != -1 and abs(local_y - curr_line_y) > 15:
-                        yield self._process_line(line_buffer)
-                        line_buffer = []
-                    
-                    line_buffer.append(text_content)
-                    curr_line_y = local_y if curr_line_y == -1 else curr_line_y
-
-                if line_buffer:
-                    yield self._process_line(line_buffer)
-
-            current_y += tile_height - overlap if current_y + tile_height < h else tile_height
+            
+            line_buffer.append(text_content)
+            curr_line_y = global_y if curr_line_y == -1 else curr_line_y
 
-        yield f"\n✅ Done in {time.time() - start_time:.2f}s"
+        if line_buffer:
+            buffers.append(line_buffer)
+        return buffers
 
     def _process_line(self, buffer):
         raw_line = " ".join(buffer)
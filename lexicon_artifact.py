@@ -0,0 +1,450 @@
+"""
+Lexicon Artifact - từ điển biên dịch sẵn, memory-mapped, dùng chung giữa các worker
+
+Thay vì mỗi process tự đọc vn_dictionary.txt + correction_map.json +
+learned_vocabulary.json và dựng index trong RAM riêng, bước build biên dịch
+tất cả thành một file nhị phân có version:
+
+    lexicon/lexicon-v000003.bin
+    lexicon/CURRENT              -> 'lexicon-v000003.bin'
+
+Worker mmap file read-only: các trang được chia sẻ qua page cache của OS nên
+N worker chỉ tốn một bản RAM. Mọi bảng là mảng string đã sort + offsets uint32,
+tra cứu bằng binary search trực tiếp trên mmap (không deserialize).
+
+Trainer publish version mới (ghi file tạm -> os.replace -> đổi CURRENT),
+LexiconStore phát hiện CURRENT đổi và swap sang lexicon mới không cần restart.
+Publish giữ khoá (lexicon/publish.lock, tạo độc quyền) nên hai lần publish đồng thời
+(nhiều request /vocabulary/learn, nhiều process) không lấy trùng version / file tạm.
+
+Bảng 'vocabulary' (learned_vocabulary.json, user dạy qua /vocabulary/learn) được
+TextCorrector dùng làm bảng sửa ưu tiên cho từng từ -> hot-reload có hiệu lực ở fast mode.
+
+Usage:
+    python lexicon_artifact.py            # build + publish từ các file nguồn
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import numpy as np
+
+from vn_index import VietnameseIndex
+
+LEXICON_DIR = 'lexicon'
+CURRENT_FILE = 'CURRENT'
+PUBLISH_LOCK = 'publish.lock'
+# Lock cũ hơn ngưỡng này (giây) coi như của process đã chết giữa chừng
+STALE_LOCK_SECONDS = 300
+MAGIC = b'VNLX'
+FORMAT_VERSION = 1
+
+# magic, format, min_fallback_length, version, số section
+HEADER = struct.Struct('<4sHHII')
+# tên section, offset, độ dài (bytes)
+SECTION = struct.Struct('<16sQQ')
+ALIGNMENT = 8
+
+# Tên bảng thay thế -> prefix section (tên section tối đa 16 bytes)
+TABLE_PREFIXES = {'correction_map': 'cmap', 'vocabulary': 'vocab'}
+
+DEFAULT_SOURCES = {
+    'dictionary': 'vn_dictionary.txt',
+    'correction_map': 'correction_map.json',
+    'vocabulary': 'learned_vocabulary.json',
+}
+
+
+# ----- Build -----
+
+def _sorted_keys(keys):
+    """Sort theo bytes UTF-8 -> cùng thứ tự với binary search lúc đọc"""
+    return sorted(keys, key=lambda k: k.encode('utf-8'))
+
+
+def _string_table(strings):
+    data = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(data) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(d) for d in data], dtype=np.uint64)
+    return offsets, b''.join(data)
+
+
+def _postings(keys, mapping, ids):
+    """key -> list giá trị  ==>  ptr (n+1) + mảng id nối liền"""
+    ptr = np.zeros(len(keys) + 1, dtype=np.uint32)
+    flat = []
+    for i, key in enumerate(keys):
+        flat.extend(ids[v] for v in mapping[key])
+        ptr[i + 1] = len(flat)
+    return ptr, np.asarray(flat, dtype=np.uint32)
+
+
+def _load_json(path):
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def build_lexicon(path, version, dictionary_path=DEFAULT_SOURCES['dictionary'],
+                  correction_map_path=DEFAULT_SOURCES['correction_map'],
+                  vocabulary_path=DEFAULT_SOURCES['vocabulary']):
+    """Biên dịch các file nguồn thành artifact tại path (ghi atomic)"""
+    index = VietnameseIndex.from_dictionary(dictionary_path) if os.path.exists(dictionary_path) else VietnameseIndex()
+
+    words = _sorted_keys(index.words)
+    word_ids = {w: i for i, w in enumerate(words)}
+    skeletons = _sorted_keys(index.skeletons)
+    skeleton_ids = {k: i for i, k in enumerate(skeletons)}
+    # Giữ thứ tự đã xếp theo count giảm dần của VietnameseIndex
+    deletes = _sorted_keys(index.deletes)
+    delete_sets = {k: sorted(index.deletes[k], key=lambda s: skeleton_ids[s]) for k in deletes}
+
+    sections = []
+
+    def add_strings(prefix, strings):
+        offsets, data = _string_table(strings)
+        sections.append((f'{prefix}.off', offsets.tobytes()))
+        sections.append((f'{prefix}.dat', data))
+
+    add_strings('word', words)
+    sections.append(('word.cnt', np.array([index.words[w] for w in words], dtype=np.uint32).tobytes()))
+
+    add_strings('skel', skeletons)
+    ptr, ids = _postings(skeletons, index.skeletons, word_ids)
+    sections += [('skel.ptr', ptr.tobytes()), ('skel.ids', ids.tobytes())]
+
+    add_strings('del', deletes)
+    ptr, ids = _postings(deletes, delete_sets, skeleton_ids)
+    sections += [('del.ptr', ptr.tobytes()), ('del.ids', ids.tobytes())]
+
+    # Bảng thay thế: correction_map (key lowercase) và learned vocabulary (giữ nguyên key)
+    for name, source in (('correction_map', correction_map_path), ('vocabulary', vocabulary_path)):
+        table = _load_json(source)
+        keys = _sorted_keys(table)
+        add_strings(f'{TABLE_PREFIXES[name]}.k', keys)
+        add_strings(f'{TABLE_PREFIXES[name]}.v', [table[k] for k in keys])
+
+    header_size = HEADER.size + SECTION.size * len(sections)
+    offset = -(-header_size // ALIGNMENT) * ALIGNMENT
+    table, blobs = [], []
+    for name, blob in sections:
+        table.append(SECTION.pack(name.encode('ascii'), offset, len(blob)))
+        padding = -len(blob) % ALIGNMENT
+        blobs.append(blob + b'\0' * padding)
+        offset += len(blob) + padding
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, index.min_fallback_length, version, len(sections)))
+        f.write(b''.join(table))
+        f.write(b'\0' * (-header_size % ALIGNMENT))
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _atomic_write(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def current_artifact(directory=LEXICON_DIR):
+    """Đường dẫn artifact mà CURRENT trỏ tới, None nếu chưa publish"""
+    pointer = os.path.join(directory, CURRENT_FILE)
+    try:
+        with open(pointer, 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(directory, name) if name else None
+
+
+def _version_of(path):
+    return int(os.path.basename(path).split('-v')[1].split('.')[0])
+
+
+_publish_lock = threading.Lock()
+
+
+@contextmanager
+def publish_guard(directory=LEXICON_DIR, timeout=60):
+    """
+    Khoá publish: threading.Lock trong process + file lock tạo độc quyền (O_EXCL) giữa
+    các process. Raises TimeoutError nếu chờ quá timeout giây.
+    """
+    path = os.path.join(directory, PUBLISH_LOCK)
+    deadline = time.time() + timeout
+    with _publish_lock:
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                        os.remove(path)
+                        logging.warning(f"⚠️ Removed stale lexicon publish lock: {path}")
+                        continue
+                except OSError:
+                    continue   # Lock vừa được giải phóng
+                if time.time() > deadline:
+                    raise TimeoutError(f"Lexicon publish lock busy: {path}")
+                time.sleep(0.05)
+        try:
+            os.write(fd, str(os.getpid()).encode('ascii'))
+            os.close(fd)
+            yield
+        finally:
+            os.remove(path)
+
+
+def _next_version(directory):
+    """Lớn hơn cả CURRENT lẫn mọi artifact trên đĩa (gọi khi đang giữ publish_guard)"""
+    current = current_artifact(directory)
+    versions = [_version_of(current)] if current else []
+    versions += [_version_of(f) for f in os.listdir(directory) if f.startswith('lexicon-v') and f.endswith('.bin')]
+    return max(versions, default=0) + 1
+
+
+def publish_lexicon(directory=LEXICON_DIR, keep=3, **sources):
+    """
+    Build version mới và trỏ CURRENT sang nó. Worker đang map version cũ
+    vẫn đọc bình thường tới khi tự swap.
+
+    Args:
+        keep: Số version cũ giữ lại trên đĩa
+        **sources: dictionary_path / correction_map_path / vocabulary_path
+    """
+    os.makedirs(directory, exist_ok=True)
+    with publish_guard(directory):
+        version = _next_version(directory)
+        path = build_lexicon(os.path.join(directory, f'lexicon-v{version:06d}.bin'), version, **sources)
+        _atomic_write(os.path.join(directory, CURRENT_FILE), os.path.basename(path))
+        logging.info(f"📦 Published lexicon v{version}: {path} ({os.path.getsize(path) / 1024:.1f}KB)")
+
+        old = sorted(f for f in os.listdir(directory) if f.startswith('lexicon-v') and f.endswith('.bin'))
+        for name in old[:-(keep + 1)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass  # Windows: file còn đang được map bởi worker khác
+    return path
+
+
+def ensure_lexicon(directory=LEXICON_DIR, **sources):
+    """Publish nếu chưa có artifact hoặc file nguồn mới hơn artifact hiện tại"""
+    current = current_artifact(directory)
+    if current and os.path.exists(current):
+        paths = [sources.get(f'{k}_path', v) for k, v in DEFAULT_SOURCES.items()]
+        built = os.path.getmtime(current)
+        if not any(os.path.exists(p) and os.path.getmtime(p) > built for p in paths):
+            return current
+    return publish_lexicon(directory, **sources)
+
+
+# ----- Read (mmap) -----
+
+class _StringTable:
+    """Mảng string đã sort trên mmap: offsets uint32 (n+1) + dữ liệu UTF-8"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        offsets = self.offsets
+        return self.data[offsets[i]:offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        return self.raw(i).decode('utf-8')
+
+    def find(self, key):
+        """Binary search -> index hoặc -1"""
+        key = key.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self.raw(lo) == key else -1
+
+
+class MappedMapping(Mapping):
+    """Mapping read-only: key tra bằng binary search, giá trị lấy theo index"""
+
+    def __init__(self, keys, value_at):
+        self.keys_table = keys
+        self.value_at = value_at
+
+    def __getitem__(self, key):
+        i = self.keys_table.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.value_at(i)
+
+    # get / in không đi qua KeyError (chậm) - fallback lookup gọi rất nhiều lần
+    def get(self, key, default=None):
+        i = self.keys_table.find(key)
+        return self.value_at(i) if i >= 0 else default
+
+    def __contains__(self, key):
+        return self.keys_table.find(key) >= 0
+
+    def __iter__(self):
+        return (self.keys_table[i] for i in range(len(self.keys_table)))
+
+    def __len__(self):
+        return len(self.keys_table)
+
+
+class MappedLexicon(VietnameseIndex):
+    """
+    VietnameseIndex đọc thẳng từ artifact (mmap read-only).
+    Dùng thay VietnameseIndex cho TextCorrector: cùng thuật toán xếp hạng ứng viên.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, min_fallback_length, version, n_sections = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"Not a lexicon artifact (format {FORMAT_VERSION}): {path}")
+        super().__init__(min_fallback_length=min_fallback_length)
+        self.path = path
+        self.version = version
+
+        buffer = memoryview(self._mmap)
+        self._sections = {}
+        for i in range(n_sections):
+            name, offset, length = SECTION.unpack_from(self._mmap, HEADER.size + i * SECTION.size)
+            name = name.rstrip(b'\0').decode('ascii')
+            section = buffer[offset:offset + length]
+            # memoryview cast: index trả về int Python, nhanh hơn numpy scalar khi binary search
+            self._sections[name] = section if name.endswith('.dat') else section.cast('I')
+
+        words = self._strings('word')
+        counts = self._sections['word.cnt']
+        skeletons = self._strings('skel')
+        self.words = MappedMapping(words, lambda i: int(counts[i]))
+        self.skeletons = MappedMapping(skeletons, self._posting('skel', words))
+        self.deletes = MappedMapping(self._strings('del'), self._posting('del', skeletons))
+        self.tables = {
+            name: MappedMapping(self._strings(f'{prefix}.k'), self._strings(f'{prefix}.v').__getitem__)
+            for name, prefix in TABLE_PREFIXES.items()
+        }
+
+    def _strings(self, prefix):
+        return _StringTable(self._sections[f'{prefix}.off'], self._sections[f'{prefix}.dat'])
+
+    def _posting(self, prefix, targets):
+        ptr, ids = self._sections[f'{prefix}.ptr'], self._sections[f'{prefix}.ids']
+        return lambda i: [targets[j] for j in ids[ptr[i]:ptr[i + 1]]]
+
+    def table(self, name):
+        """'correction_map' | 'vocabulary' -> Mapping wrong -> correct"""
+        return self.tables[name]
+
+    def add(self, word, count=1):
+        raise TypeError("MappedLexicon is read-only, publish a new version instead")
+
+    def finalize(self):
+        pass
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({'version': self.version, 'path': self.path, 'size_kb': round(len(self._mmap) / 1024, 1)})
+        return stats
+
+
+class LexiconStore:
+    """
+    Giữ lexicon hiện tại của process và hot-reload khi CURRENT đổi.
+
+    Usage:
+        store = LexiconStore()
+        store.check()                          # load version hiện tại
+        store.subscribe(corrector.swap_index)  # nhận lexicon mới
+        store.start()                          # thread theo dõi CURRENT
+    """
+
+    def __init__(self, directory=LEXICON_DIR, check_interval=5):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.lexicon = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def check(self):
+        """Load version mới nếu CURRENT đã đổi. Returns True nếu đã swap."""
+        path = current_artifact(self.directory)
+        if path is None or (self.lexicon is not None and self.lexicon.path == path):
+            return False
+        try:
+            lexicon = MappedLexicon(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Cannot load lexicon {path}: {e}")
+            return False
+
+        with self._lock:
+            # Gán tham chiếu là atomic: request đang chạy vẫn dùng bản cũ tới khi xong,
+            # mmap cũ được đóng khi không còn ai tham chiếu
+            self.lexicon = lexicon
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(lexicon)
+        logging.info(f"🔄 Lexicon v{lexicon.version} loaded ({len(lexicon)} words)")
+        return True
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+            lexicon = self.lexicon
+        if lexicon is not None:
+            callback(lexicon)
+
+    def start(self):
+        """Chạy background thread theo dõi version mới"""
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        def loop():
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logging.warning(f"⚠️ Lexicon check failed: {e}")
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=loop, name="lexicon-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    path = publish_lexicon()
+    lexicon = MappedLexicon(path)
+    print(lexicon.stats())
@@ -0,0 +1,354 @@
+"""
+Model Manager - quản lý vòng đời model (PaddleOCR + Ollama) tập trung
+
+Trên VPS CPU nhỏ, PaddleOCR và DeepSeek-OCR tranh nhau RAM. Manager này:
+1. Theo dõi model nào đang nằm trong RAM và chiếm bao nhiêu
+2. Warm model theo nhu cầu (lazy load / preload)
+3. Unload model idle dựa trên traffic thực tế (trừ model pinned - engine fast mode luôn nóng)
+4. Tự điều chỉnh keep_alive theo tần suất request quan sát được
+5. Giải phóng model LRU trước khi load model mới nếu vượt memory budget
+"""
+import gc
+import logging
+import os
+import threading
+import time
+
+try:
+    import ollama
+    HAS_OLLAMA = True
+except ImportError:
+    HAS_OLLAMA = False
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+
+def parse_duration(value):
+    """'60m' / '30s' / '1h' / 300 -> seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def format_duration(seconds):
+    """seconds -> '12m' / '45s' (định dạng keep_alive của Ollama)"""
+    seconds = int(seconds)
+    if seconds >= 60 and seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+def _rss_mb():
+    if not HAS_PSUTIL:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+
+
+class ManagedModel:
+    """Trạng thái của một model được quản lý"""
+
+    def __init__(self, name, kind, factory=None, est_memory_mb=0, keep_alive="60m", pinned=False):
+        self.name = name
+        self.kind = kind              # 'paddle' | 'ollama'
+        self.factory = factory        # Paddle: callable tạo instance
+        self.pinned = pinned          # Không bao giờ unload vì idle / memory budget
+        self.instance = None
+        self.resident = False
+        self.memory_mb = est_memory_mb
+        self.default_keep_alive = parse_duration(keep_alive)
+        self.loaded_at = None
+        self.last_used = None
+        self.requests = 0
+        self.avg_gap = None           # EWMA khoảng cách giữa các request (s)
+        # RLock: get() giữ lock qua warm() (warm cũng lấy lock) -> reaper không unload xen giữa
+        self.lock = threading.RLock()
+
+    def record_request(self, alpha=0.3):
+        now = time.time()
+        if self.last_used is not None:
+            gap = now - self.last_used
+            self.avg_gap = gap if self.avg_gap is None else alpha * gap + (1 - alpha) * self.avg_gap
+        self.last_used = now
+        self.requests += 1
+
+
+class ModelManager:
+    """
+    Quản lý tập trung các model PaddleOCR (in-process) và Ollama (server).
+
+    Usage:
+        manager = get_model_manager()
+        manager.register_paddle('paddle_vi', lambda: PaddleOCR(lang='vi'), pinned=True)
+        manager.register_ollama('deepseek-ocr', keep_alive='60m')
+
+        ocr = manager.get('paddle_vi')                 # load nếu cần, ghi nhận một request
+        manager.get('deepseek-ocr')                    # một request Ollama (chừa RAM nếu cần)
+        keep_alive = manager.keep_alive('deepseek-ocr')  # keep_alive thích ứng (chỉ đọc)
+    """
+
+    def __init__(self,
+                 host='http://127.0.0.1:11434',
+                 memory_budget_mb=None,
+                 min_keep_alive="2m",
+                 max_keep_alive="60m",
+                 idle_factor=3.0,
+                 check_interval=30):
+        self.client = ollama.Client(host=host) if HAS_OLLAMA else None
+        self.models = {}
+        self.min_keep_alive = parse_duration(min_keep_alive)
+        self.max_keep_alive = parse_duration(max_keep_alive)
+        self.idle_factor = idle_factor
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+        if memory_budget_mb is None and HAS_PSUTIL:
+            # Chừa 20% RAM cho OS + request buffers
+            memory_budget_mb = psutil.virtual_memory().total / (1024 * 1024) * 0.8
+        self.memory_budget_mb = memory_budget_mb
+
+    # ----- Registration -----
+
+    def register_paddle(self, name, factory, est_memory_mb=600, keep_alive="60m", pinned=False):
+        """
+        Đăng ký một PaddleOCR instance (tạo bằng factory khi cần).
+        pinned=True: đã load thì giữ mãi (không unload vì idle / để chừa RAM) -> không cold start
+        trên đường request
+        """
+        with self._lock:
+            if name not in self.models:
+                self.models[name] = ManagedModel(name, 'paddle', factory, est_memory_mb, keep_alive, pinned)
+            return self.models[name]
+
+    def register_ollama(self, name, est_memory_mb=0, keep_alive="60m"):
+        """Đăng ký một model trên Ollama server"""
+        with self._lock:
+            if name not in self.models:
+                self.models[name] = ManagedModel(name, 'ollama', None, est_memory_mb, keep_alive)
+            return self.models[name]
+
+    # ----- Usage -----
+
+    def get(self, name):
+        """
+        Ghi nhận một request dùng model (nơi duy nhất cập nhật EWMA) và đảm bảo model resident.
+        Paddle: trả về instance (load nếu cần). Ollama: chừa RAM trước khi Ollama load, trả về None.
+
+        Giữ model.lock qua warm() và lúc trả về: reaper không unload được ở giữa (không trả None).
+        """
+        model = self.models[name]
+        with model.lock:
+            model.record_request()
+            if model.kind == 'ollama':
+                if not model.resident:
+                    self._make_room(model)
+                    model.resident = True
+                    model.loaded_at = time.time()
+                return None
+            if not model.resident or model.instance is None:
+                self.warm(name)
+            return model.instance
+
+    def keep_alive(self, name):
+        """keep_alive thích ứng cho request Ollama tiếp theo (chỉ đọc, không ghi nhận request)"""
+        return format_duration(self._idle_timeout(self.models[name]))
+
+    def _idle_timeout(self, model):
+        """Chưa đủ dữ liệu -> keep_alive mặc định; sau đó = idle_factor × khoảng cách TB"""
+        if model.avg_gap is None:
+            return model.default_keep_alive
+        timeout = model.avg_gap * self.idle_factor
+        upper = min(self.max_keep_alive, model.default_keep_alive)
+        return max(self.min_keep_alive, min(upper, timeout))
+
+    # ----- Lifecycle -----
+
+    def warm(self, name):
+        """Đưa model vào RAM (Paddle: tạo instance, Ollama: gửi warmup request)"""
+        model = self.models[name]
+        with model.lock:
+            if model.resident and (model.kind == 'ollama' or model.instance is not None):
+                return
+            self._make_room(model)
+            start = time.time()
+
+            if model.kind == 'paddle':
+                rss_before = _rss_mb()
+                logging.info(f"🔄 Loading Paddle model: {name}")
+                model.instance = model.factory()
+                rss_after = _rss_mb()
+                if rss_before is not None:
+                    model.memory_mb = max(rss_after - rss_before, 1)
+            else:
+                if self.client is None:
+                    logging.warning(f"⚠️ Ollama not available, cannot warm {name}")
+                    return
+                logging.info(f"🔄 Preloading Ollama model: {name}")
+                try:
+                    self.client.chat(
+                        model=name,
+                        messages=[{'role': 'user', 'content': 'warmup'}],
+                        keep_alive=format_duration(self._idle_timeout(model))
+                    )
+                except Exception as e:
+                    logging.warning(f"⚠️ Preload failed (will load on first use): {e}")
+                    return
+                self._sync_ollama()
+
+            model.resident = True
+            model.loaded_at = time.time()
+            if model.last_used is None:
+                model.last_used = model.loaded_at
+            logging.info(f"✅ {name} ready in {time.time() - start:.2f}s (~{model.memory_mb:.0f}MB)")
+
+    def unload(self, name, blocking=True):
+        """
+        Giải phóng model khỏi RAM.
+
+        Args:
+            blocking: False = bỏ qua nếu model đang được dùng (lock đang bị giữ)
+
+        Returns:
+            True nếu model không còn resident
+        """
+        model = self.models[name]
+        if not model.lock.acquire(blocking):
+            return False
+        try:
+            if not model.resident:
+                return True
+            if model.kind == 'paddle':
+                model.instance = None
+                gc.collect()
+            elif self.client is not None:
+                try:
+                    self.client.chat(model=name, messages=[], keep_alive=0)
+                except Exception as e:
+                    logging.warning(f"⚠️ Unload failed: {e}")
+                    return False
+            model.resident = False
+            logging.info(f"💾 Unloaded {name} (~{model.memory_mb:.0f}MB freed)")
+            return True
+        finally:
+            model.lock.release()
+
+    def _resident_memory(self, exclude=None):
+        return sum(m.memory_mb for m in self.models.values() if m.resident and m is not exclude)
+
+    def _make_room(self, model):
+        """
+        Unload model LRU (idle lâu nhất) cho tới khi model mới vừa budget.
+
+        Caller đang giữ model.lock. Chọn victim dưới self._lock rồi nhả ra trước khi unload,
+        và không chờ lock của victim: lock đang bị giữ = victim đang được get()/warm() ở
+        thread khác (có thể chính thread đó đang chừa RAM và cần lock của model này) ->
+        bỏ qua victim đó thay vì chờ vòng tròn (deadlock).
+        """
+        if not self.memory_budget_mb:
+            return
+        skipped = set()
+        while True:
+            with self._lock:
+                if self._resident_memory(exclude=model) + model.memory_mb <= self.memory_budget_mb:
+                    return
+                victims = [m for m in self.models.values()
+                           if m.resident and not m.pinned and m is not model and m.name not in skipped]
+                if not victims:
+                    logging.warning(f"⚠️ Memory budget {self.memory_budget_mb:.0f}MB exceeded, "
+                                    f"no idle model to evict for {model.name}")
+                    return
+                victim = min(victims, key=lambda m: m.last_used or 0)
+            logging.info(f"📉 Memory budget {self.memory_budget_mb:.0f}MB exceeded, evicting {victim.name}")
+            if not self.unload(victim.name, blocking=False):
+                skipped.add(victim.name)
+
+    def _sync_ollama(self):
+        """Cập nhật trạng thái resident + RAM thực tế từ Ollama /api/ps"""
+        if self.client is None:
+            return
+        try:
+            running = {m.get('name') or m.get('model'): m for m in self.client.ps()['models']}
+        except Exception:
+            return
+        for model in self.models.values():
+            if model.kind != 'ollama':
+                continue
+            info = running.get(model.name) or running.get(f"{model.name}:latest")
+            model.resident = info is not None
+            if info is not None:
+                model.memory_mb = info['size'] / (1024 * 1024)
+
+    def reap_idle(self):
+        """Unload các model idle lâu hơn keep_alive thích ứng của chúng"""
+        self._sync_ollama()
+        now = time.time()
+        for model in list(self.models.values()):
+            if model.pinned:
+                continue
+            if model.resident and model.last_used and now - model.last_used > self._idle_timeout(model):
+                logging.info(f"😴 {model.name} idle {now - model.last_used:.0f}s -> unloading")
+                self.unload(model.name)
+
+    def start(self):
+        """Chạy background thread kiểm tra idle models"""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        def loop():
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.reap_idle()
+                except Exception as e:
+                    logging.warning(f"⚠️ Idle check failed: {e}")
+
+        self._stop.clear()
+        self._reaper = threading.Thread(target=loop, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        """Thống kê model đang quản lý"""
+        now = time.time()
+        return {
+            'memory_budget_mb': round(self.memory_budget_mb) if self.memory_budget_mb else None,
+            'resident_mb': round(self._resident_memory()),
+            'models': {
+                m.name: {
+                    'kind': m.kind,
+                    'resident': m.resident,
+                    'pinned': m.pinned,
+                    'memory_mb': round(m.memory_mb),
+                    'requests': m.requests,
+                    'idle_seconds': round(now - m.last_used) if m.last_used else None,
+                    'requests_per_min': round(60 / m.avg_gap, 2) if m.avg_gap else None,
+                    'keep_alive': format_duration(self._idle_timeout(m)),
+                }
+                for m in self.models.values()
+            }
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager():
+    """Manager dùng chung cho cả process"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+        return _manager
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,11 +8,22 @@ import json
 import time
 import os
 from pathlib import Path
+from typing import List
 from selflearning_ocr import SelfLearningOCR
-from pdf_extractor import extract_text_from_pdf
-from paddleocr import PaddleOCR
-from symspellpy import SymSpell
-from pdf2docx import Converter
+from pdf_extractor import add_text_layer, extract_pdf_pages, iter_pdf_text, page_count, parse_page_range
+from generation_guard import guarded_chat
+from model_manager import get_model_manager
+from grounding_parser import GroundingStreamParser, parse_grounding_lines
+from ocr_jobs import JobRegistry
+from streaming_ocr_fast import StreamingOCR
+from paddle_batch import BatchOCR
+from paddle_pool import PaddleWorkerPool
+from tile_pipeline import get_inference_executor
+from ocr_engine import create_engine
+from ocr_layout import OcrLayout
+from text_corrector import TextCorrector
+from lexicon_artifact import publish_lexicon
+from pdf_docx import convert_pdf_to_docx
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -32,18 +43,94 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OCR engines
-print("🚀 Initializing OCR engines...")
-deepseek_ocr = SelfLearningOCR(keep_alive="60m")
-paddle_ocr = PaddleOCR(use_angle_cls=False, lang='vi', use_gpu=False, show_log=False, enable_mkldnn=False)
-sym_spell = SymSpell(max_dictionary_edit_distance=2, prefix_length=7)
+# Engine / worker pool được khởi tạo trong startup hook, không ở cấp module: process con
+# spawn (paddle_pool, render executor của pdf_extractor, docx executor của pdf_docx) import lại
+# module chính -> chỉ tốn phần import, không warm Paddle / Ollama hay load lexicon lần nữa
+model_manager = get_model_manager()
+# Backend (Paddle Inference / ONNX Runtime) theo OCR_BACKEND, xem ocr_engine.py
+# pinned: engine fast mode không bị unload khi idle -> không cold start trên đường request
+model_manager.register_paddle(
+    'paddle_fast',
+    lambda: create_engine(use_angle_cls=False, enable_mkldnn=False),
+    pinned=True
+)
+jobs = JobRegistry()
+deepseek_ocr = None
+fast_streamer = None
+corrector = None
+
+# Pool process PaddleOCR cho fast mode: OCR_WORKERS=0 (mặc định) -> dùng engine trong process.
+# Chưa có số đo throughput theo số worker: đo trên máy chạy thật bằng
+# `python paddle_pool.py bench <ảnh...>` trước khi bật
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', '0'))
+paddle_pool = None
+# /ocr/fast/batch không có pool: số trang mỗi lần detection + recognition chung
+OCR_BATCH_PAGES = max(1, int(os.environ.get('OCR_BATCH_PAGES', '8')))
 
-# Load dictionary for fast mode
-if os.path.exists('vn_dictionary.txt'):
-    sym_spell.load_dictionary('vn_dictionary.txt', term_index=0, count_index=1, separator=" ", encoding="utf-8")
-    print("✅ Dictionary loaded for Fast Mode")
+@app.on_event("startup")
+def init_engines():
+    global deepseek_ocr, fast_streamer, corrector, paddle_pool
+    print("🚀 Initializing OCR engines...")
+    # PDF_RENDER_CACHE: thư mục cache ảnh trang PDF đã render (key = hash PDF + trang + DPI)
+    deepseek_ocr = SelfLearningOCR(keep_alive="60m", model_manager=model_manager,
+                                   render_cache_dir=os.environ.get('PDF_RENDER_CACHE') or None)
+    model_manager.warm('paddle_fast')
+    model_manager.start()
+    # Tiled streaming dùng chung PaddleOCR 'paddle_fast' của manager (không tạo engine thứ hai)
+    fast_streamer = StreamingOCR(ocr_provider=lambda: model_manager.get('paddle_fast'), use_angle_cls=False)
+    # Lexicon artifact (mmap) cho fast mode - tự swap khi trainer publish version mới
+    corrector = TextCorrector.from_lexicon(dictionary_path='vn_dictionary.txt', watch=True)
+    if corrector.lexicon_store is not None:
+        # Correction map của tiled streaming đọc thẳng từ lexicon hiện tại
+        corrector.lexicon_store.subscribe(
+            lambda lexicon: setattr(fast_streamer, 'correction_map', lexicon.table('correction_map')))
+
+    if OCR_WORKERS > 0:
+        paddle_pool = PaddleWorkerPool(
+            num_workers=OCR_WORKERS,
+            cpu_threads=int(os.environ.get('OCR_WORKER_THREADS', '0')) or None,
+            pin_cpus=os.environ.get('OCR_PIN_CPUS', '0') == '1',
+            # Recycle worker (standby warm thay vào) để chặn rò rỉ RSS của Paddle
+            max_requests=int(os.environ.get('OCR_WORKER_MAX_REQUESTS', '1000')) or None,
+            max_rss_mb=float(os.environ.get('OCR_WORKER_MAX_RSS_MB', '0')) or None,
+            task_timeout=float(os.environ.get('OCR_TASK_TIMEOUT', '120')) or None,
+        )
+        # Không chờ load model: task đầu tiên xếp hàng tới khi worker sẵn sàng
+        paddle_pool.start(wait=False)
+    print("✅ API Ready!")
 
-print("✅ API Ready!")
+@app.on_event("shutdown")
+async def stop_paddle_pool():
+    if paddle_pool is not None:
+        paddle_pool.shutdown()
+
+async def pool_ocr(image):
+    """OCR một ảnh (bytes) trên worker ít việc nhất; decode + copy shared memory ngoài event loop"""
+    loop = asyncio.get_running_loop()
+    future = await loop.run_in_executor(None, paddle_pool.submit, image)
+    return await asyncio.wrap_future(future)
+
+async def fast_inference(fn, *args):
+    """
+    Chạy fn(*args) dùng engine 'paddle_fast' trong inference executor dùng chung.
+    Mọi lệnh gọi engine trong process đi qua đây (hoặc submit thẳng vào executor):
+    PaddleOCR không thread-safe và inference không được block event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), fn, *args)
+
+def fast_ocr_lines(image, page_index=None):
+    """Callback OCR fast mode cho pdf_extractor: ảnh trang / vùng -> [(text đã sửa, box)]"""
+    if paddle_pool is not None:
+        result = paddle_pool.ocr(image)
+    else:
+        # Chạy từ thread của default executor -> chờ inference executor
+        batch = BatchOCR(model_manager.get('paddle_fast'))
+        result = get_inference_executor().submit(batch.ocr, image).result()
+    if not result or not result[0]:
+        return []
+    lines, _ = corrector.correct_result(result)
+    return list(zip(lines, (line[0] for line in result[0])))
 
 @app.get("/")
 async def root():
@@ -63,9 +150,17 @@ async def health_check():
             "documents": stats['cached_documents'],
             "hits": stats['total_cache_hits'],
             "vocabulary_size": stats['vocabulary_size']
-        }
+        },
+        "models": model_manager.status(),
+        "corrector": corrector.stats(),
+        "paddle_pool": paddle_pool.stats() if paddle_pool is not None else None
     }
 
+@app.get("/models")
+async def models_status():
+    """Resident models, memory and adaptive keep_alive"""
+    return model_manager.status()
+
 @app.post("/ocr/fast")
 async def ocr_fast(file: UploadFile = File(...)):
     """
@@ -75,50 +170,106 @@ async def ocr_fast(file: UploadFile = File(...)):
     - Use for: Quick scans, drafts
     """
     try:
-        # Save temp file
-        temp_path = f"temp_{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
-        
-        start = time.time()
-        
-        # PaddleOCR processing
-        result = paddle_ocr.ocr(temp_path, cls=False)
+        if paddle_pool is not None:
+            # Worker pool: ảnh đi thẳng từ bộ nhớ, không cần file tạm
+            data = await file.read()
+            start = time.time()
+            result = await pool_ocr(data)
+            temp_path = None
+        else:
+            # Save temp file
+            temp_path = f"temp_{file.filename}"
+            with open(temp_path, "wb") as f:
+                f.write(await file.read())
+            
+            start = time.time()
+            
+            # PaddleOCR processing (detection trên ảnh thu nhỏ theo cỡ chữ, rec trên crop gốc)
+            result = await fast_inference(BatchOCR(model_manager.get('paddle_fast')).ocr, temp_path)
+        ocr_duration = time.time() - start
         
-        # Extract text
-        lines = []
-        for line in result[0]:
-            text = line[1][0]
-            # Apply SymSpell correction
-            suggestions = sym_spell.lookup_compound(text, max_edit_distance=2)
-            if suggestions:
-                lines.append(suggestions[0].term)
-            else:
-                lines.append(text)
+        # Apply SymSpell correction (chỉ dòng confidence thấp / từ lạ)
+        lines, correction = corrector.correct_result(result)
         
         ocr_text = "\n".join(lines)
         duration = time.time() - start
         
         # Cleanup
-        os.remove(temp_path)
+        if temp_path:
+            os.remove(temp_path)
         
         return {
             "mode": "fast",
             "text": ocr_text,
             "duration": round(duration, 2),
+            "ocr_duration": round(ocr_duration, 2),
+            "correction_duration": correction['duration'],
+            "lines_skipped": correction['skipped'],
             "length": len(ocr_text)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ocr/fast/batch")
+async def ocr_fast_batch(files: List[UploadFile] = File(...)):
+    """
+    Fast Mode cho nhiều ảnh: detection từng ảnh, recognition gom dòng của
+    tất cả ảnh thành batch lớn (nhanh hơn nhiều so với gọi /ocr/fast từng ảnh)
+    """
+    try:
+        start = time.time()
+        
+        if paddle_pool is not None:
+            # Mỗi ảnh tới một worker -> các trang chạy song song trên nhiều core
+            images = [await file.read() for file in files]
+            results = await asyncio.gather(*(pool_ocr(image) for image in images))
+            timing = {'pages': len(images), 'workers': paddle_pool.num_workers}
+        else:
+            # Từng nhóm OCR_BATCH_PAGES trang (như BatchOCR.iter_ocr): chỉ đọc / giải mã / crop
+            # một nhóm mỗi lần -> bộ nhớ không tăng theo số file upload. Inference chạy trong
+            # executor dùng chung (PaddleOCR không thread-safe), nhả executor giữa các nhóm
+            batch = BatchOCR(model_manager.get('paddle_fast'))
+            results = []
+            timing = {'pages': 0, 'crops': 0, 'detection': 0.0, 'recognition': 0.0}
+            for i in range(0, len(files), OCR_BATCH_PAGES):
+                chunk = [await file.read() for file in files[i:i + OCR_BATCH_PAGES]]
+                results.extend(await fast_inference(batch.ocr_batch, chunk))
+                for key, value in batch.last_timing.items():
+                    timing[key] = round(timing[key] + value, 3)
+            timing['batch_pages'] = OCR_BATCH_PAGES
+        ocr_duration = time.time() - start
+        
+        documents = []
+        for file, result in zip(files, results):
+            lines, correction = corrector.correct_result(result)
+            documents.append({
+                "filename": file.filename,
+                "text": "\n".join(lines),
+                "lines": len(lines),
+                "correction_duration": correction['duration']
+            })
+        
+        return {
+            "mode": "fast_batch",
+            "documents": documents,
+            "duration": round(time.time() - start, 2),
+            "ocr_duration": round(ocr_duration, 2),
+            "timing": timing
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/ocr/accurate")
-async def ocr_accurate(file: UploadFile = File(...)):
+async def ocr_accurate(request: Request, file: UploadFile = File(...), structured: bool = False, job_id: str = None):
     """
     Accurate Mode: DeepSeek-OCR
     - Speed: ~80-180s (cached: instant)
     - Accuracy: 95-98%
     - Use for: Important documents
+    - structured=true: trả thêm layout (text + boxes theo toạ độ trang + page index)
+    - job_id: huỷ được qua /ocr/cancel/{job_id}; client ngắt kết nối cũng huỷ generation
     """
     try:
         # Save temp file
@@ -128,31 +279,57 @@ async def ocr_accurate(file: UploadFile = File(...)):
         
         start = time.time()
         
-        # DeepSeek OCR (with caching!)
-        ocr_text = deepseek_ocr.process_image(temp_path)
+        # DeepSeek OCR (with caching!) - chạy trong thread pool để event loop vẫn
+        # nhận được request cancel và phát hiện client disconnect
+        job = jobs.create('accurate', job_id)
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(
+            None,
+            lambda: deepseek_ocr.process_image_detailed(temp_path, cancel_event=job.cancel_event, client=job.client)
+        )
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=1.0)
+                if not task.done() and await request.is_disconnected():
+                    job.cancel('client_disconnected')
+            result = await task
+        finally:
+            jobs.finish(job)
         duration = time.time() - start
         
         # Cleanup
         os.remove(temp_path)
         
-        return {
+        ocr_text = result['text']
+        response = {
             "mode": "accurate",
             "text": ocr_text,
             "duration": round(duration, 2),
             "length": len(ocr_text),
-            "cached": duration < 1.0  # If < 1s, was cached
+            "cached": result['cached'],
+            "generation": result['generation'],
+            "job_id": job.id,
+            "cancelled": job.cancelled
         }
+        if structured:
+            layout = result['layout']
+            response["layout"] = layout.to_dict() if layout is not None else None
+        return response
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ocr/pdf-text")
-async def ocr_pdf_text(file: UploadFile = File(...)):
+async def ocr_pdf_text(file: UploadFile = File(...), ocr: bool = True, pages: str = None):
     """
-    PDF Text Mode: Direct text extraction (No OCR)
-    - Speed: Near-instant
-    - Accuracy: 100% (of text layer)
-    - Use for: Searchable PDFs, digital documents
+    PDF Text Mode: text layer + OCR fast mode cho trang không có text layer tốt
+    - Speed: trang có text layer gần như tức thì; trang scan / vùng ảnh tốn thời gian OCR
+    - Accuracy: 100% (của text layer) với trang text, như /ocr/fast với phần OCR
+    - Use for: Searchable PDFs, digital documents, PDF lẫn trang scan
+    - ocr=true (mặc định): trang không có / hỏng text layer (font TCVN3, glyph lỗi) và vùng ảnh
+      thiếu text được OCR bằng fast mode, ghép lại theo thứ tự trang
+    - ocr=false: chỉ text layer (không OCR, gần như tức thì), trang scan thường không có text
+    - pages: khoảng trang 1-based ('1-20,25'); PDF lớn dùng /ocr/pdf-text/stream
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported for this mode")
@@ -165,82 +342,239 @@ async def ocr_pdf_text(file: UploadFile = File(...)):
             
         start = time.time()
         
-        # Direct extraction
-        text = extract_text_from_pdf(temp_path)
+        # Text layer trang tốt, OCR phần còn lại (ngoài event loop)
+        loop = asyncio.get_running_loop()
+        try:
+            # pages sai cú pháp là lỗi của client (400), kiểm tra trước khi vào executor
+            try:
+                selected = parse_page_range(pages, page_count(temp_path))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            results = await loop.run_in_executor(
+                None, lambda: extract_pdf_pages(temp_path, ocr_image=fast_ocr_lines if ocr else None, pages=selected))
+        finally:
+            # Cleanup
+            os.remove(temp_path)
+        text = "\n\n".join(f"--- PAGE {page['page'] + 1} ---\n{page['text']}" for page in results)
         duration = time.time() - start
         
-        # Cleanup
-        os.remove(temp_path)
-        
         return {
             "mode": "pdf_text",
             "text": text,
             "duration": round(duration, 2),
-            "length": len(text)
+            "length": len(text),
+            "ocr_pages": sum(page['source'] in ('ocr', 'mixed') for page in results),
+            "pages": [{
+                "page": page['page'],
+                "kind": page['kind'],
+                "source": page['source'],
+                "quality": page['quality']['quality'],
+                "ocr_regions": len(page['quality']['ocr_regions'])
+            } for page in results]
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ocr/pdf-text/stream")
+async def ocr_pdf_text_stream(request: Request, file: UploadFile = File(...), pages: str = None,
+                              ocr: bool = True, format: str = "sse"):
+    """
+    PDF Text Mode dạng stream: mỗi trang gửi ngay khi extract xong (PDF hàng nghìn trang
+    nhận trang đầu sau vài chục ms, server không giữ text các trang trước)
+    - pages: khoảng trang 1-based, vd '1-20,25,40-'
+    - ocr: như /ocr/pdf-text
+    - format: 'sse' (text/event-stream) hoặc 'ndjson' (application/x-ndjson)
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported for this mode")
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    
+    # Save temp file theo từng khối (không đọc cả file lớn vào RAM)
+    temp_path = f"temp_{file.filename}"
+    with open(temp_path, "wb") as f:
+        while chunk := await file.read(1 << 20):
+            f.write(chunk)
+    try:
+        total = page_count(temp_path)
+        selected = parse_page_range(pages, total)
+    except ValueError as e:
+        os.remove(temp_path)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        os.remove(temp_path)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    def event(data):
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"data: {payload}\n\n" if format == "sse" else payload + "\n"
+    
+    async def generate():
+        start = time.time()
+        results = iter_pdf_text(temp_path, selected, fast_ocr_lines if ocr else None)
+        loop = asyncio.get_running_loop()
+        pending = None
+        sent = 0
+        try:
+            yield event({'type': 'start', 'mode': 'pdf_text', 'total_pages': total, 'pages': len(selected)})
+            while True:
+                # Extract / OCR từng trang trong thread pool, event loop vẫn rảnh
+                pending = loop.run_in_executor(None, next, results, None)
+                page = await pending
+                if page is None:
+                    break
+                yield event(dict(page, type='page'))
+                sent += 1
+                if await request.is_disconnected():
+                    break
+            yield event({'type': 'done', 'pages': sent, 'duration': round(time.time() - start, 2)})
+        except Exception as e:
+            yield event({'type': 'error', 'message': str(e)})
+        finally:
+            # Client ngắt giữa chừng khi thread còn đang extract -> không close được generator
+            if pending is None or pending.done():
+                results.close()
+            # Cleanup
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
 
 @app.post("/ocr/stream")
-async def ocr_stream(file: UploadFile = File(...), mode: str = "accurate"):
+async def ocr_stream(request: Request, file: UploadFile = File(...), mode: str = "accurate", job_id: str = None):
     """
     Streaming Mode: Real-time text output
     - GUI sees text appearing character by character
     - Better UX for long processing
+    - Client ngắt kết nối (đóng tab) hoặc gọi /ocr/cancel/{job_id} -> huỷ generation của Ollama
     """
+    job = jobs.create('stream', job_id)
+    
     async def generate():
+        temp_path = f"temp_{file.filename}"
         try:
             # Save temp file
-            temp_path = f"temp_{file.filename}"
             with open(temp_path, "wb") as f:
                 f.write(await file.read())
             
             # Send start event
-            yield f"data: {json.dumps({'type': 'start', 'mode': mode})}\n\n"
+            yield f"data: {json.dumps({'type': 'start', 'mode': mode, 'job_id': job.id})}\n\n"
             
             if mode == "fast":
-                # Fast mode - instant result
-                result = paddle_ocr.ocr(temp_path, cls=False)
-                text = "\n".join([line[1][0] for line in result[0]])
-                
-                # Stream character by character for demo
-                for char in text:
-                    yield f"data: {json.dumps({'type': 'token', 'content': char})}\n\n"
-                    await asyncio.sleep(0.01)  # Simulate streaming
+                # Fast mode - tiled PaddleOCR, mỗi dòng gửi ngay khi tile của nó xong.
+                # Inference chạy trong executor dùng chung; client đọc chậm -> dây chuyền chờ
+                lines = fast_streamer.aprocess_stream_tiled(temp_path, progress=False)
+                try:
+                    async for line in lines:
+                        if not job.cancelled and await request.is_disconnected():
+                            job.cancel('client_disconnected')
+                        if job.cancelled:
+                            break
+                        token = line + "\n"
+                        yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
+                        yield f"data: {json.dumps({'type': 'line', 'text': line, 'boxes': []})}\n\n"
+                finally:
+                    await lines.aclose()
             
             else:
                 # Accurate mode - DeepSeek with real streaming
-                import ollama
                 with open(temp_path, 'rb') as img_file:
                     img_data = img_file.read()
                 
-                stream = ollama.chat(
-                    model='deepseek-ocr',
-                    messages=[{
-                        'role': 'user',
-                        'content': 'Free OCR.',
-                        'images': [img_data]
-                    }],
-                    stream=True
-                )
+                # Generation chạy trong thread pool (không block event loop),
+                # token được đẩy sang generator qua asyncio.Queue
+                loop = asyncio.get_running_loop()
+                queue = asyncio.Queue()
+                
+                def run_generation():
+                    # Như /ocr/accurate: ghi nhận request (chừa RAM nếu cần) + keep_alive thích ứng.
+                    # Token budget (decode ảnh) cũng tính trong thread, không trên event loop
+                    model_manager.get('deepseek-ocr')
+                    return guarded_chat(
+                        job.client,
+                        'deepseek-ocr',
+                        messages=[{
+                            'role': 'user',
+                            'content': 'Free OCR.',
+                            'images': [img_data]
+                        }],
+                        keep_alive=model_manager.keep_alive('deepseek-ocr'),
+                        image=img_data,
+                        on_token=lambda token: loop.call_soon_threadsafe(queue.put_nowait, token),
+                        cancel_event=job.cancel_event
+                    )
+                
+                task = loop.run_in_executor(None, run_generation)
+                task.add_done_callback(lambda _: queue.put_nowait(None))
+                
+                # Parse grounding tags on the fly -> 'line' events với text đã sửa + det boxes
+                parser = GroundingStreamParser(corrector=deepseek_ocr._apply_vocabulary_corrections)
                 
-                for chunk in stream:
-                    content = chunk['message']['content']
-                    if content:
+                try:
+                    while True:
+                        try:
+                            content = await asyncio.wait_for(queue.get(), timeout=1.0)
+                        except asyncio.TimeoutError:
+                            # Chưa có token (model đang đọc ảnh) -> vẫn kiểm tra client còn kết nối
+                            if await request.is_disconnected():
+                                job.cancel('client_disconnected')
+                            continue
+                        
+                        if content is None:
+                            break
+                        if await request.is_disconnected():
+                            job.cancel('client_disconnected')
                         yield f"data: {json.dumps({'type': 'token', 'content': content})}\n\n"
+                        for line in parser.feed(content):
+                            yield f"data: {json.dumps({'type': 'line', 'text': line.text, 'boxes': line.boxes})}\n\n"
+                finally:
+                    # Generator bị huỷ (server phát hiện disconnect) khi generation còn chạy
+                    if not task.done():
+                        job.cancel('client_disconnected')
+                
+                text, stats = await task
+                if stats['tokens_trimmed']:
+                    # Guard cắt đuôi lặp sau khi các token / 'line' của đoạn lặp đã gửi đi ->
+                    # 'replace' mang toàn bộ kết quả đã cắt, client thay thế thay vì nối thêm
+                    lines = parse_grounding_lines(text, corrector=deepseek_ocr._apply_vocabulary_corrections)
+                    yield f"data: {json.dumps({'type': 'replace', 'content': text, 'lines': [{'text': line.text, 'boxes': line.boxes} for line in lines]})}\n\n"
+                else:
+                    for line in parser.close():
+                        yield f"data: {json.dumps({'type': 'line', 'text': line.text, 'boxes': line.boxes})}\n\n"
+                
+                if stats['aborted']:
+                    # Repetition loop / cancel -> báo client cắt phần lặp
+                    yield f"data: {json.dumps({'type': 'stopped', 'reason': stats['reason'], 'text': text, 'tokens_generated': stats['tokens_generated']})}\n\n"
             
             # Send completion
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-            
-            # Cleanup
-            os.remove(temp_path)
+            yield f"data: {json.dumps({'type': 'done', 'job_id': job.id})}\n\n"
             
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        finally:
+            jobs.finish(job)
+            # Cleanup
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
+@app.post("/ocr/cancel/{job_id}")
+async def cancel_job(job_id: str):
+    """Huỷ một job OCR đang chạy (stream hoặc accurate)"""
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return {"status": "cancelled", "job_id": job_id}
+
+@app.get("/jobs")
+async def list_jobs():
+    """Các job OCR đang chạy"""
+    return {"jobs": jobs.active()}
+
 @app.post("/ocr/hybrid")
 async def ocr_hybrid(file: UploadFile = File(...)):
     """
@@ -274,7 +608,7 @@ async def ocr_hybrid(file: UploadFile = File(...)):
         
         # Fast mode first for immediate response
         start = time.time()
-        result = paddle_ocr.ocr(temp_path, cls=False)
+        result = await fast_inference(BatchOCR(model_manager.get('paddle_fast')).ocr, temp_path)
         fast_text = "\n".join([line[1][0] for line in result[0]])
         fast_duration = time.time() - start
         
@@ -295,6 +629,11 @@ async def ocr_hybrid(file: UploadFile = File(...)):
 async def learn_vocabulary(wrong: str, correct: str):
     """Learn from user corrections"""
     deepseek_ocr.learn_correction(wrong, correct)
+    # Publish lexicon version mới -> mọi worker tự swap (không restart)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, publish_lexicon)
+    if corrector.lexicon_store is not None:
+        corrector.lexicon_store.check()
     return {"status": "learned", "wrong": wrong, "correct": correct}
 
 @app.get("/cache/stats")
@@ -335,6 +674,53 @@ async def export_docx(text: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/export/searchable-pdf")
+async def export_searchable_pdf(file: UploadFile = File(...), mode: str = "accurate"):
+    """
+    PDF scan -> PDF searchable: text layer ẩn khớp với box OCR, ảnh giữ nguyên.
+    Gửi lại file kết quả sẽ đi thẳng đường /ocr/pdf-text (không OCR lại).
+    - mode=accurate: layout DeepSeek trong ocr_cache.db (chưa có thì OCR trước)
+    - mode=fast: PaddleOCR cho trang / vùng thiếu text layer
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    if mode not in ("accurate", "fast"):
+        raise HTTPException(status_code=400, detail="mode must be 'accurate' or 'fast'")
+    
+    with NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
+        tmp_pdf.write(await file.read())
+        pdf_path = tmp_pdf.name
+    output_path = pdf_path.replace(".pdf", "_searchable.pdf")
+    
+    def build():
+        if mode == "accurate":
+            return deepseek_ocr.export_searchable_pdf(pdf_path, output_path)
+        pages = extract_pdf_pages(pdf_path, ocr_image=fast_ocr_lines)
+        layout = OcrLayout.concat([page['layout'] for page in pages if page['source'] in ('ocr', 'mixed')])
+        return add_text_layer(pdf_path, layout, output_path) if len(layout) else None
+    
+    try:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, build)
+    except Exception as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(pdf_path)
+    
+    if stats is None:
+        # Không có gì để thêm (PDF đã có text layer tốt / OCR không ra chữ)
+        raise HTTPException(status_code=422, detail="No OCR text to embed")
+    
+    return FileResponse(
+        output_path,
+        media_type='application/pdf',
+        filename=f"{Path(file.filename).stem}_searchable.pdf",
+        headers={'X-Text-Layer-Lines': str(stats['lines']), 'X-Text-Layer-Pages': str(stats['pages'])},
+        background=BackgroundTask(os.remove, output_path)
+    )
+
 @app.post("/convert/pdf-doc")
 async def convert_pdf_doc(file: UploadFile = File(...)):
     """Convert PDF to Word preserving layout"""
@@ -350,29 +736,10 @@ async def convert_pdf_doc(file: UploadFile = File(...)):
         # Define temp Docx path
         docx_path = pdf_path.replace(".pdf", ".docx")
         
-        # Convert using pdf2docx
-        cv = Converter(pdf_path)
-        cv.convert(docx_path, start=0, end=None)
-        cv.close()
-        
-        # Post-process to force Times New Roman
-        doc = Document(docx_path)
-        # Iterate over all paragraphs
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                run.font.name = 'Times New Roman'
-                run.font.size = Pt(13)
-        
-        # Iterate over tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.name = 'Times New Roman'
-                            run.font.size = Pt(13)
-                            
-        doc.save(docx_path)
+        # pdf2docx parse song song theo khoảng trang (process pool), Times New Roman 13pt
+        # đặt ở cấp style - chạy ngoài event loop
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, convert_pdf_to_docx, pdf_path, docx_path)
         
         # Cleanup PDF
         os.remove(pdf_path)
@@ -381,6 +748,7 @@ async def convert_pdf_doc(file: UploadFile = File(...)):
             docx_path, 
             media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
             filename="converted_layout.docx",
+            headers={'X-Conversion-Duration': str(stats['duration']), 'X-Conversion-Workers': str(stats['workers'])},
             background=BackgroundTask(os.remove, docx_path)
         )
             
@@ -0,0 +1,225 @@
+"""
+OCR Engine - tạo engine fast mode theo backend cấu hình
+
+Fast mode (API, LocalOCR, worker pool) dùng chung một factory thay vì tự gọi
+PaddleOCR(...) với tham số khác nhau ở mỗi module. Backend:
+
+- 'paddle': Paddle Inference (mặc định, như cũ)
+- 'onnx':   cùng model PP-OCR det/rec/cls đã export sang ONNX, chạy bằng
+            ONNX Runtime CPU (PaddleOCR use_onnx=True). Không phụ thuộc MKLDNN
+            của paddlepaddle; input/output giống hệt PaddleOCR.ocr()
+
+Chưa có số đo độ trễ / CER của 'onnx' so với 'paddle' nên mặc định vẫn là 'paddle':
+chạy `python benchmark_engines.py` trên máy thật (ghi <OCR_ONNX_DIR>/benchmark.json)
+trước khi đổi OCR_BACKEND.
+
+Cấu hình qua env:
+    OCR_BACKEND=paddle|onnx
+    OCR_ONNX_DIR=models/onnx       (det.onnx, rec.onnx, cls.onnx)
+    OCR_REC_INT8=1                 (rec_int8.onnx, chỉ khi đã qua gate của quantize_rec.py)
+
+Export model ONNX (cần paddle2onnx):
+    python ocr_engine.py export [models/onnx]
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from paddleocr import PaddleOCR
+
+try:
+    import onnxruntime
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+BACKENDS = ('paddle', 'onnx')
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'paddle')
+ONNX_MODEL_DIR = os.environ.get('OCR_ONNX_DIR', os.path.join('models', 'onnx'))
+ONNX_MODELS = {'det': 'det.onnx', 'rec': 'rec.onnx', 'cls': 'cls.onnx'}
+INT8_REC_MODEL = 'rec_int8.onnx'
+INT8_GATE_FILE = 'rec_int8.gate.json'
+OCR_REC_INT8 = os.environ.get('OCR_REC_INT8', '0') == '1'
+
+DEFAULT_ENGINE_KWARGS = {
+    'lang': 'vi',
+    'use_gpu': False,
+    'show_log': False,
+}
+
+
+def onnx_model_paths(model_dir=ONNX_MODEL_DIR):
+    """-> {'det': path, 'rec': path, 'cls': path} (chỉ các file đang có)"""
+    paths = {kind: os.path.join(model_dir, name) for kind, name in ONNX_MODELS.items()}
+    return {kind: path for kind, path in paths.items() if os.path.exists(path)}
+
+
+def resolve_backend(backend=None, model_dir=ONNX_MODEL_DIR):
+    """Backend thực sự dùng được: 'onnx' cần onnxruntime + det/rec đã export"""
+    backend = backend or OCR_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend} (expected one of {BACKENDS})")
+    if backend == 'onnx':
+        if not HAS_ONNXRUNTIME:
+            logging.warning("⚠️ onnxruntime not installed, falling back to Paddle backend")
+            return 'paddle'
+        missing = {'det', 'rec'} - set(onnx_model_paths(model_dir))
+        if missing:
+            logging.warning(f"⚠️ ONNX models missing in {model_dir} ({', '.join(sorted(missing))}), "
+                            f"run `python ocr_engine.py export` - falling back to Paddle backend")
+            return 'paddle'
+    return backend
+
+
+def int8_gate_report(model_dir=ONNX_MODEL_DIR):
+    """Báo cáo gate của quantize_rec.py (None nếu chưa chạy)"""
+    try:
+        with open(os.path.join(model_dir, INT8_GATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def model_sha256(path, chunk_size=1 << 20):
+    """sha256 của file model (gate ghi lại để phát hiện model đã đổi)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def int8_gate_hashes(model_dir=ONNX_MODEL_DIR):
+    """{'rec_sha256', 'rec_int8_sha256'} của các model hiện có - phải khớp báo cáo gate"""
+    return {
+        'rec_sha256': model_sha256(os.path.join(model_dir, ONNX_MODELS['rec'])),
+        'rec_int8_sha256': model_sha256(os.path.join(model_dir, INT8_REC_MODEL)),
+    }
+
+
+def _int8_rec_path(model_dir, check_gate):
+    """Đường dẫn rec_int8.onnx nếu được phép dùng, None nếu không"""
+    path = os.path.join(model_dir, INT8_REC_MODEL)
+    if not os.path.exists(path):
+        logging.warning(f"⚠️ {path} not found (run quantize_rec.py), using FP32 recognition")
+        return None
+    if check_gate:
+        report = int8_gate_report(model_dir)
+        if not report or not report.get('passed'):
+            cer = f" (CER {report['cer'] * 100:.2f}% > {report['max_cer'] * 100:.2f}%)" if report else ""
+            logging.warning(f"⚠️ INT8 recognition did not pass the accuracy gate{cer}, using FP32 recognition")
+            return None
+        # Gate chỉ đúng cho đúng cặp model đã kiểm tra (export lại rec.onnx -> rec_int8.onnx cũ)
+        hashes = int8_gate_hashes(model_dir)
+        if any(report.get(key) != value for key, value in hashes.items()):
+            logging.warning("⚠️ rec.onnx / rec_int8.onnx changed since the accuracy gate (run quantize_rec.py), "
+                            "using FP32 recognition")
+            return None
+    return path
+
+
+def create_engine(backend=None, model_dir=ONNX_MODEL_DIR, use_angle_cls=False, rec_int8=None, check_gate=True,
+                  **kwargs):
+    """
+    Tạo engine fast mode (đối tượng PaddleOCR, API .ocr() không đổi).
+
+    Args:
+        backend: 'paddle' | 'onnx' (None = OCR_BACKEND)
+        model_dir: Thư mục model ONNX
+        use_angle_cls: Bật angle classifier
+        rec_int8: Dùng model recognition INT8 (None = OCR_REC_INT8, chỉ backend onnx)
+        check_gate: Từ chối INT8 nếu chưa qua gate độ chính xác
+        **kwargs: Tham số PaddleOCR khác (enable_mkldnn, cpu_threads, ocr_version...)
+    """
+    backend = resolve_backend(backend, model_dir)
+    rec_int8 = OCR_REC_INT8 if rec_int8 is None else rec_int8
+    params = dict(DEFAULT_ENGINE_KWARGS, use_angle_cls=use_angle_cls, **kwargs)
+    if rec_int8 and backend != 'onnx':
+        logging.warning("⚠️ INT8 recognition requires the ONNX backend, using FP32 recognition")
+        rec_int8 = False
+    if backend == 'onnx':
+        paths = onnx_model_paths(model_dir)
+        rec_path = (_int8_rec_path(model_dir, check_gate) if rec_int8 else None) or paths['rec']
+        rec_int8 = rec_path != paths['rec']
+        params.pop('enable_mkldnn', None)   # Không áp dụng cho ONNX Runtime
+        params.update(use_onnx=True, det_model_dir=paths['det'], rec_model_dir=rec_path)
+        if use_angle_cls:
+            if 'cls' in paths:
+                params['cls_model_dir'] = paths['cls']
+            else:
+                logging.warning(f"⚠️ {ONNX_MODELS['cls']} missing, angle classifier disabled")
+                params['use_angle_cls'] = False
+    engine = PaddleOCR(**params)
+    engine.backend = backend
+    engine.rec_int8 = rec_int8
+    return engine
+
+
+def export_onnx(model_dir=ONNX_MODEL_DIR, opset_version=11, **kwargs):
+    """
+    Export model PP-OCR mà PaddleOCR đang dùng (cùng lang/ocr_version) sang ONNX.
+
+    rec_int8.onnx và gate của nó được lượng tử hoá từ rec.onnx cũ -> xoá, chạy lại quantize_rec.py.
+
+    Returns:
+        {'det': path, 'rec': path, 'cls': path}
+    """
+    engine = PaddleOCR(use_angle_cls=True, **dict(DEFAULT_ENGINE_KWARGS, **kwargs))
+    sources = {'det': engine.args.det_model_dir, 'rec': engine.args.rec_model_dir, 'cls': engine.args.cls_model_dir}
+    os.makedirs(model_dir, exist_ok=True)
+    for name in (INT8_REC_MODEL, INT8_GATE_FILE):
+        stale = os.path.join(model_dir, name)
+        if os.path.exists(stale):
+            logging.info(f"🗑️ Removing stale {stale}")
+            os.remove(stale)
+
+    exported = {}
+    for kind, source in sources.items():
+        target = os.path.join(model_dir, ONNX_MODELS[kind])
+        logging.info(f"📦 Exporting {kind}: {source} -> {target}")
+        subprocess.run([
+            'paddle2onnx',
+            '--model_dir', source,
+            '--model_filename', 'inference.pdmodel',
+            '--params_filename', 'inference.pdiparams',
+            '--save_file', target,
+            '--opset_version', str(opset_version),
+            '--enable_onnx_checker', 'True',
+        ], check=True)
+        exported[kind] = target
+    logging.info(f"✅ ONNX models exported to {model_dir}")
+    return exported
+
+
+# ----- So sánh kết quả -----
+
+def result_text(result):
+    """Kết quả PaddleOCR.ocr() -> text (các dòng nối bằng \\n)"""
+    if not result or not result[0]:
+        return ""
+    return "\n".join(line[1][0] for line in result[0])
+
+
+def char_error_rate(reference, hypothesis):
+    """CER = edit distance ký tự / độ dài reference"""
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        export_onnx(sys.argv[2] if len(sys.argv) > 2 else ONNX_MODEL_DIR)
+    else:
+        print("Usage: python ocr_engine.py export [model_dir]")
@@ -0,0 +1,91 @@
+"""
+OCR Job Registry - theo dõi và huỷ các request OCR chạy lâu
+
+Mỗi request DeepSeek (stream/accurate) được đăng ký thành một job với:
+- cancel_event: generation loop kiểm tra sau mỗi token
+- client riêng: đóng HTTP connection để Ollama dừng sinh token ngay,
+  kể cả khi đang ở giai đoạn xử lý ảnh (chưa có token nào)
+"""
+import logging
+import threading
+import time
+import uuid
+
+try:
+    import ollama
+    HAS_OLLAMA = True
+except ImportError:
+    HAS_OLLAMA = False
+
+
+class OcrJob:
+
+    def __init__(self, job_id, kind, host):
+        self.id = job_id
+        self.kind = kind
+        self.created = time.time()
+        self.cancel_event = threading.Event()
+        self.status = 'running'
+        # Client riêng cho job -> đóng được connection mà không ảnh hưởng request khác
+        self.client = ollama.Client(host=host) if HAS_OLLAMA else None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self, reason='cancelled'):
+        if self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.status = reason
+        # Đóng HTTP connection (Client.close()) -> Ollama huỷ generation phía server, kể cả khi
+        # chưa có token; ollama-python cũ không có close() -> dừng ở token kế tiếp qua cancel_event
+        close = getattr(self.client, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logging.warning(f"⚠️ Closing Ollama connection failed: {e}")
+        logging.info(f"🛑 Job {self.id} {reason}")
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'elapsed': round(time.time() - self.created, 1),
+        }
+
+
+class JobRegistry:
+
+    def __init__(self, host='http://127.0.0.1:11434'):
+        self.host = host
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind, job_id=None):
+        job = OcrJob(job_id or uuid.uuid4().hex[:12], kind, self.host)
+        with self._lock:
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id, reason='cancelled'):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel(reason)
+        return True
+
+    def finish(self, job):
+        """Gỡ job khỏi registry khi xong (hoặc đã huỷ)"""
+        if job.status == 'running':
+            job.status = 'done'
+        with self._lock:
+            self.jobs.pop(job.id, None)
+
+    def active(self):
+        return [job.to_dict() for job in list(self.jobs.values())]
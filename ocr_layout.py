@@ -0,0 +1,155 @@
+"""
+OcrLayout - kết quả OCR có cấu trúc (text + box + page) dạng cột
+
+Lưu theo mảng numpy thay vì list of dict để gọn bộ nhớ và xử lý vector:
+- texts:  list[str]            (N)
+- boxes:  float32 (N, 4)       x1, y1, x2, y2 theo pixel của ảnh trang
+- pages:  int32   (N,)         page index (0-based)
+- page_sizes: float32 (P, 2)   width, height của ảnh trang (pixel)
+
+Dòng không có box (model không trả grounding) có box = NaN.
+"""
+import numpy as np
+
+# DeepSeek-OCR chuẩn hoá toạ độ det về [0, 999]
+GROUNDING_SCALE = 999.0
+# Hai box cùng dòng nếu phần chồng lấn dọc >= tỉ lệ này × chiều cao box thấp hơn
+ROW_OVERLAP = 0.5
+
+
+def cluster_rows(tops, bottoms, min_overlap=ROW_OVERLAP):
+    """
+    Gom box thành dòng theo chồng lấn dọc (không chia y theo bucket cố định).
+
+    Duyệt box theo tâm y; box vào dòng hiện tại nếu phần chồng lấn với dải y của dòng
+    >= min_overlap × chiều cao nhỏ hơn. Dải y của dòng là trung bình các box đã vào
+    nên không nở dần theo box lệch (dòng nghiêng, chữ có dấu cao).
+
+    Returns:
+        row id int64 (N,) tăng dần từ trên xuống, -1 cho box NaN
+    """
+    tops = np.asarray(tops, dtype=np.float64)
+    bottoms = np.asarray(bottoms, dtype=np.float64)
+    rows = np.full(len(tops), -1, dtype=np.int64)
+    valid = np.flatnonzero(~(np.isnan(tops) | np.isnan(bottoms)))
+    order = valid[np.argsort((tops[valid] + bottoms[valid]) / 2, kind='stable')]
+
+    row, row_top, row_bottom, count = -1, 0.0, 0.0, 0
+    for i in order:
+        top, bottom = tops[i], bottoms[i]
+        if row >= 0:
+            overlap = min(bottom, row_bottom) - max(top, row_top)
+            if overlap > 0 and overlap >= min_overlap * min(bottom - top, row_bottom - row_top):
+                rows[i] = row
+                count += 1
+                row_top += (top - row_top) / count
+                row_bottom += (bottom - row_bottom) / count
+                continue
+        row += 1
+        rows[i] = row
+        row_top, row_bottom, count = top, bottom, 1
+    return rows
+
+
+class OcrLayout:
+
+    def __init__(self, texts=None, boxes=None, pages=None, page_sizes=None):
+        self.texts = list(texts or [])
+        n = len(self.texts)
+        self.boxes = np.asarray(boxes if boxes is not None else np.full((n, 4), np.nan), dtype=np.float32).reshape(n, 4)
+        self.pages = np.asarray(pages if pages is not None else np.zeros(n), dtype=np.int32).reshape(n)
+        self.page_sizes = np.asarray(page_sizes if page_sizes is not None else np.empty((0, 2)),
+                                     dtype=np.float32).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_grounding(cls, lines, width, height, page_index=0, offset=(0, 0), region_size=None):
+        """
+        GroundingLine (toạ độ 0-999) -> toạ độ pixel của trang.
+
+        Args:
+            lines: list[GroundingLine]
+            width, height: Kích thước ảnh trang
+            offset: (left, top) của chunk trong trang (ChunkedOCR)
+            region_size: (w, h) của chunk; None = cả trang
+        """
+        region_w, region_h = region_size or (width, height)
+        texts = []
+        boxes = np.full((len(lines), 4), np.nan, dtype=np.float32)
+
+        for i, line in enumerate(lines):
+            texts.append(line.text)
+            if line.boxes:
+                b = np.asarray(line.boxes, dtype=np.float32)
+                # Nhiều box cho một ref -> lấy bao ngoài
+                boxes[i] = (b[:, 0].min(), b[:, 1].min(), b[:, 2].max(), b[:, 3].max())
+
+        boxes *= np.array([region_w, region_h, region_w, region_h], dtype=np.float32) / GROUNDING_SCALE
+        boxes += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+
+        page_sizes = np.zeros((page_index + 1, 2), dtype=np.float32)
+        page_sizes[page_index] = (width, height)
+        return cls(texts, boxes, np.full(len(texts), page_index), page_sizes)
+
+    @classmethod
+    def concat(cls, layouts):
+        """Ghép nhiều layout (nhiều trang / nhiều chunk)"""
+        layouts = [l for l in layouts if l is not None]
+        if not layouts:
+            return cls()
+        n_pages = max(len(l.page_sizes) for l in layouts)
+        page_sizes = np.zeros((n_pages, 2), dtype=np.float32)
+        for l in layouts:
+            known = l.page_sizes[:, 0] > 0
+            page_sizes[:len(l.page_sizes)][known] = l.page_sizes[known]
+        return cls(
+            [t for l in layouts for t in l.texts],
+            np.concatenate([l.boxes for l in layouts]),
+            np.concatenate([l.pages for l in layouts]),
+            page_sizes,
+        )
+
+    def reading_order(self, min_overlap=ROW_OVERLAP):
+        """
+        Trả về layout sắp theo thứ tự đọc: page -> dòng -> x.
+        Dòng gom theo chồng lấn dọc trong từng trang (cluster_rows): hai box cùng dòng
+        dù y lệch qua ranh giới bucket, hai dòng sát nhau không bị gộp.
+        """
+        if not len(self):
+            return self
+        rows = np.full(len(self), -1, dtype=np.int64)
+        for page_index in np.unique(self.pages):
+            idx = np.flatnonzero(self.pages == page_index)
+            rows[idx] = cluster_rows(self.boxes[idx, 1], self.boxes[idx, 3], min_overlap)
+        # Dòng không có box giữ thứ tự gốc ở cuối trang (lexsort ổn định)
+        rows = np.where(rows < 0, np.iinfo(np.int64).max, rows)
+        order = np.lexsort((np.nan_to_num(self.boxes[:, 0]), rows, self.pages))
+        return self.take(order)
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.intp)
+        return OcrLayout([self.texts[i] for i in indices], self.boxes[indices],
+                         self.pages[indices], self.page_sizes)
+
+    def page(self, page_index):
+        return self.take(np.flatnonzero(self.pages == page_index))
+
+    def text(self):
+        return '\n'.join(self.texts)
+
+    def to_dict(self):
+        """JSON dạng cột (gọn hơn list of objects)"""
+        return {
+            'text': self.texts,
+            'boxes': [[round(float(v), 1) for v in box] if not np.isnan(box).any() else None
+                      for box in self.boxes],
+            'page': self.pages.tolist(),
+            'page_sizes': self.page_sizes.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        boxes = [b if b is not None else [np.nan] * 4 for b in data['boxes']]
+        return cls(data['text'], boxes, data['page'], data.get('page_sizes'))
@@ -0,0 +1,200 @@
+"""
+Batch PaddleOCR - nhận dạng nhiều trang trong cùng các batch recognition lớn
+
+PaddleOCR.ocr() xử lý từng ảnh: det -> crop -> rec, nên mỗi batch recognition
+chỉ gồm các dòng của một trang (rec_batch_num mặc định 6). Với bulk job
+(trainer, batch API) phần lớn thời gian rec bị lãng phí vào batch nhỏ và padding.
+
+BatchOCR:
+1. Chạy detection lần lượt trên nhiều trang (DB model nhận ảnh kích thước khác nhau)
+2. Gom toàn bộ crop dòng chữ của các trang lại
+3. Recognition một lần cho tất cả: TextRecognizer sắp crop theo tỉ lệ rộng/cao
+   rồi chia batch rec_batch_num -> batch lớn, ít padding
+4. Trả kết quả về đúng định dạng PaddleOCR.ocr() cho từng trang
+
+Detection hai độ phân giải (adaptive_det): ước lượng chiều cao ký tự trên ảnh probe
+nhỏ, chọn cạnh dài của ảnh detection sao cho ký tự cao ~det_target_char_px
+(chữ to -> ảnh nhỏ hơn nhiều so với mức cố định 960px của Paddle, chữ rất nhỏ ->
+giữ nhiều pixel hơn). Box được map ngược về ảnh gốc, recognition cắt crop từ ảnh
+độ phân giải đầy đủ.
+
+Usage:
+    batch = BatchOCR(PaddleOCR(lang='vi', use_angle_cls=False, show_log=False))
+    for path, result in batch.iter_ocr(paths, batch_pages=8):
+        lines = result[0]   # [[box, (text, score)], ...] hoặc None
+    result = batch.ocr('page.jpg')   # một trang, thay cho engine.ocr()
+"""
+import copy
+import logging
+import time
+
+import cv2
+import numpy as np
+from paddleocr import PaddleOCR
+
+from page_metrics import estimate_char_height
+
+# Sau khi import paddleocr, package tools/ của PaddleOCR nằm trong sys.path
+from tools.infer.predict_system import sorted_boxes
+from tools.infer.utility import get_minarea_rect_crop, get_rotate_crop_image
+
+DEFAULT_REC_BATCH_NUM = 32
+DET_TARGET_CHAR_PX = 7      # Chiều cao glyph (~x-height) mong muốn trên ảnh detection
+DET_MIN_SIDE = 640
+DET_MAX_SIDE = 1920
+
+
+def load_image(image):
+    """Đường dẫn / bytes / ndarray -> ảnh BGR (H, W, 3)"""
+    if isinstance(image, np.ndarray):
+        img = image
+    elif isinstance(image, (bytes, bytearray)):
+        img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        img = cv2.imread(str(image))
+    if img is None:
+        return None
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    return img
+
+
+class BatchOCR:
+    """
+    Args:
+        engine: PaddleOCR instance dùng chung (None = tự tạo)
+        rec_batch_num: Số crop mỗi batch recognition
+        cls: Dùng angle classifier (chỉ khi engine có use_angle_cls=True)
+        adaptive_det: Detection trên ảnh thu nhỏ theo chiều cao ký tự ước lượng
+        det_target_char_px: Chiều cao ký tự mục tiêu trên ảnh detection
+    """
+
+    def __init__(self, engine=None, rec_batch_num=DEFAULT_REC_BATCH_NUM, cls=False, adaptive_det=True,
+                 det_target_char_px=DET_TARGET_CHAR_PX):
+        self.engine = engine or PaddleOCR(use_angle_cls=cls, lang='vi', use_gpu=False, show_log=False)
+        self.cls = cls and getattr(self.engine, 'use_angle_cls', False)
+        # TextRecognizer tự sort crop theo width rồi chia batch rec_batch_num.
+        # Bản sao nông (predictor dùng chung): rec_batch_num lớn chỉ áp cho BatchOCR này,
+        # engine.ocr() của caller khác vẫn giữ cấu hình gốc
+        self._recognizer = copy.copy(self.engine.text_recognizer)
+        self._recognizer.rec_batch_num = max(self._recognizer.rec_batch_num, rec_batch_num)
+        self.box_type = getattr(self.engine.args, 'det_box_type', 'quad')
+        self.det_target_char_px = det_target_char_px
+        # DetResizeForTest (limit_side_len/limit_type) của detector - mỗi trang dùng bản sao riêng
+        self._det_resize = next((op for op in self.engine.text_detector.preprocess_op
+                                 if getattr(op, 'resize_type', None) == 0 and hasattr(op, 'limit_side_len')), None)
+        self.adaptive_det = adaptive_det and self._det_resize is not None
+        self.last_timing = None
+
+    def _detection_side(self, img):
+        """Cạnh dài của ảnh detection, None = để detector dùng cấu hình mặc định"""
+        char_height = estimate_char_height(img)
+        if char_height is None:
+            return None
+        long_side = max(img.shape[:2])
+        side = long_side * self.det_target_char_px / char_height
+        return int(min(max(side, DET_MIN_SIDE), DET_MAX_SIDE, long_side))
+
+    def _detector_for(self, side):
+        """
+        Bản sao nông của text_detector với DetResizeForTest riêng (cạnh dài = side).
+        Op của engine dùng chung không bị sửa -> cấu hình resize của request này không
+        lọt sang detection của caller khác; predictor vẫn dùng chung (không nạp lại model).
+        """
+        resize = copy.copy(self._det_resize)
+        resize.limit_side_len, resize.limit_type = side, 'max'   # Detector không resize thêm (chỉ làm tròn bội 32)
+        detector = copy.copy(self.engine.text_detector)
+        detector.preprocess_op = [resize if op is self._det_resize else op for op in detector.preprocess_op]
+        return detector
+
+    def _detect_boxes(self, img):
+        side = self._detection_side(img) if self.adaptive_det else None
+        if side is None:
+            dt_boxes, _ = self.engine.text_detector(img)
+            return dt_boxes
+
+        h, w = img.shape[:2]
+        scale = side / max(h, w)
+        small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img
+        dt_boxes, _ = self._detector_for(side)(small)
+        if dt_boxes is None or len(dt_boxes) == 0 or scale >= 1:
+            return dt_boxes
+
+        # Map box về toạ độ ảnh gốc
+        dt_boxes = np.asarray(dt_boxes, dtype=np.float32) / scale
+        dt_boxes[..., 0] = np.clip(dt_boxes[..., 0], 0, w - 1)
+        dt_boxes[..., 1] = np.clip(dt_boxes[..., 1], 0, h - 1)
+        return dt_boxes
+
+    def _detect(self, img):
+        dt_boxes = self._detect_boxes(img)
+        if dt_boxes is None or len(dt_boxes) == 0:
+            return [], []
+        dt_boxes = sorted_boxes(dt_boxes)
+        crop = get_rotate_crop_image if self.box_type == 'quad' else get_minarea_rect_crop
+        crops = [crop(img, copy.deepcopy(box)) for box in dt_boxes]
+        return dt_boxes, crops
+
+    def ocr(self, image, cls=None):
+        """Một trang -> kết quả định dạng PaddleOCR.ocr()"""
+        return self.ocr_batch([image], cls)[0]
+
+    def ocr_batch(self, images, cls=None):
+        """
+        OCR nhiều trang với recognition chung.
+
+        Args:
+            images: list đường dẫn / bytes / ndarray
+            cls: Ghi đè self.cls cho lần gọi này
+
+        Returns:
+            list kết quả theo định dạng PaddleOCR.ocr() ([lines] hoặc [None]), cùng thứ tự
+        """
+        cls = self.cls if cls is None else cls and getattr(self.engine, 'use_angle_cls', False)
+        start = time.time()
+        page_boxes = []
+        all_crops = []
+        for image in images:
+            img = load_image(image)
+            if img is None:
+                logging.warning(f"⚠️ Cannot read image: {image if isinstance(image, str) else type(image)}")
+                page_boxes.append([])
+                continue
+            boxes, crops = self._detect(img)
+            page_boxes.append(boxes)
+            all_crops.extend(crops)
+        det_time = time.time() - start
+
+        rec_res = []
+        if all_crops:
+            if cls:
+                all_crops, _, _ = self.engine.text_classifier(all_crops)
+            rec_res, _ = self._recognizer(all_crops)
+        rec_time = time.time() - start - det_time
+
+        results = []
+        offset = 0
+        drop_score = self.engine.drop_score
+        for boxes in page_boxes:
+            page_rec = rec_res[offset:offset + len(boxes)]
+            offset += len(boxes)
+            lines = [[box.tolist(), res] for box, res in zip(boxes, page_rec) if res[1] >= drop_score]
+            results.append([lines or None])
+
+        self.last_timing = {
+            'pages': len(images),
+            'crops': len(all_crops),
+            'detection': round(det_time, 3),
+            'recognition': round(rec_time, 3),
+        }
+        return results
+
+    def iter_ocr(self, images, batch_pages=8):
+        """Yields (image, result) - gom batch_pages trang cho mỗi lần recognition"""
+        images = list(images)
+        for i in range(0, len(images), batch_pages):
+            chunk = images[i:i + batch_pages]
+            for image, result in zip(chunk, self.ocr_batch(chunk)):
+                yield image, result
@@ -0,0 +1,626 @@
+"""
+Paddle Worker Pool - nhiều process PaddleOCR cho fast mode
+
+Một PaddleOCR instance trong process API chỉ chạy được một request mỗi lúc
+(instance không thread-safe, và GIL + cpu_threads cố định giới hạn mức song song).
+Pool này chạy N process worker, mỗi worker một PaddleOCR riêng:
+
+- cpu_threads chia đều số core cho các worker (tránh oversubscription)
+- Tuỳ chọn pin CPU affinity: mỗi worker một nhóm core liền nhau
+- Ảnh đã decode truyền qua multiprocessing.shared_memory (không pickle mảng pixel)
+- Dispatch tới worker đang có ít việc nhất (least-loaded)
+
+Giám sát (Paddle inference tích RSS dần, một ảnh lỗi có thể treo/crash engine):
+- Recycle worker sau max_requests request hoặc khi RSS vượt max_rss_mb
+- Luôn có một worker standby đã load model: recycle = đổi slot, không cold start
+- Worker crash / quá task_timeout -> task đang chạy được gửi lại cho worker khác
+  (tối đa max_retries lần, tránh một ảnh độc làm chết lần lượt mọi worker).
+  Timeout tính từ lúc worker báo 'started' (không phải lúc xếp hàng); task còn trong
+  queue của worker chết được gửi lại mà không tính là một lần thử
+- Worker chết trước khi 'ready' (không tạo được engine: thiếu model, cài đặt hỏng) ->
+  spawn lại với backoff luỹ thừa; sau max_start_failures lần liên tiếp pool chuyển sang
+  unhealthy: mọi Future đang chờ nhận lỗi kèm exit code, submit() từ chối, không spawn nữa
+
+Usage:
+    pool = PaddleWorkerPool(num_workers=4, pin_cpus=True, max_requests=500, max_rss_mb=1500)
+    pool.start()
+    result = pool.ocr('page.jpg')                       # sync
+    result = await asyncio.wrap_future(pool.submit(img)) # async (FastAPI)
+
+Chọn số worker: đo throughput trên máy thật (số core, RAM, cpu_threads khác nhau):
+    python paddle_pool.py bench test_images/*.png --workers=1,2,4
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+DEFAULT_PADDLE_KWARGS = {
+    'use_angle_cls': False,
+    'enable_mkldnn': False,
+}
+MAX_RESTART_BACKOFF = 60.0
+
+
+def _set_affinity(cpu_ids):
+    if not cpu_ids:
+        return
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_ids)
+    elif HAS_PSUTIL:
+        psutil.Process().cpu_affinity(list(cpu_ids))
+
+
+def _rss_mb():
+    """RSS hiện tại của process (MB), None nếu không đo được"""
+    if HAS_PSUTIL:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _attach_shared(name):
+    """
+    Mở shared memory do process cha tạo. Worker (spawn) dùng chung resource_tracker
+    với process cha, nên việc register khi attach là idempotent; cha unlink khi xong.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(worker_id, cpu_ids, cpu_threads, backend, paddle_kwargs, task_queue, result_queue,
+                 engine_factory=None):
+    """
+    Vòng lặp của process worker. Message nhận:
+        None                                     -> thoát
+        ('affinity', cpu_ids)                    -> standby được đưa vào slot
+        ('ocr', task_id, shm, shape, dtype, cls) -> OCR ảnh trong shared memory
+    Message gửi về (result_queue):
+        ('ready', worker_id, pid, ...)           -> đã load model
+        ('started', worker_id, task_id, ...)     -> bắt đầu chạy task (mốc tính task_timeout)
+        (task_id, worker_id, result, error, duration, rss_mb)
+    """
+    _set_affinity(cpu_ids)
+    # Giới hạn thread của OpenMP/MKL trước khi import Paddle
+    os.environ['OMP_NUM_THREADS'] = str(cpu_threads)
+    os.environ['MKL_NUM_THREADS'] = str(cpu_threads)
+
+    if engine_factory is None:
+        from ocr_engine import create_engine as engine_factory
+    paddle_engine = engine_factory(backend, cpu_threads=cpu_threads, **paddle_kwargs)
+    from paddle_batch import BatchOCR
+    engine = BatchOCR(paddle_engine)
+    result_queue.put(('ready', worker_id, os.getpid(), None, 0.0, _rss_mb()))
+
+    while True:
+        message = task_queue.get()
+        if message is None:
+            break
+        if message[0] == 'affinity':
+            _set_affinity(message[1])
+            continue
+        _, task_id, shm_name, shape, dtype, cls = message
+        result_queue.put(('started', worker_id, task_id, None, 0.0, None))
+        start = time.time()
+        try:
+            shm = _attach_shared(shm_name)
+            try:
+                img = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                result = engine.ocr(img, cls=cls)
+            finally:
+                del img
+                shm.close()
+            result_queue.put((task_id, worker_id, result, None, time.time() - start, _rss_mb()))
+        except Exception as e:
+            result_queue.put((task_id, worker_id, None, f"{type(e).__name__}: {e}", time.time() - start, _rss_mb()))
+
+
+class _Worker:
+    def __init__(self, worker_id, cpu_ids):
+        self.id = worker_id
+        self.cpu_ids = cpu_ids
+        self.process = None
+        self.pid = None
+        self.tasks = None
+        self.inflight = 0
+        self.completed = 0
+        self.busy_time = 0.0
+        self.rss_mb = None
+        self.started_at = None
+        self.retiring = False
+        self.ready = threading.Event()
+        self.failures = 0            # Số lần chết liên tiếp trước 'ready' của slot này
+        self.respawn_at = None       # Đang chờ backoff, chưa có process
+
+
+class _Task:
+    def __init__(self, future, shm, shape, dtype, cls):
+        self.future = future
+        self.shm = shm
+        self.shape = shape
+        self.dtype = dtype
+        self.cls = cls
+        self.worker = None
+        self.dispatched_at = None
+        self.started_at = None       # Worker báo 'started' (None = còn trong queue)
+        self.attempts = 0            # Số lần worker chết khi đang chạy task này
+
+
+class PaddleWorkerPool:
+    """
+    Args:
+        num_workers: Số process (mặc định: số core // cpu_threads)
+        cpu_threads: Thread Paddle mỗi worker (mặc định: chia đều số core)
+        pin_cpus: Gắn mỗi worker vào một nhóm core cố định
+        backend: 'paddle' | 'onnx' (None = OCR_BACKEND, xem ocr_engine.py)
+        paddle_kwargs: Tham số PaddleOCR (mặc định giống 'paddle_fast')
+        max_requests: Recycle worker sau số request này (None = không giới hạn)
+        max_rss_mb: Recycle worker khi RSS vượt ngưỡng (MB)
+        standby: Giữ sẵn một worker đã load model để thay thế
+        max_retries: Số lần gửi lại task khi worker crash
+        task_timeout: Giây; task chạy (tính từ lúc worker bắt đầu) lâu hơn -> kill worker (coi như crash)
+        check_interval: Chu kỳ kiểm tra của supervisor (giây)
+        max_start_failures: Số lần liên tiếp một slot chết trước 'ready' thì pool thành unhealthy
+        restart_backoff: Chờ trước lần spawn lại đầu tiên (giây), nhân đôi mỗi lần
+        engine_factory: Callable(backend, cpu_threads=..., **paddle_kwargs) -> engine, hàm cấp
+            module (pickle được qua spawn); None = ocr_engine.create_engine
+    """
+
+    def __init__(self, num_workers=None, cpu_threads=None, pin_cpus=False, backend=None, paddle_kwargs=None,
+                 max_requests=None, max_rss_mb=None, standby=True, max_retries=1,
+                 task_timeout=None, check_interval=1.0, max_start_failures=5, restart_backoff=1.0,
+                 engine_factory=None):
+        cpu_count = os.cpu_count() or 1
+        if num_workers is None:
+            num_workers = max(1, cpu_count // (cpu_threads or 2))
+        self.num_workers = num_workers
+        self.cpu_threads = cpu_threads or max(1, cpu_count // num_workers)
+        self.pin_cpus = pin_cpus
+        self.backend = backend
+        self.paddle_kwargs = dict(DEFAULT_PADDLE_KWARGS, **(paddle_kwargs or {}))
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.use_standby = standby
+        self.max_retries = max_retries
+        self.task_timeout = task_timeout
+        self.check_interval = check_interval
+        self.max_start_failures = max_start_failures
+        self.restart_backoff = restart_backoff
+        self.engine_factory = engine_factory
+        self.failure = None                  # Lý do pool unhealthy (None = bình thường)
+
+        self._ctx = mp.get_context('spawn')   # fork + Paddle thread pool dễ deadlock
+        self._results = None
+        self._pending = {}                   # task_id -> _Task
+        self._lock = threading.RLock()
+        self._task_ids = itertools.count()
+        self._worker_ids = itertools.count()
+        self._collector = None
+        self._supervisor = None
+        self._stop = threading.Event()
+        self._closed = False
+        self.recycled = 0
+        self.crashed = 0
+        self.retried = 0
+
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(cpu_count))
+        self.workers = []                    # slot -> worker đang nhận việc
+        for i in range(num_workers):
+            cpu_ids = cpus[i * self.cpu_threads:(i + 1) * self.cpu_threads] if pin_cpus else None
+            if pin_cpus and not cpu_ids:
+                # Nhiều worker hơn core: quay vòng
+                cpu_ids = [cpus[i % len(cpus)]]
+            self.workers.append(_Worker(next(self._worker_ids), cpu_ids))
+        self.standby = None
+        self._retiring = []                  # worker đã rời slot, đang chạy nốt task còn lại
+        self._by_id = {}
+
+    # ----- Lifecycle -----
+
+    def start(self, wait=True, timeout=300):
+        """Khởi động các worker (load model trong từng process)"""
+        if self._collector is not None:
+            return self
+        self._results = self._ctx.Queue()
+        for worker in self.workers:
+            self._spawn(worker)
+        if self.use_standby:
+            self.standby = self._spawn(_Worker(next(self._worker_ids), None))
+        self._collector = threading.Thread(target=self._collect, name="paddle-pool-collector", daemon=True)
+        self._collector.start()
+        self._supervisor = threading.Thread(target=self._supervise, name="paddle-pool-supervisor", daemon=True)
+        self._supervisor.start()
+        logging.info(f"🚀 Starting {self.num_workers} Paddle workers × {self.cpu_threads} threads"
+                     f"{' (pinned)' if self.pin_cpus else ''}{' + standby' if self.use_standby else ''}")
+        if wait:
+            for worker in self.workers:
+                worker.ready.wait(timeout)
+            logging.info("✅ Paddle worker pool ready")
+        return self
+
+    @property
+    def healthy(self):
+        return self.failure is None
+
+    def _spawn(self, worker):
+        if worker.tasks is None:
+            worker.tasks = self._ctx.Queue()
+        worker.ready.clear()
+        worker.respawn_at = None
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.id, worker.cpu_ids, self.cpu_threads, self.backend, self.paddle_kwargs,
+                  worker.tasks, self._results, self.engine_factory),
+            name=f"paddle-worker-{worker.id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+        self._by_id[worker.id] = worker
+        return worker
+
+    def _respawn(self, worker, failures):
+        """
+        Spawn worker mới cho slot; failures > 0 (các lần trước chết trước 'ready') -> chỉ tạo
+        queue ngay (task vẫn dispatch được), process spawn sau backoff luỹ thừa
+        """
+        worker.failures = failures
+        if not failures:
+            return self._spawn(worker)
+        delay = min(self.restart_backoff * 2 ** (failures - 1), MAX_RESTART_BACKOFF)
+        worker.tasks = self._ctx.Queue()
+        worker.respawn_at = time.time() + delay
+        self._by_id[worker.id] = worker
+        logging.warning(f"⏳ Paddle worker failed to start {failures} time(s), respawning in {delay:.1f}s")
+        return worker
+
+    def _mark_unhealthy(self, worker, failures):
+        """Engine không tạo được lặp lại -> dừng spawn, trả lỗi cho mọi Future đang chờ"""
+        self.failure = (f"Paddle worker failed to start {failures} times in a row "
+                        f"(exit code {worker.process.exitcode})")
+        logging.error(f"❌ {self.failure}, pool marked unhealthy")
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for task in pending:
+            if task.worker is not None:
+                task.worker.inflight -= 1
+            self._release(task.shm)
+            if not task.future.done():
+                task.future.set_exception(RuntimeError(self.failure))
+
+    def shutdown(self, timeout=10):
+        self._closed = True
+        self._stop.set()
+        with self._lock:
+            everyone = self.workers + self._retiring + ([self.standby] if self.standby else [])
+        for worker in everyone:
+            if worker.tasks is not None:
+                worker.tasks.put(None)
+        for worker in everyone:
+            if worker.process is not None:
+                worker.process.join(timeout)
+        if self._results is not None:
+            self._results.put(None)
+            self._collector.join(timeout)
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for task in pending:
+            self._release(task.shm)
+            if not task.future.done():
+                task.future.set_exception(RuntimeError("Paddle worker pool shut down"))
+
+    # ----- Dispatch -----
+
+    def _pick_worker(self):
+        """Least-loaded: ít task đang chạy nhất, hoà thì worker tổng thời gian bận ít hơn (ưu tiên worker đã ready)"""
+        ready = [w for w in self.workers if w.ready.is_set()] or self.workers
+        return min(ready, key=lambda w: (w.inflight, w.busy_time))
+
+    def _dispatch(self, task_id, task):
+        """Gán task cho worker ít việc nhất (gọi khi đang giữ lock)"""
+        worker = self._pick_worker()
+        worker.inflight += 1
+        task.worker = worker
+        task.dispatched_at = time.time()
+        task.started_at = None
+        worker.tasks.put(('ocr', task_id, task.shm.name, task.shape, task.dtype, task.cls))
+
+    def submit(self, image, cls=False):
+        """
+        Gửi ảnh (đường dẫn / bytes / ndarray) cho worker ít việc nhất.
+
+        Returns:
+            concurrent.futures.Future -> kết quả định dạng PaddleOCR.ocr()
+        """
+        # Import muộn: worker (spawn) import module này, không được kéo paddleocr vào
+        # trước khi đặt OMP_NUM_THREADS
+        from paddle_batch import load_image
+
+        if self._closed or self._collector is None:
+            raise RuntimeError("Paddle worker pool is not running")
+        if self.failure:
+            raise RuntimeError(self.failure)
+        img = load_image(image)
+        if img is None:
+            raise ValueError("Cannot decode image")
+        img = np.ascontiguousarray(img)
+
+        # Pixel đi qua shared memory, queue chỉ mang tên segment + shape
+        shm = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+        np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+
+        task = _Task(Future(), shm, img.shape, img.dtype.str, cls)
+        task_id = next(self._task_ids)
+        with self._lock:
+            if self.failure:
+                self._release(shm)
+                raise RuntimeError(self.failure)
+            self._pending[task_id] = task
+            self._dispatch(task_id, task)
+        return task.future
+
+    def ocr(self, image, cls=False, timeout=None):
+        return self.submit(image, cls).result(timeout)
+
+    @staticmethod
+    def _release(shm):
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _collect(self):
+        """Nhận kết quả từ mọi worker và hoàn tất Future tương ứng"""
+        while True:
+            message = self._results.get()
+            if message is None:
+                return
+            task_id, worker_id, result, error, duration, rss_mb = message
+            worker = self._by_id.get(worker_id)
+            if worker is not None:
+                worker.rss_mb = rss_mb
+            if task_id == 'ready':
+                if worker is not None:
+                    worker.pid = result
+                    worker.ready.set()
+                continue
+            if task_id == 'started':
+                with self._lock:
+                    task = self._pending.get(result)
+                    if task is not None and task.worker is worker:
+                        task.started_at = time.time()
+                continue
+
+            with self._lock:
+                task = self._pending.pop(task_id, None)
+                if worker is not None:
+                    worker.completed += 1
+                    worker.busy_time += duration
+                if task is not None:
+                    task.worker.inflight -= 1
+                if worker is not None and self._should_recycle(worker):
+                    self._recycle(worker)
+            if task is None:
+                continue   # Task đã được gửi lại / đã huỷ
+            self._release(task.shm)
+            if error is not None:
+                task.future.set_exception(RuntimeError(error))
+            else:
+                task.future.set_result(result)
+
+    # ----- Supervision -----
+
+    def _should_recycle(self, worker):
+        if worker.retiring or worker not in self.workers:
+            return False
+        if self.max_requests and worker.completed >= self.max_requests:
+            return True
+        return bool(self.max_rss_mb and worker.rss_mb and worker.rss_mb > self.max_rss_mb)
+
+    def _recycle(self, worker):
+        """Đưa standby (đã warm) vào slot của worker; worker cũ chạy nốt queue rồi thoát"""
+        standby = self.standby
+        if standby is None or not standby.ready.is_set() or not standby.process.is_alive():
+            return   # Chờ standby sẵn sàng, không cold start trên đường request
+        self.workers[self.workers.index(worker)] = self._promote(standby, worker.cpu_ids)
+        worker.retiring = True
+        worker.tasks.put(None)   # FIFO: task đã xếp hàng vẫn được xử lý trước
+        self._retiring.append(worker)
+        self.recycled += 1
+        rss = f", {worker.rss_mb:.0f} MB" if worker.rss_mb else ""
+        logging.info(f"♻️ Recycling Paddle worker {worker.id} ({worker.completed} requests{rss}) -> worker {standby.id}")
+
+    def _promote(self, standby, cpu_ids):
+        self.standby = None
+        standby.cpu_ids = cpu_ids
+        if cpu_ids:
+            standby.tasks.put(('affinity', cpu_ids))
+        return standby
+
+    def _replace(self, worker):
+        """
+        Worker chết: lấy standby (hoặc spawn mới) vào slot; gửi lại task của nó.
+        Chết trước 'ready' được đếm liên tiếp theo slot -> backoff, quá max_start_failures
+        -> pool unhealthy (không spawn lại mãi với engine không tạo được)
+        """
+        failures = 0 if worker.ready.is_set() else worker.failures + 1
+        self._by_id.pop(worker.id, None)
+        if self.max_start_failures and failures >= self.max_start_failures:
+            if worker in self.workers:
+                self.workers[self.workers.index(worker)] = _Worker(next(self._worker_ids), worker.cpu_ids)
+            elif worker in self._retiring:
+                self._retiring.remove(worker)
+            elif worker is self.standby:
+                self.standby = None
+            self._mark_unhealthy(worker, failures)
+            return
+
+        if worker in self.workers:
+            standby = self.standby
+            if standby is not None and standby.process is not None and standby.process.is_alive():
+                replacement = self._promote(standby, worker.cpu_ids)
+            else:
+                replacement = self._respawn(_Worker(next(self._worker_ids), worker.cpu_ids), failures)
+            self.workers[self.workers.index(worker)] = replacement
+        elif worker in self._retiring:
+            self._retiring.remove(worker)
+        elif worker is self.standby:
+            self.standby = self._respawn(_Worker(next(self._worker_ids), None), failures) if failures else None
+
+        for task_id, task in list(self._pending.items()):
+            if task.worker is not worker:
+                continue
+            if task.started_at is None:
+                # Chưa chạy (còn trong queue của worker chết) -> gửi lại, không tính lần thử
+                self._dispatch(task_id, task)
+                continue
+            task.attempts += 1
+            if task.attempts > self.max_retries:
+                del self._pending[task_id]
+                self._release(task.shm)
+                task.future.set_exception(RuntimeError(
+                    f"Paddle worker crashed while processing image ({task.attempts} attempts)"))
+            else:
+                self.retried += 1
+                self._dispatch(task_id, task)
+
+    def _supervise(self):
+        while not self._stop.wait(self.check_interval):
+            self._check_workers()
+
+    def _check_workers(self):
+        """Một lượt giám sát: dọn worker đã recycle, kill task treo, thay worker chết"""
+        with self._lock:
+            if self.failure:
+                return
+            now = time.time()
+            for worker in self.workers + self._retiring + ([self.standby] if self.standby else []):
+                if self.failure:
+                    return
+                if worker.process is None:
+                    # Đang chờ backoff sau khi không khởi động được
+                    if worker.respawn_at is not None and now >= worker.respawn_at:
+                        self._spawn(worker)
+                    continue
+                alive = worker.process.is_alive()
+                if worker.retiring and not alive and worker.inflight == 0:
+                    # Worker recycle đã thoát bình thường
+                    worker.process.join(0)
+                    self._retiring.remove(worker)
+                    self._by_id.pop(worker.id, None)
+                    continue
+                if alive and self.task_timeout:
+                    # Chỉ task worker đang chạy; task xếp hàng sau nó không làm worker bị coi là treo
+                    running = min((t.started_at for t in self._pending.values()
+                                   if t.worker is worker and t.started_at is not None), default=None)
+                    if running is not None and now - running > self.task_timeout:
+                        logging.warning(f"⏱️ Paddle worker {worker.id} stuck > {self.task_timeout}s, killing")
+                        worker.process.kill()
+                        worker.process.join(5)
+                        alive = False
+                if not alive:
+                    self.crashed += 1
+                    logging.warning(f"💥 Paddle worker {worker.id} died "
+                                    f"(exit code {worker.process.exitcode}), {worker.inflight} task(s) in flight")
+                    self._replace(worker)
+
+            if self.use_standby and self.standby is None and not self._closed:
+                self.standby = self._spawn(_Worker(next(self._worker_ids), None))
+            # Recycle bị hoãn vì standby chưa sẵn sàng
+            for worker in list(self.workers):
+                if self._should_recycle(worker):
+                    self._recycle(worker)
+
+    # ----- Stats -----
+
+    @staticmethod
+    def _worker_stats(worker):
+        return {
+            'id': worker.id,
+            'pid': worker.pid,
+            'alive': worker.process is not None and worker.process.is_alive(),
+            'ready': worker.ready.is_set(),
+            'cpus': worker.cpu_ids,
+            'inflight': worker.inflight,
+            'completed': worker.completed,
+            'rss_mb': round(worker.rss_mb) if worker.rss_mb else None,
+            'avg_seconds': round(worker.busy_time / worker.completed, 3) if worker.completed else None,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': [self._worker_stats(w) for w in self.workers],
+                'standby': self._worker_stats(self.standby) if self.standby else None,
+                'retiring': len(self._retiring),
+                'cpu_threads': self.cpu_threads,
+                'pending': len(self._pending),
+                'recycled': self.recycled,
+                'crashed': self.crashed,
+                'retried': self.retried,
+                'healthy': self.healthy,
+                'failure': self.failure,
+            }
+
+
+def benchmark(images, worker_counts, rounds=2, cpu_threads=None):
+    """
+    Throughput (trang/giây) theo số worker: mỗi cấu hình gửi đồng thời images × rounds.
+
+    Returns:
+        [{'workers', 'cpu_threads', 'pages', 'seconds', 'pages_per_second'}]
+    """
+    rows = []
+    for num_workers in worker_counts:
+        pool = PaddleWorkerPool(num_workers=num_workers, cpu_threads=cpu_threads, standby=False).start()
+        try:
+            # Warm-up: request đầu của mỗi worker (init predictor) không tính vào thời gian
+            for future in [pool.submit(images[i % len(images)]) for i in range(num_workers)]:
+                future.result()
+            start = time.time()
+            for future in [pool.submit(image) for _ in range(rounds) for image in images]:
+                future.result()
+            seconds = time.time() - start
+        finally:
+            pool.shutdown()
+        pages = len(images) * rounds
+        rows.append({'workers': num_workers, 'cpu_threads': pool.cpu_threads, 'pages': pages,
+                     'seconds': round(seconds, 2), 'pages_per_second': round(pages / seconds, 2)})
+        logging.info(f"📊 {num_workers} workers × {pool.cpu_threads} threads: {pages / seconds:.2f} pages/s")
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    args = [a for a in sys.argv[2:] if not a.startswith('--')]
+    options = dict(a[2:].split('=', 1) for a in sys.argv[2:] if a.startswith('--') and '=' in a)
+    if len(sys.argv) < 3 or sys.argv[1] != 'bench' or not args:
+        print("Usage: python paddle_pool.py bench image1.png [image2.png ...] [--workers=1,2,4] [--rounds=2]")
+        sys.exit(1)
+    counts = [int(n) for n in options.get('workers', '1,2,4').split(',')]
+    rows = benchmark(args, counts, rounds=int(options.get('rounds', '2')))
+    print(f"{'workers':>8s}{'threads':>9s}{'pages':>7s}{'seconds':>9s}{'pages/s':>9s}")
+    for row in rows:
+        print(f"{row['workers']:>8d}{row['cpu_threads']:>9d}{row['pages']:>7d}{row['seconds']:>9.2f}"
+              f"{row['pages_per_second']:>9.2f}")
@@ -0,0 +1,30 @@
+"""
+Page metrics - đo nhanh đặc trưng ảnh trang (không cần model)
+
+Dùng để chọn độ phân giải: detection hai độ phân giải (paddle_batch.BatchOCR)
+và DPI render từng trang PDF (pdf_extractor.plan_page).
+"""
+import cv2
+import numpy as np
+
+
+def estimate_char_height(img, probe_side=800):
+    """
+    Chiều cao ký tự điển hình (px, theo ảnh gốc): median chiều cao các connected
+    component giống glyph trên ảnh probe đã nhị phân hoá. None nếu không đủ glyph.
+    """
+    h, w = img.shape[:2]
+    scale = min(1.0, probe_side / max(h, w))
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Bỏ nhiễu, đường kẻ, khung và ảnh minh hoạ
+    glyphs = (heights >= 2) & (heights <= gray.shape[0] * 0.1) & (widths <= heights * 5) & (stats[1:, cv2.CC_STAT_AREA] >= 4)
+    if glyphs.sum() < 20:
+        return None
+    return float(np.median(heights[glyphs])) / scale
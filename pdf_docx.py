@@ -0,0 +1,165 @@
+"""
+PDF -> DOCX giữ layout (pdf2docx), song song theo khoảng trang
+
+pdf2docx parse từng trang tuần tự trong một process, phần lớn thời gian là Python thuần
+(phân tích block, bảng, khoảng cách dòng) nên một core làm hết. Module này chia PDF thành
+các khoảng trang liên tiếp, mỗi process worker parse một khoảng rồi trả về kết quả đã
+serialize (Converter.store()); process chính restore các trang và dựng DOCX một lần.
+
+Không dùng multi_processing=True của pdf2docx: nó ghi pages-{i}.json vào thư mục hiện tại
+(hai request cùng lúc ghi đè lẫn nhau) và luôn mở Pool() bằng số core của máy.
+
+Font: thay vì duyệt từng run của từng paragraph / ô bảng, đặt font ở docDefaults + styles
+rồi xoá rFonts / sz ở cấp run (một lượt XPath trên body) để style áp dụng cho mọi run.
+
+Usage:
+    stats = convert_pdf_to_docx('report.pdf', 'report.docx')   # {'pages', 'workers', 'duration'}
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from pdf2docx import Converter
+
+DOCX_WORKERS = int(os.environ.get('PDF_DOCX_WORKERS', str(min(4, os.cpu_count() or 1))))
+MIN_PAGES_PER_WORKER = 4    # Ít trang hơn: chi phí spawn + parse_document lớn hơn phần tiết kiệm
+DEFAULT_FONT = 'Times New Roman'
+DEFAULT_FONT_SIZE = 13
+
+# Thuộc tính font cấp run bị bỏ để font của style áp dụng
+RUN_FONT_XPATH = './/w:r/w:rPr/w:rFonts | .//w:r/w:rPr/w:sz | .//w:r/w:rPr/w:szCs'
+
+_docx_executor = None
+_docx_lock = threading.Lock()
+
+
+def get_docx_executor():
+    """Process pool dùng chung cho pdf2docx (tạo lần đầu khi cần)"""
+    global _docx_executor
+    with _docx_lock:
+        if _docx_executor is None:
+            _docx_executor = ProcessPoolExecutor(max_workers=DOCX_WORKERS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return _docx_executor
+
+
+def _parse_range(pdf_path, start, end):
+    """Worker: parse trang [start, end) -> Converter.store() (chỉ các trang đã parse)"""
+    cv = Converter(pdf_path)
+    try:
+        settings = cv.default_settings
+        cv.load_pages(start, end)
+        cv.parse_document(**settings).parse_pages(**settings)
+        return cv.store()
+    finally:
+        cv.close()
+
+
+def page_ranges(total, workers, min_pages=MIN_PAGES_PER_WORKER):
+    """Chia [0, total) thành tối đa `workers` khoảng liên tiếp, mỗi khoảng >= min_pages trang"""
+    shards = max(1, min(workers, total // max(min_pages, 1)))
+    size, extra = divmod(total, shards)
+    ranges, start = [], 0
+    for i in range(shards):
+        end = start + size + (i < extra)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _set_rfonts(rpr, font_name):
+    rfonts = rpr.find(qn('w:rFonts'))
+    if rfonts is None:
+        rfonts = OxmlElement('w:rFonts')
+        rpr.insert(0, rfonts)
+    for attr in ('w:ascii', 'w:hAnsi', 'w:eastAsia', 'w:cs'):
+        rfonts.set(qn(attr), font_name)
+
+
+def apply_document_font(doc, font_name=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE):
+    """
+    Một font / cỡ chữ cho toàn văn bản: docDefaults + mọi style có font, bỏ font cấp run.
+
+    Returns:
+        Số thuộc tính cấp run đã xoá
+    """
+    rpr_default = doc.styles.element.find(qn('w:docDefaults'))
+    rpr_default = rpr_default.find(qn('w:rPrDefault')) if rpr_default is not None else None
+    rpr = rpr_default.find(qn('w:rPr')) if rpr_default is not None else None
+    if rpr is not None:
+        _set_rfonts(rpr, font_name)
+
+    for style in doc.styles:
+        font = getattr(style, 'font', None)
+        if font is None:
+            continue
+        font.name = font_name
+        font.size = Pt(font_size)
+        _set_rfonts(style.element.get_or_add_rPr(), font_name)
+
+    removed = 0
+    for element in doc.element.body.xpath(RUN_FONT_XPATH):
+        element.getparent().remove(element)
+        removed += 1
+    return removed
+
+
+def convert_pdf_to_docx(pdf_path, docx_path, workers=None, font_name=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE):
+    """
+    PDF -> DOCX giữ layout, parse song song theo khoảng trang, font áp ở cấp style.
+
+    Args:
+        workers: Số process parse (None = DOCX_WORKERS, <= 1 = trong process hiện tại)
+        font_name / font_size: Font cho toàn văn bản (None = giữ font pdf2docx nhận ra)
+
+    Returns:
+        {'pages', 'workers', 'duration'}
+    """
+    start = time.time()
+    workers = DOCX_WORKERS if workers is None else workers
+    with fitz.open(pdf_path) as doc:
+        total = len(doc)
+    ranges = page_ranges(total, workers) if workers > 1 else [(0, total)]
+
+    cv = Converter(pdf_path)
+    try:
+        if len(ranges) <= 1:
+            cv.convert(docx_path)
+        else:
+            executor = get_docx_executor()
+            futures = [executor.submit(_parse_range, pdf_path, first, last) for first, last in ranges]
+            for future in futures:
+                cv.restore(future.result())
+            cv.make_docx(docx_path, **cv.default_settings)
+    finally:
+        cv.close()
+
+    if font_name:
+        doc = Document(docx_path)
+        apply_document_font(doc, font_name, font_size)
+        doc.save(docx_path)
+
+    duration = time.time() - start
+    logging.info(f"📝 PDF -> DOCX: {total} pages, {len(ranges)} workers, {duration:.2f}s")
+    return {'pages': total, 'workers': len(ranges), 'duration': round(duration, 2)}
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if len(sys.argv) < 2:
+        print("Usage: python pdf_docx.py input.pdf [output.docx] [workers]")
+        sys.exit(1)
+    source = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + '.docx'
+    stats = convert_pdf_to_docx(source, target, int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    print(f"✅ {target} ({stats['pages']} pages, {stats['workers']} workers, {stats['duration']}s)")
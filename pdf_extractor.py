@@ -1,13 +1,80 @@
 import fitz  # PyMuPDF
+import hashlib
+import itertools
+import logging
+import multiprocessing
 import os
+import re
+import threading
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def extract_text_from_pdf(pdf_path):
+import numpy as np
+
+from ocr_layout import OcrLayout
+from page_metrics import estimate_char_height
+from vn_index import is_valid_syllable
+
+# Page planner: DPI render nhỏ nhất để x-height của chữ nhỏ nhất đáng kể đạt mục tiêu
+TARGET_X_HEIGHT_PX = 12     # ~x-height của body 13-14pt ở 144 dpi (Matrix(2, 2) trước đây)
+MIN_DPI = 72
+MAX_DPI = 300
+DEFAULT_DPI = 150
+PROBE_DPI = 96
+X_HEIGHT_RATIO = 0.5        # x-height / font size (Times ~0.45, Arial ~0.52)
+SMALL_TEXT_PERCENTILE = 5   # Bỏ qua vài ký tự lẻ cỡ siêu nhỏ (số trang, ký hiệu)
+MIN_TEXT_CHARS = 50
+# Ảnh nhúng dùng trực tiếp được (OpenCV / Ollama đều đọc được)
+EMBEDDED_FORMATS = {'jpeg': 'jpg', 'png': 'png'}
+
+# Rasterizer song song: mỗi task mở document riêng trong process worker
+RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+RENDER_CHUNK_PAGES = 4
+
+_render_executor = None
+_render_lock = threading.Lock()
+
+# Phân loại text layer từng trang: 'text' | 'mixed' | 'scan' | 'empty'
+TEXT_QUALITY_MIN = 0.85     # min(glyph hợp lệ, từ tiếng Việt hợp lệ) để tin text layer
+MIN_OCR_REGION = 0.05       # Vùng ảnh < 5% diện tích trang không đáng OCR riêng
+REGION_MIN_CHARS = 20       # Vùng ảnh có ít ký tự text layer hơn -> coi là thiếu text
+SCAN_AREA = 0.6             # Vùng thiếu text phủ >= 60% trang -> OCR cả trang
+CLASSIFY_BLOCK_PAGES = 16   # Số trang phân loại + render trước mỗi lượt
+
+# Text layer ẩn cho PDF searchable: font TTF có đủ glyph tiếng Việt (PDF_TEXT_FONT ghi đè)
+TEXT_LAYER_FONTS = [
+    os.environ.get('PDF_TEXT_FONT', ''),
+    'C:/Windows/Fonts/times.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf',
+    '/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+]
+TEXT_LAYER_FONT_NAME = 'ocrtext'
+
+_TONES = ('', '\u0300', '\u0301', '\u0303', '\u0309', '\u0323')
+_VOWEL_SHAPES = {'a': ('', '\u0302', '\u0306'), 'e': ('', '\u0302'), 'o': ('', '\u0302', '\u031b'),
+                 'u': ('', '\u031b'), 'i': ('',), 'y': ('',)}
+VIETNAMESE_LETTERS = set('abcdefghijklmnopqrstuvwxyzđ') | {
+    unicodedata.normalize('NFC', vowel + shape + tone)
+    for vowel, shapes in _VOWEL_SHAPES.items() for shape in shapes for tone in _TONES}
+# U+FFFD, private use (glyph không map được Unicode), control, surrogate
+INVALID_GLYPH = re.compile('[\ufffd\ue000-\uf8ff\U000f0000-\U0010ffff\x00-\x08\x0e-\x1f\x7f-\x9f\ud800-\udfff]')
+WORD_SPLIT = re.compile(r'[\s.,;:!?()\[\]{}<>"\'«»“”‘’\-–—/\\…*%+=#&|_]+')
+
+def extract_text_from_pdf(pdf_path, ocr_image=None, pages=None):
     """
     Extract text directly from the PDF's text layer (no OCR)
     
     Args:
         pdf_path: Path to PDF file
+        ocr_image: Callback OCR cho trang / vùng ảnh thiếu text layer tốt
+                   (xem extract_page_text), None = chỉ text layer
+        pages: Khoảng trang '1-5,8' (1-based) / list index, None = tất cả
         
     Returns:
         String containing extracted text
@@ -16,30 +83,633 @@ def extract_text_from_pdf(pdf_path):
         return f"⚠️ File not found: {pdf_path}"
         
     try:
-        doc = fitz.open(pdf_path)
-        full_text = []
-        
         print(f"📄 Extracting text from: {pdf_path}")
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            full_text.append(f"--- PAGE {page_num + 1} ---\n{text}")
-            
-        doc.close()
+        full_text = [f"--- PAGE {result['page'] + 1} ---\n{result['text']}"
+                     for result in iter_pdf_text(pdf_path, pages, ocr_image)]
         return "\n\n".join(full_text)
         
     except Exception as e:
         return f"❌ Error extracting text: {e}"
 
-def pdf_to_images(pdf_path, output_folder="pdf_images", dpi=150):
+def _dominant_image(page, min_coverage=0.5):
+    """Ảnh phủ >= min_coverage diện tích trang (trang scan) -> {'width', 'height', 'bbox', 'dpi'}"""
+    page_area = abs(page.rect)
+    best = None
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox']) & page.rect
+        if bbox.is_empty or abs(bbox) < page_area * min_coverage:
+            continue
+        if best is None or abs(bbox) > abs(fitz.Rect(best['bbox'])):
+            best = info
+    if best is None:
+        return None
+    bbox = fitz.Rect(best['bbox'])
+    # Độ phân giải gốc của ảnh scan (pixel / inch trên trang)
+    dpi = min(best['width'] / bbox.width, best['height'] / bbox.height) * 72
+    return {'width': best['width'], 'height': best['height'], 'bbox': tuple(bbox), 'dpi': dpi}
+
+
+def _small_font_size(page):
+    """Cỡ chữ nhỏ của text layer (percentile theo số ký tự), None nếu ít text"""
+    spans = [(span['size'], len(span['text'].strip()))
+             for block in page.get_text('dict')['blocks']
+             for line in block.get('lines', [])
+             for span in line['spans'] if span['text'].strip()]
+    total = sum(count for _, count in spans)
+    if total < MIN_TEXT_CHARS:
+        return None
+    seen = 0
+    for size, count in sorted(spans):
+        seen += count
+        if seen >= total * SMALL_TEXT_PERCENTILE / 100:
+            return size
+    return spans[-1][0]
+
+
+def _probe_x_height(page):
+    """Render xám độ phân giải thấp, đo chiều cao glyph -> points (None nếu không đo được)"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(PROBE_DPI / 72, PROBE_DPI / 72), colorspace=fitz.csGRAY, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    char_height = estimate_char_height(img, probe_side=max(img.shape))
+    return char_height * 72 / PROBE_DPI if char_height else None
+
+
+def plan_page(page, target_x_height=TARGET_X_HEIGHT_PX, min_dpi=MIN_DPI, max_dpi=MAX_DPI):
+    """
+    Chọn DPI render nhỏ nhất cho trang sao cho x-height của chữ nhỏ đạt target_x_height px.
+
+    Nguồn ước lượng (theo thứ tự):
+    - Trang scan (một ảnh phủ trang): probe render, không vượt DPI gốc của ảnh
+    - Text layer: cỡ chữ nhỏ (percentile) × X_HEIGHT_RATIO
+    - Còn lại: probe render; không đo được -> DEFAULT_DPI
+
+    Returns:
+        {'dpi', 'scale', 'source', 'x_height_pt', 'native_dpi'}
+    """
+    image = _dominant_image(page)
+    x_height, source = None, 'default'
+    if image is None:
+        size = _small_font_size(page)
+        if size:
+            x_height, source = size * X_HEIGHT_RATIO, 'text'
+    if x_height is None:
+        x_height = _probe_x_height(page)
+        source = 'probe' if x_height else 'default'
+
+    dpi = target_x_height / x_height * 72 if x_height else DEFAULT_DPI
+    if image is not None:
+        dpi = min(dpi, image['dpi'])   # Render vượt độ phân giải scan không thêm thông tin
+    dpi = int(round(min(max(dpi, min_dpi), max_dpi)))
+    return {
+        'dpi': dpi,
+        'scale': dpi / 72,
+        'source': source,
+        'x_height_pt': round(x_height, 2) if x_height else None,
+        'native_dpi': round(image['dpi']) if image else None,
+    }
+
+
+def extract_page_image(doc, page, min_coverage=0.97):
+    """
+    Trang scan chỉ gồm một ảnh -> lấy nguyên stream ảnh nhúng (không render, không re-encode).
+
+    Chỉ dùng khi kết quả giống hệt render: một ảnh duy nhất phủ trang, không xoay/lật,
+    không mask, không text/vector/annotation đè lên (dấu, chữ ký...), JPEG/PNG RGB/xám.
+
+    Returns:
+        {'image': bytes, 'ext', 'width', 'height'} hoặc None (trang ghép -> phải render)
+    """
+    if page.rotation:
+        return None
+    infos = page.get_image_info(xrefs=True)
+    if len(infos) != 1 or not infos[0].get('xref') or infos[0].get('has-mask'):
+        return None
+    info = infos[0]
+    a, b, c, d, _, _ = info['transform']
+    if b or c or a <= 0 or d <= 0:
+        return None
+    if abs(fitz.Rect(info['bbox']) & page.rect) < abs(page.rect) * min_coverage:
+        return None
+    if page.get_text('text').strip() or page.get_drawings() or page.first_annot is not None:
+        return None
+
+    extracted = doc.extract_image(info['xref'])
+    if (not extracted or extracted['ext'] not in EMBEDDED_FORMATS
+            or extracted.get('smask') or extracted['colorspace'] not in (1, 3)):
+        return None
+    return {
+        'image': extracted['image'],
+        'ext': extracted['ext'],
+        'width': extracted['width'],
+        'height': extracted['height'],
+    }
+
+
+def plan_pages(pdf_path, **kwargs):
+    """plan_page() cho mọi trang của PDF"""
+    with fitz.open(pdf_path) as doc:
+        return [plan_page(page, **kwargs) for page in doc]
+
+
+@lru_cache(maxsize=65536)
+def _plausible_word(word):
+    """
+    None: không phải từ (số, ký hiệu); True/False: từ tiếng Việt hợp lệ hay không.
+    Từ gồm toàn chữ cái tiếng Việt; có dấu -> phải là một âm tiết hợp lệ (vn_index.is_valid_syllable)
+    """
+    if not any(ch.isalpha() for ch in word) or any(ch.isdigit() for ch in word):
+        return None
+    acronym = len(word) > 1 and word.isupper()
+    word = unicodedata.normalize('NFC', word.lower())
+    if not all(ch in VIETNAMESE_LETTERS for ch in word):
+        return False
+    if word.isascii() or acronym:
+        return True     # Từ không dấu / tiếng Anh / viết tắt (HĐND)
+    return is_valid_syllable(word)
+
+
+def text_layer_quality(text):
+    """
+    Chất lượng text layer:
+        glyph_validity: tỉ lệ ký tự không phải U+FFFD / private use / control (font encoding hỏng)
+        vietnamese: tỉ lệ từ có chữ cái là từ tiếng Việt hợp lệ (bắt font TCVN3/VNI: 'Céng hßa x·')
+    """
+    glyphs = len(text) - sum(map(len, re.findall(r'\s+', text)))
+    invalid = len(INVALID_GLYPH.findall(text))
+    # Từ lặp lại rất nhiều trong văn bản -> kiểm tra qua cache
+    words = [valid for valid in map(_plausible_word, WORD_SPLIT.split(text)) if valid is not None]
+    plausible = sum(words)
+    return {
+        'chars': glyphs,
+        'glyph_validity': 1 - invalid / glyphs if glyphs else 1.0,
+        'vietnamese': plausible / len(words) if words else 1.0,
+    }
+
+
+def _text_lines(page):
+    """Dòng text layer -> [(text, bbox)]"""
+    # Cùng flags với get_text() thường: không kèm image block (tốn thời gian với trang scan)
+    return [(''.join(span['text'] for span in line['spans']), tuple(line['bbox']))
+            for block in page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+            for line in block.get('lines', [])]
+
+
+def _inside(bbox, region):
+    x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return region[0] <= x <= region[2] and region[1] <= y <= region[3]
+
+
+def classify_page(page, min_quality=TEXT_QUALITY_MIN, lines=None):
+    """
+    Trang -> text layer dùng được tới đâu.
+
+    Returns:
+        {'page', 'kind', 'quality', 'glyph_validity', 'vietnamese', 'chars', 'coverage', 'ocr_regions'}
+        kind: 'text'  - text layer tốt, không cần OCR
+              'mixed' - text layer tốt nhưng có vùng ảnh thiếu text -> OCR các ocr_regions
+                        ({'bbox' (points), 'dpi'})
+              'scan'  - không có / hỏng text layer -> OCR cả trang
+              'empty' - trang trắng
+        coverage: tỉ lệ diện tích ảnh đã có text layer phủ lên
+        lines: _text_lines(page) nếu đã có (tránh extract lại)
+    """
+    lines = [(text, bbox) for text, bbox in (lines or _text_lines(page)) if text.strip()]
+    quality = text_layer_quality('\n'.join(text for text, _ in lines))
+    page_area = abs(page.rect)
+
+    # Vùng ảnh (đáng kể) mà text layer gần như không có chữ
+    image_area = weak_area = 0.0
+    regions = []
+    # get_image_info() phải parse lại nội dung trang -> chỉ gọi khi trang có tham chiếu ảnh
+    for info in page.get_image_info() if page.get_images() else []:
+        bbox = fitz.Rect(info['bbox']) & page.rect
+        if bbox.is_empty or abs(bbox) < page_area * MIN_OCR_REGION:
+            continue
+        image_area += abs(bbox)
+        chars = sum(len(text.strip()) for text, line_bbox in lines if _inside(line_bbox, bbox))
+        if chars < REGION_MIN_CHARS:
+            weak_area += abs(bbox)
+            native_dpi = min(info['width'] / bbox.width, info['height'] / bbox.height) * 72
+            regions.append({'bbox': tuple(bbox), 'dpi': int(min(max(native_dpi, DEFAULT_DPI), MAX_DPI))})
+
+    score = min(quality['glyph_validity'], quality['vietnamese'])
+    if quality['chars'] and score < min_quality:
+        kind, regions = 'scan', []
+    elif weak_area >= page_area * SCAN_AREA:
+        kind, regions = 'scan', []
+    elif regions:
+        kind = 'mixed'
+    elif quality['chars'] < MIN_TEXT_CHARS and page.get_drawings():
+        kind = 'scan'   # Chữ vẽ bằng vector (font đã outline) / không có text layer
+    elif not quality['chars']:
+        kind = 'empty'
+    else:
+        kind = 'text'
+    return {
+        'page': page.number,
+        'kind': kind,
+        'quality': round(score, 3),
+        'glyph_validity': round(quality['glyph_validity'], 3),
+        'vietnamese': round(quality['vietnamese'], 3),
+        'chars': quality['chars'],
+        'coverage': round(1 - weak_area / image_area, 3) if image_area else 1.0,
+        'ocr_regions': regions,
+    }
+
+
+def classify_pdf(pdf_path, **kwargs):
+    """classify_page() cho mọi trang của PDF"""
+    with fitz.open(pdf_path) as doc:
+        return [classify_page(page, **kwargs) for page in doc]
+
+
+def get_render_executor():
+    """Process pool dùng chung để render PDF (tạo lần đầu khi cần)"""
+    global _render_executor
+    with _render_lock:
+        if _render_executor is None:
+            # spawn: process API có thread Paddle/uvicorn, fork không an toàn
+            _render_executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+        return _render_executor
+
+
+def render_page(doc, page, dpi='auto', target_x_height=TARGET_X_HEIGHT_PX, extract_embedded=True):
+    """
+    Một trang -> ảnh trong bộ nhớ.
+
+    Returns:
+        {'page', 'data' (bytes), 'ext' ('jpg'/'png'), 'width', 'height', 'dpi', 'source'}
+        source: 'embedded' (ảnh scan gốc) | 'render' | 'cache'
+    """
+    embedded = extract_page_image(doc, page) if extract_embedded else None
+    if embedded:
+        return {'page': page.number, 'data': embedded['image'], 'ext': EMBEDDED_FORMATS[embedded['ext']],
+                'width': embedded['width'], 'height': embedded['height'], 'dpi': None, 'source': 'embedded'}
+
+    page_dpi = plan_page(page, target_x_height)['dpi'] if dpi == 'auto' else dpi
+    zoom = page_dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    return {'page': page.number, 'data': pix.tobytes('png'), 'ext': 'png',
+            'width': pix.width, 'height': pix.height, 'dpi': page_dpi, 'source': 'render'}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_dir_for(cache, options):
+    """Thư mục cache: <cache_dir>/<hash PDF>/<dpi>[-raw]"""
+    cache_dir, pdf_hash = cache
+    dpi, target_x_height, extract_embedded = options
+    dpi_key = f"auto{target_x_height}" if dpi == 'auto' else str(dpi)
+    return os.path.join(cache_dir, pdf_hash[:32], dpi_key + ('' if extract_embedded else '-raw'))
+
+
+def _cache_lookup(directory, indices):
+    """Tên file: <page>_<width>x<height>_<source>_<dpi>.<ext>"""
+    wanted = set(indices)
+    hits = {}
+    if not os.path.isdir(directory):
+        return hits
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        parts = stem.split('_')
+        if len(parts) != 4 or not parts[0].isdigit() or int(parts[0]) not in wanted:
+            continue
+        width, height = parts[1].split('x')
+        with open(os.path.join(directory, name), 'rb') as f:
+            data = f.read()
+        hits[int(parts[0])] = {'page': int(parts[0]), 'data': data, 'ext': ext[1:], 'width': int(width),
+                               'height': int(height), 'dpi': int(parts[3]) or None,
+                               'source': 'cache'}
+    return hits
+
+
+def _cache_store(directory, item):
+    os.makedirs(directory, exist_ok=True)
+    name = f"{item['page']:05d}_{item['width']}x{item['height']}_{item['source']}_{item['dpi'] or 0}.{item['ext']}"
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(item['data'])
+    os.replace(tmp, os.path.join(directory, name))
+
+
+def _render_pages(doc, indices, options, cache=None):
+    dpi, target_x_height, extract_embedded = options
+    directory = _cache_dir_for(cache, options) if cache else None
+    hits = _cache_lookup(directory, indices) if directory else {}
+    results = []
+    for index in indices:
+        item = hits.get(index)
+        if item is None:
+            item = render_page(doc, doc[index], dpi, target_x_height, extract_embedded)
+            if directory:
+                _cache_store(directory, item)
+        results.append(item)
+    return results
+
+
+def _render_range_task(pdf_path, indices, options, cache):
+    # Mở / đóng document trong từng task (~1 ms, nhỏ so với render một đoạn trang): worker
+    # không giữ handle sau khi iter_pdf_images() xong -> caller xoá được file tạm
+    # (Windows: PermissionError, POSIX: file đã xoá vẫn chiếm đĩa)
+    with fitz.open(pdf_path) as doc:
+        return _render_pages(doc, indices, options, cache)
+
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def iter_pdf_images(pdf_path, pages=None, dpi='auto', target_x_height=TARGET_X_HEIGHT_PX, extract_embedded=True,
+                    workers=None, chunk_pages=RENDER_CHUNK_PAGES, max_pending=None, cache_dir=None):
+    """
+    Rasterizer dạng generator: render các đoạn trang song song trên process pool,
+    yield ảnh trong bộ nhớ theo đúng thứ tự trang.
+
+    Args:
+        pages: Các page index (0-based) cần render, None = tất cả
+        dpi / target_x_height / extract_embedded: như render_page()
+        workers: <= 1 -> render ngay trong process hiện tại
+        chunk_pages: Số trang mỗi task
+        max_pending: Số task đang chạy tối đa (giới hạn RAM), mặc định 2 × workers
+        cache_dir: Cache render trên đĩa, key = hash PDF + trang + DPI
+
+    Yields:
+        dict của render_page()
+    """
+    total = page_count(pdf_path)
+    indices = list(range(total)) if pages is None else [i for i in pages if 0 <= i < total]
+    chunks = [indices[i:i + chunk_pages] for i in range(0, len(indices), chunk_pages)]
+    options = (dpi, target_x_height, extract_embedded)
+    cache = (cache_dir, file_hash(pdf_path)) if cache_dir else None
+    workers = RENDER_WORKERS if workers is None else workers
+
+    if workers <= 1 or len(chunks) <= 1:
+        with fitz.open(pdf_path) as doc:
+            for chunk in chunks:
+                yield from _render_pages(doc, chunk, options, cache)
+        return
+
+    executor = get_render_executor()
+    path = os.path.abspath(pdf_path)
+    remaining = iter(chunks)
+    pending = deque(executor.submit(_render_range_task, path, chunk, options, cache)
+                    for chunk in itertools.islice(remaining, max_pending or workers * 2))
+    try:
+        while pending:
+            results = pending.popleft().result()
+            chunk = next(remaining, None)
+            if chunk is not None:
+                pending.append(executor.submit(_render_range_task, path, chunk, options, cache))
+            yield from results
+    finally:
+        # Consumer dừng sớm (huỷ job / client ngắt) -> bỏ các task chưa chạy
+        for future in pending:
+            future.cancel()
+
+
+def _ocr_layout(ocr_lines, page_index, page_size, scale, offset=(0, 0)):
+    """[(text, box pixel)] của ảnh OCR -> OcrLayout theo points của trang"""
+    texts = [text for text, _ in ocr_lines]
+    boxes = np.full((len(texts), 4), np.nan, dtype=np.float32)
+    for row, (_, box) in enumerate(ocr_lines):
+        if box is None:
+            continue
+        points = np.asarray(box, dtype=np.float32).reshape(-1, 2)   # rect (x1, y1, x2, y2) hoặc quad
+        boxes[row] = (*points.min(axis=0), *points.max(axis=0))
+    boxes = boxes * np.array([scale[0], scale[1], scale[0], scale[1]], dtype=np.float32) \
+        + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+    page_sizes = np.zeros((page_index + 1, 2), dtype=np.float32)
+    page_sizes[page_index] = page_size
+    return OcrLayout(texts, boxes, np.full(len(texts), page_index), page_sizes)
+
+
+def render_region(page, bbox, dpi=DEFAULT_DPI):
+    """Vùng (points) của trang -> {'data' (PNG), 'width', 'height'}"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), clip=fitz.Rect(bbox))
+    return {'data': pix.tobytes('png'), 'width': pix.width, 'height': pix.height}
+
+
+def extract_page_text(page, info=None, ocr_image=None, rendered=None, lines=None):
+    """
+    Text của một trang theo phân loại: text layer khi tốt, OCR khi thiếu.
+
+    Args:
+        info: Kết quả classify_page() (None = tự phân loại)
+        ocr_image: Callback(image bytes, page_index) -> [(text, box pixel hoặc None)];
+                   None = chỉ dùng text layer
+        rendered: Ảnh trang từ render_page() (cho trang 'scan', None = tự render)
+        lines: _text_lines(page) nếu đã có
+
+    Returns:
+        {'page', 'kind', 'source' ('text_layer'|'ocr'|'mixed'|'none'), 'text', 'layout' (points), 'quality'}
+    """
+    lines = _text_lines(page) if lines is None else lines
+    info = info or classify_page(page, lines=lines)
+    index = page.number
+    page_size = (page.rect.width, page.rect.height)
+
+    if ocr_image is None or info['kind'] in ('text', 'empty'):
+        layout = _ocr_layout(lines, index, page_size, (1, 1))
+        text = ''.join(line + '\n' for line, _ in lines)   # == page.get_text(), không extract lần hai
+        source = 'text_layer' if text.strip() else 'none'
+    elif info['kind'] == 'scan':
+        rendered = rendered or render_page(page.parent, page)
+        ocr_lines = ocr_image(rendered['data'], index)
+        layout = _ocr_layout(ocr_lines, index, page_size,
+                             (page.rect.width / rendered['width'], page.rect.height / rendered['height']))
+        text = '\n'.join(layout.texts)
+        source = 'ocr'
+    else:
+        # Trang ghép: giữ text layer ngoài vùng ảnh, OCR từng vùng rồi trộn theo thứ tự đọc
+        regions = [region['bbox'] for region in info['ocr_regions']]
+        kept = [(text, bbox) for text, bbox in lines if not any(_inside(bbox, region) for region in regions)]
+        parts = [_ocr_layout(kept, index, page_size, (1, 1))]
+        for region in info['ocr_regions']:
+            x0, y0, x1, y1 = region['bbox']
+            image = render_region(page, region['bbox'], region['dpi'])
+            parts.append(_ocr_layout(ocr_image(image['data'], index), index, page_size,
+                                     ((x1 - x0) / image['width'], (y1 - y0) / image['height']), (x0, y0)))
+        layout = OcrLayout.concat(parts).reading_order()
+        text = layout.text()
+        source = 'mixed'
+
+    return {'page': index, 'kind': info['kind'], 'source': source, 'text': text, 'layout': layout, 'quality': info}
+
+
+def iter_pdf_pages(pdf_path, pages=None, ocr_image=None, min_quality=TEXT_QUALITY_MIN, cache_dir=None):
+    """
+    Yields extract_page_text() từng trang theo thứ tự, chỉ OCR trang / vùng thiếu text.
+    pages: list page index (0-based) hoặc chuỗi '1-5,8' (1-based), None = tất cả
+
+    Không OCR: từng trang một, trang đầu tiên ra ngay (PDF hàng nghìn trang không phải chờ).
+    Có OCR: phân loại từng khối CLASSIFY_BLOCK_PAGES trang; các trang 'scan' của khối được
+    render song song (iter_pdf_images) trong khi OCR chạy trên trang trước.
+    """
+    with fitz.open(pdf_path) as doc:
+        if pages is None or isinstance(pages, str):
+            indices = parse_page_range(pages, len(doc))
+        else:
+            indices = [i for i in pages if 0 <= i < len(doc)]
+        block_size = CLASSIFY_BLOCK_PAGES if ocr_image else 1
+        for start in range(0, len(indices), block_size):
+            if start % CLASSIFY_BLOCK_PAGES == 0:
+                # Store của MuPDF (font, object đã parse) tăng theo số trang -> giữ bộ nhớ phẳng
+                fitz.TOOLS.store_shrink(100)
+            block = [(doc[i], _text_lines(doc[i])) for i in indices[start:start + block_size]]
+            infos = [classify_page(page, min_quality, lines) for page, lines in block]
+            scans = [info['page'] for info in infos if info['kind'] == 'scan'] if ocr_image else []
+            images = iter_pdf_images(pdf_path, pages=scans, cache_dir=cache_dir) if scans else iter(())
+            try:
+                for (page, lines), info in zip(block, infos):
+                    rendered = next(images) if info['page'] in scans else None
+                    yield extract_page_text(page, info, ocr_image, rendered, lines)
+            finally:
+                if scans:
+                    images.close()
+
+
+def extract_pdf_pages(pdf_path, ocr_image=None, **kwargs):
+    """list kết quả iter_pdf_pages()"""
+    return list(iter_pdf_pages(pdf_path, ocr_image=ocr_image, **kwargs))
+
+
+def parse_page_range(spec, total):
+    """
+    '1-5,8,10-' (1-based, như hộp thoại in) -> [0, 1, 2, 3, 4, 7, 9, ..., total-1]
+
+    Raises:
+        ValueError: spec sai cú pháp hoặc khoảng ngược ('5-2')
+    """
+    if spec is None or not str(spec).strip():
+        return list(range(total))
+    selected = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        if not (first.strip() or last.strip()) or not all(v.strip().isdigit() for v in (first, last) if v.strip()):
+            raise ValueError(f"Invalid page range: {part!r}")
+        start = int(first) if first.strip() else 1
+        end = (int(last) if last.strip() else total) if sep else start
+        if first.strip() and last.strip() and start > end:
+            raise ValueError(f"Invalid page range: {part!r}")
+        selected.update(range(max(start, 1) - 1, min(end, total)))
+    return sorted(selected)
+
+
+def iter_pdf_text(pdf_path, pages=None, ocr_image=None, **kwargs):
+    """
+    Text từng trang dạng stream (bộ nhớ phẳng, không giữ text các trang trước).
+
+    Args:
+        pages: list page index (0-based) hoặc chuỗi '1-5,8' (1-based), None = tất cả
+        ocr_image: Callback OCR trang / vùng thiếu text (xem extract_page_text)
+
+    Yields:
+        {'page', 'kind', 'source', 'quality', 'text'}
+    """
+    for result in iter_pdf_pages(pdf_path, pages=pages, ocr_image=ocr_image, **kwargs):
+        yield {
+            'page': result['page'],
+            'kind': result['kind'],
+            'source': result['source'],
+            'quality': result['quality']['quality'],
+            'text': result['text'],
+        }
+
+
+def _text_layer_font(font_path=None):
+    """Font đầu tiên (font_path / TEXT_LAYER_FONTS) có glyph tiếng Việt -> (path, fitz.Font)"""
+    for path in [font_path] + TEXT_LAYER_FONTS:
+        if not path or not os.path.exists(path):
+            continue
+        font = fitz.Font(fontfile=path)
+        if all(font.has_glyph(ord(ch)) for ch in 'ệđưởỹ'):
+            return path, font
+    raise RuntimeError("No TrueType font with Vietnamese glyphs found (set PDF_TEXT_FONT)")
+
+
+def add_text_layer(pdf_path, layout, output_path, font_path=None):
+    """
+    Ghi kết quả OCR thành text layer ẩn (render_mode=3) vào bản sao của PDF -> PDF searchable.
+
+    Mỗi dòng của layout được đặt đúng box của nó (box theo toạ độ ảnh trang, quy về points
+    qua layout.page_sizes), giãn ngang cho vừa chiều rộng box để chọn / tìm text khớp ảnh.
+    Dòng đã có trong text layer gốc (trang 'mixed' / 'text') không ghi lại; dòng không có
+    box được xếp ở lề trái trang. Lần sau /ocr/pdf-text đọc thẳng text layer này.
+
+    Returns:
+        {'pages', 'lines', 'skipped'}
+    """
+    path, font = _text_layer_font(font_path)
+    height_unit = font.ascender - font.descender
+    stats = {'pages': 0, 'lines': 0, 'skipped': 0}
+
+    with fitz.open(pdf_path) as doc:
+        for page_index in sorted(set(layout.pages.tolist())):
+            if page_index >= len(doc):
+                continue
+            page = doc[page_index]
+            lines = layout.page(page_index)
+            width, height = layout.page_sizes[page_index] if page_index < len(layout.page_sizes) else (0, 0)
+            scale_x = page.rect.width / width if width else 1.0
+            scale_y = page.rect.height / height if height else 1.0
+            existing = [bbox for _, bbox in _text_lines(page)]
+            page.insert_font(fontname=TEXT_LAYER_FONT_NAME, fontfile=path)
+            free_y = page.rect.y0 + 12      # Dòng không có box xếp từ trên xuống
+
+            for text, box in zip(lines.texts, lines.boxes):
+                text = text.strip()
+                if not text:
+                    continue
+                if np.isnan(box).any():
+                    rect = fitz.Rect(page.rect.x0 + 2, free_y, page.rect.x1 - 2, free_y + 8)
+                    free_y = min(free_y + 8, page.rect.y1 - 8)
+                else:
+                    rect = fitz.Rect(box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y)
+                    if rect.is_empty or any(_inside(bbox, rect) for bbox in existing):
+                        stats['skipped'] += 1
+                        continue
+                # insert_text nhận toạ độ hiển thị, tự xử lý trang xoay
+                fontsize = max(rect.height / height_unit, 1.0)
+                baseline = fitz.Point(rect.x0, rect.y0 + font.ascender * fontsize)
+                natural = font.text_length(text, fontsize=fontsize)
+                stretch = rect.width / natural if natural else 1.0
+                page.insert_text(baseline, text, fontsize=fontsize, fontname=TEXT_LAYER_FONT_NAME,
+                                 render_mode=3, morph=(baseline, fitz.Matrix(stretch, 1)))
+                stats['lines'] += 1
+            stats['pages'] += 1
+
+        try:
+            doc.subset_fonts()      # Cần fontTools; không có thì giữ nguyên font đầy đủ
+        except Exception as e:
+            logging.debug(f"Font subsetting skipped: {e}")
+        doc.save(output_path, garbage=3, deflate=True)
+    return stats
+
+
+def pdf_to_images(pdf_path, output_folder="pdf_images", dpi='auto', target_x_height=TARGET_X_HEIGHT_PX,
+                  extract_embedded=True, workers=None, cache_dir=None):
     """
     Extract all pages from PDF as images
     
     Args:
         pdf_path: Path to PDF file
         output_folder: Folder to save images
-        dpi: Resolution (150 is good balance between quality and size)
+        dpi: Resolution; 'auto' = DPI riêng từng trang theo cỡ chữ (plan_page)
+        target_x_height: x-height mục tiêu (px) khi dpi='auto'
+        extract_embedded: Trang scan một ảnh -> ghi thẳng ảnh nhúng (JPEG giữ nguyên)
+        workers / cache_dir: xem iter_pdf_images()
     
     Returns:
         List of image paths
@@ -49,35 +719,25 @@ def pdf_to_images(pdf_path, output_folder="pdf_images", dpi=150):
     
     # Get PDF filename without extension
     pdf_name = Path(pdf_path).stem
-    
-    # Open PDF
-    doc = fitz.open(pdf_path)
+    total = page_count(pdf_path)
     image_paths = []
     
     print(f"📄 Processing: {pdf_path}")
-    print(f"📖 Total pages: {len(doc)}")
+    print(f"📖 Total pages: {total}")
     
-    # Extract each page
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Convert to image
-        # zoom factor = dpi / 72 (72 is default PDF DPI)
-        zoom = dpi / 72
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Save as PNG
+    for item in iter_pdf_images(pdf_path, dpi=dpi, target_x_height=target_x_height,
+                                extract_embedded=extract_embedded, workers=workers, cache_dir=cache_dir):
         output_path = os.path.join(
             output_folder, 
-            f"{pdf_name}_page_{page_num + 1:03d}.png"
+            f"{pdf_name}_page_{item['page'] + 1:03d}.{item['ext']}"
         )
-        pix.save(output_path)
+        with open(output_path, 'wb') as f:
+            f.write(item['data'])
         image_paths.append(output_path)
         
-        print(f"  ✅ Page {page_num + 1}/{len(doc)} → {output_path}")
+        detail = f"{item['dpi']} dpi" if item['dpi'] else item['source']
+        print(f"  ✅ Page {item['page'] + 1}/{total} ({detail}) → {output_path}")
     
-    doc.close()
     print(f"🎉 Extracted {len(image_paths)} pages to {output_folder}/\n")
     
     return image_paths
@@ -4,6 +4,10 @@ import ollama
 import logging
 from PIL import Image
 import io
+from generation_guard import guarded_chat, DEFAULT_MAX_TOKENS
+from model_manager import get_model_manager
+from grounding_parser import parse_grounding_output, parse_grounding_lines
+from ocr_layout import OcrLayout
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -15,29 +19,28 @@ class ProductionOCR:
     2. Speed: Model keep-alive + memory optimization
     """
     
-    def __init__(self, model_name="deepseek-ocr", keep_alive="60m"):
+    def __init__(self, model_name="deepseek-ocr", keep_alive="60m", model_manager=None):
         self.client = ollama.Client(host='http://127.0.0.1:11434')
         self.model_name = model_name
-        self.keep_alive = keep_alive  # Keep model in RAM for 60 minutes
+        # keep_alive is the upper bound; the manager adapts it to observed traffic
+        self.models = model_manager or get_model_manager()
+        self.models.register_ollama(model_name, keep_alive=keep_alive)
+        self.last_generation_stats = None
+        self.last_layout = None
         logging.info(f"🚀 Production OCR initialized: {self.model_name}")
-        logging.info(f"⚡ Model keep-alive: {self.keep_alive}")
+        logging.info(f"⚡ Model keep-alive: up to {keep_alive} (adaptive)")
         
         # Preload model into memory
         self._preload_model()
     
     def _preload_model(self):
         """Preload model into RAM to avoid first-request delay"""
-        try:
-            logging.info("🔄 Preloading model into memory...")
-            # Send a dummy request to load model
-            self.client.chat(
-                model=self.model_name,
-                messages=[{'role': 'user', 'content': 'warmup'}],
-                keep_alive=self.keep_alive
-            )
-            logging.info("✅ Model preloaded and ready")
-        except Exception as e:
-            logging.warning(f"⚠️ Preload failed (will load on first use): {e}")
+        self.models.warm(self.model_name)
+    
+    @property
+    def keep_alive(self):
+        """Adaptive keep_alive for the next request"""
+        return self.models.keep_alive(self.model_name)
     
     def preprocess_image(self, image_path, target_size=1024, enhance=True):
         """
@@ -89,29 +92,28 @@ class ProductionOCR:
     
     def parse_grounding_output(self, raw_output):
         """Parse grounding tags to extract clean text"""
-        import re
-        pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-        matches = re.findall(pattern, raw_output, re.DOTALL)
-        clean_text = '\n'.join([match[0] for match in matches])
-        return clean_text if clean_text else raw_output
+        return parse_grounding_output(raw_output)
     
     def process_image(self, 
                      image_path, 
                      prompt="Free OCR.",
                      clean_output=True,
                      preprocess=True,
-                     temperature=0.0):
+                     temperature=0.0,
+                     max_tokens=DEFAULT_MAX_TOKENS):
         """
         Process image with optimizations:
         - preprocess: Apply image enhancement (recommended: True)
         - temperature: Lower = more deterministic (0.0 best for OCR)
         - clean_output: Remove grounding tags
+        - max_tokens: Hard output cap; repetition loops are stopped earlier by the guard
         """
         if not os.path.exists(image_path):
             return f"❌ Error: File {image_path} not found"
 
         logging.info(f"📸 Processing: {image_path}")
         start_time = time.time()
+        self.models.get(self.model_name)  # Record one request for the adaptive keep_alive
         
         try:
             # Preprocess image if enabled
@@ -121,23 +123,26 @@ class ProductionOCR:
                 with open(image_path, 'rb') as f:
                     img_data = f.read()
             
-            # OCR with optimized parameters
-            response = self.client.chat(
-                model=self.model_name,
+            # OCR with optimized parameters (streamed + repetition guard)
+            content, self.last_generation_stats = guarded_chat(
+                self.client,
+                self.model_name,
                 messages=[{
                     'role': 'user',
                     'content': prompt,
                     'images': [img_data]
                 }],
-                options={
-                    'temperature': temperature,
-                    'num_predict': -1,  # No limit on output tokens
-                },
-                keep_alive=self.keep_alive  # Keep model in memory
+                options={'temperature': temperature},
+                keep_alive=self.keep_alive,  # Keep model in memory
+                image=img_data,
+                max_tokens=max_tokens
             )
             
             duration = time.time() - start_time
-            content = response['message']['content']
+            
+            # Boxes theo toạ độ ảnh gốc (toạ độ det đã chuẩn hoá nên không phụ thuộc preprocess resize)
+            width, height = Image.open(image_path).size
+            self.last_layout = OcrLayout.from_grounding(parse_grounding_lines(content), width, height)
             
             # Parse grounding tags if requested
             if clean_output:
@@ -163,7 +168,8 @@ class ProductionOCR:
             result = self.process_image(img_path, **kwargs)
             results.append({
                 'image': img_path,
-                'text': result
+                'text': result,
+                'generation': self.last_generation_stats
             })
         
         total_duration = time.time() - total_start
@@ -174,15 +180,7 @@ class ProductionOCR:
     
     def unload_model(self):
         """Manually unload model from memory to free RAM"""
-        try:
-            self.client.chat(
-                model=self.model_name,
-                messages=[],
-                keep_alive=0
-            )
-            logging.info("💾 Model unloaded from memory")
-        except Exception as e:
-            logging.warning(f"⚠️ Unload failed: {e}")
+        self.models.unload(self.model_name)
 
 if __name__ == "__main__":
     # Initialize once - model stays in memory
@@ -0,0 +1,181 @@
+"""
+INT8 recognition model - lượng tử hoá tĩnh model rec ONNX + cổng kiểm tra độ chính xác
+
+Trên VPS chỉ có CPU, recognition chiếm phần lớn thời gian fast mode với trang dày chữ.
+Script này:
+1. Tách data/train_images: 1/5 làm held-out, phần còn lại làm calibration
+2. Detection bằng engine FP32 -> crop dòng chữ (đúng tiền xử lý của TextRecognizer)
+3. quantize_static (QDQ, weight int8 per-channel) với crop calibration -> rec_int8.onnx
+4. Cổng chất lượng: CER của INT8 so với FP32 trên crop held-out
+   - CER <= ngưỡng -> ghi rec_int8.gate.json passed=true
+   - Vượt ngưỡng  -> passed=false, create_engine(rec_int8=True) từ chối dùng INT8
+   - Gate ghi sha256 của rec.onnx / rec_int8.onnx: model đổi sau đó -> gate không còn hiệu lực
+
+Usage:
+    python ocr_engine.py export                      # cần model FP32 ONNX trước
+    python quantize_rec.py [image_dir] [max_cer]     # mặc định data/train_images 0.01
+    OCR_BACKEND=onnx OCR_REC_INT8=1 uvicorn ocr_api:app
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+from ocr_engine import (INT8_GATE_FILE, INT8_REC_MODEL, ONNX_MODEL_DIR, ONNX_MODELS,
+                        char_error_rate, create_engine, int8_gate_hashes)
+from paddle_batch import BatchOCR, load_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DEFAULT_MAX_CER = 0.01
+HOLDOUT_EVERY = 5
+
+
+def split_images(image_dir):
+    """-> (calibration, held-out): mỗi ảnh thứ HOLDOUT_EVERY (theo tên) để kiểm tra"""
+    images = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+    holdout = images[::HOLDOUT_EVERY]
+    calibration = [path for path in images if path not in holdout]
+    return calibration, holdout
+
+
+def collect_crops(engine, images, max_crops=None):
+    """Crop dòng chữ từ detection FP32 (cùng cách cắt với BatchOCR)"""
+    batch = BatchOCR(engine)
+    crops = []
+    for path in images:
+        img = load_image(path)
+        if img is None:
+            continue
+        crops.extend(batch._detect(img)[1])
+        if max_crops and len(crops) >= max_crops:
+            return crops[:max_crops]
+    return crops
+
+
+class RecCalibrationReader(CalibrationDataReader):
+    """Mỗi crop một batch, chuẩn hoá đúng như TextRecognizer (giữ tỉ lệ, pad theo chiều rộng)"""
+
+    def __init__(self, recognizer, input_name, crops):
+        self.recognizer = recognizer
+        self.input_name = input_name
+        self.crops = iter(crops)
+        _, self.img_h, self.img_w = recognizer.rec_image_shape
+
+    def get_next(self):
+        crop = next(self.crops, None)
+        if crop is None:
+            return None
+        h, w = crop.shape[:2]
+        max_wh_ratio = max(self.img_w / self.img_h, w / float(h))
+        norm = self.recognizer.resize_norm_img(crop, max_wh_ratio)
+        return {self.input_name: norm[np.newaxis].astype(np.float32)}
+
+
+def quantize_recognizer(engine, calibration_crops, model_dir=ONNX_MODEL_DIR):
+    fp32_path = os.path.join(model_dir, ONNX_MODELS['rec'])
+    int8_path = os.path.join(model_dir, INT8_REC_MODEL)
+    recognizer = engine.text_recognizer
+    input_name = recognizer.input_tensor.name   # use_onnx: input_tensor là NodeArg của session
+
+    try:
+        # Shape inference + tối ưu graph trước khi lượng tử hoá (khuyến nghị của ORT)
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        prepared = fp32_path.replace('.onnx', '_prep.onnx')
+        quant_pre_process(fp32_path, prepared)
+    except Exception as e:
+        logging.warning(f"⚠️ quant_pre_process skipped: {e}")
+        prepared = fp32_path
+
+    quantize_static(
+        prepared,
+        int8_path,
+        RecCalibrationReader(recognizer, input_name, calibration_crops),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    if prepared != fp32_path:
+        os.remove(prepared)
+    return int8_path
+
+
+def recognize(engine, crops):
+    start = time.perf_counter()
+    rec_res, _ = engine.text_recognizer(crops)
+    return [text for text, _ in rec_res], time.perf_counter() - start
+
+
+def accuracy_gate(fp32_engine, int8_engine, crops, max_cer=DEFAULT_MAX_CER):
+    """CER của INT8 so với FP32 (tổng edit distance / tổng ký tự FP32) trên crop held-out"""
+    fp32_texts, fp32_time = recognize(fp32_engine, crops)
+    int8_texts, int8_time = recognize(int8_engine, crops)
+
+    errors = sum(char_error_rate(ref, hyp) * len(ref) for ref, hyp in zip(fp32_texts, int8_texts))
+    chars = sum(len(ref) for ref in fp32_texts)
+    cer = errors / chars if chars else 0.0
+    return {
+        'passed': cer <= max_cer,
+        'cer': round(cer, 5),
+        'max_cer': max_cer,
+        'lines': len(crops),
+        'identical_lines': sum(a == b for a, b in zip(fp32_texts, int8_texts)),
+        'fp32_rec_seconds': round(fp32_time, 3),
+        'int8_rec_seconds': round(int8_time, 3),
+        'speedup': round(fp32_time / int8_time, 2) if int8_time else None,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def build_int8_recognizer(image_dir='data/train_images', max_cer=DEFAULT_MAX_CER, model_dir=ONNX_MODEL_DIR,
+                          max_calibration_crops=600):
+    """Calibration -> quantize -> gate. Returns báo cáo gate (cũng ghi ra rec_int8.gate.json)"""
+    calibration, holdout = split_images(image_dir)
+    if not calibration or not holdout:
+        raise ValueError(f"Not enough images in {image_dir} for calibration + held-out set")
+
+    # Gate cũ không còn đúng cho model sắp tạo (kể cả khi quantize bị lỗi giữa chừng)
+    gate_path = os.path.join(model_dir, INT8_GATE_FILE)
+    if os.path.exists(gate_path):
+        os.remove(gate_path)
+
+    fp32_engine = create_engine('onnx', model_dir=model_dir, rec_int8=False)
+    logging.info(f"📐 Collecting crops: {len(calibration)} calibration / {len(holdout)} held-out images")
+    calibration_crops = collect_crops(fp32_engine, calibration, max_calibration_crops)
+    holdout_crops = collect_crops(fp32_engine, holdout)
+
+    logging.info(f"🔢 Quantizing recognition model with {len(calibration_crops)} crops...")
+    quantize_recognizer(fp32_engine, calibration_crops, model_dir)
+
+    # Engine INT8 dựng trực tiếp (bỏ qua gate cũ nếu có)
+    int8_engine = create_engine('onnx', model_dir=model_dir, rec_int8=True, check_gate=False)
+    report = accuracy_gate(fp32_engine, int8_engine, holdout_crops, max_cer)
+    report.update(calibration_images=len(calibration), holdout_images=len(holdout))
+    # create_engine() từ chối gate nếu một trong hai model đổi sau lần kiểm tra này
+    report.update(int8_gate_hashes(model_dir))
+
+    with open(gate_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    image_dir = sys.argv[1] if len(sys.argv) > 1 else 'data/train_images'
+    max_cer = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_MAX_CER
+
+    report = build_int8_recognizer(image_dir, max_cer)
+    print("=" * 70)
+    print(f"CER INT8 vs FP32: {report['cer'] * 100:.2f}% (max {max_cer * 100:.2f}%) "
+          f"on {report['lines']} held-out lines ({report['identical_lines']} identical)")
+    print(f"Recognition: FP32 {report['fp32_rec_seconds']:.2f}s / INT8 {report['int8_rec_seconds']:.2f}s "
+          f"({report['speedup']}x)")
+    if report['passed']:
+        print("✅ Gate passed - enable with OCR_BACKEND=onnx OCR_REC_INT8=1")
+    else:
+        print("❌ Gate failed - INT8 recognition stays disabled")
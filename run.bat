@@ -15,7 +15,7 @@ start gui_demo.html
 echo [INFO] Starting API Server...
 echo.
 
-:: Run the API
-python ocr_api.py
+:: Run the API (uvicorn import ocr_api:app - worker spawn không chạy lại khởi tạo)
+python -m uvicorn ocr_api:app --host 0.0.0.0 --port 8000
 
 pause
@@ -5,10 +5,15 @@ import logging
 import hashlib
 import json
 import sqlite3
+import threading
 from PIL import Image
 import io
 from pathlib import Path
-import fitz  # PyMuPDF
+from generation_guard import guarded_chat, merge_generation_stats
+from model_manager import get_model_manager
+from grounding_parser import GroundingLine, GroundingStreamParser, parse_grounding_output, parse_grounding_lines
+from ocr_layout import OcrLayout
+from pdf_extractor import add_text_layer, iter_pdf_pages, page_count
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
@@ -24,13 +29,17 @@ class SelfLearningOCR:
                  model_name="deepseek-ocr",
                  cache_db="ocr_cache.db",
                  vocab_file="learned_vocabulary.json",
-                 keep_alive="60m"):
+                 keep_alive="60m",
+                 model_manager=None,
+                 render_cache_dir=None):
         
         self.client = ollama.Client(host='http://127.0.0.1:11434')
         self.model_name = model_name
-        self.keep_alive = keep_alive
+        self.models = model_manager or get_model_manager()
+        self.models.register_ollama(model_name, keep_alive=keep_alive)
         self.cache_db = cache_db
         self.vocab_file = vocab_file
+        self.render_cache_dir = render_cache_dir   # Cache ảnh trang PDF đã render (None = tắt)
         
         # Initialize components
         self._init_cache_db()
@@ -43,7 +52,10 @@ class SelfLearningOCR:
     
     def _init_cache_db(self):
         """Initialize SQLite cache database"""
-        self.conn = sqlite3.connect(self.cache_db)
+        # API chạy OCR trong thread pool -> connection dùng chung giữa các thread,
+        # mọi truy cập đi qua self.db_lock (sqlite3.Connection không an toàn khi dùng song song)
+        self.conn = sqlite3.connect(self.cache_db, check_same_thread=False)
+        self.db_lock = threading.Lock()
         cursor = self.conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS ocr_cache (
@@ -63,6 +75,10 @@ class SelfLearningOCR:
                 timestamp INTEGER
             )
         ''')
+        # Migrate: thêm cột layout (text + boxes dạng cột, JSON) cho DB cũ
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(ocr_cache)')]
+        if 'layout' not in columns:
+            cursor.execute('ALTER TABLE ocr_cache ADD COLUMN layout TEXT')
         self.conn.commit()
         logging.info("✅ Cache database initialized")
     
@@ -81,17 +97,13 @@ class SelfLearningOCR:
             json.dump(self.vocabulary, f, ensure_ascii=False, indent=2)
     
     def _preload_model(self):
-        """Preload model into RAM"""
-        try:
-            logging.info("🔄 Preloading model...")
-            self.client.chat(
-                model=self.model_name,
-                messages=[{'role': 'user', 'content': 'warmup'}],
-                keep_alive=self.keep_alive
-            )
-            logging.info("✅ Model ready in memory")
-        except Exception as e:
-            logging.warning(f"⚠️ Preload failed: {e}")
+        """Preload model into RAM (qua ModelManager)"""
+        self.models.warm(self.model_name)
+    
+    @property
+    def keep_alive(self):
+        """keep_alive thích ứng theo traffic (ModelManager)"""
+        return self.models.keep_alive(self.model_name)
     
     def _compute_image_hash(self, image_path):
         """Compute perceptual hash of image for cache lookup"""
@@ -109,31 +121,44 @@ class SelfLearningOCR:
     
     def _check_cache(self, image_hash):
         """Check if result exists in cache"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            'SELECT ocr_result, usage_count FROM ocr_cache WHERE image_hash = ?',
-            (image_hash,)
-        )
-        result = cursor.fetchone()
-        if result:
-            # Update usage count
+        with self.db_lock:
+            cursor = self.conn.cursor()
             cursor.execute(
-                'UPDATE ocr_cache SET usage_count = usage_count + 1 WHERE image_hash = ?',
+                'SELECT ocr_result, usage_count FROM ocr_cache WHERE image_hash = ?',
                 (image_hash,)
             )
-            self.conn.commit()
-            return result[0]
+            result = cursor.fetchone()
+            if result:
+                # Update usage count
+                cursor.execute(
+                    'UPDATE ocr_cache SET usage_count = usage_count + 1 WHERE image_hash = ?',
+                    (image_hash,)
+                )
+                self.conn.commit()
+                return result[0]
         return None
     
-    def _save_to_cache(self, image_hash, image_path, ocr_result):
+    def _load_cached_layout(self, image_hash):
+        """Load structured layout đã cache (None nếu chưa có)"""
+        with self.db_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT layout FROM ocr_cache WHERE image_hash = ?', (image_hash,))
+            row = cursor.fetchone()
+        if row and row[0]:
+            return OcrLayout.from_dict(json.loads(row[0]))
+        return None
+    
+    def _save_to_cache(self, image_hash, image_path, ocr_result, layout=None):
         """Save OCR result to cache"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO ocr_cache 
-            (image_hash, image_path, ocr_result, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (image_hash, image_path, ocr_result, int(time.time())))
-        self.conn.commit()
+        layout_json = json.dumps(layout.to_dict(), ensure_ascii=False) if layout is not None else None
+        with self.db_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO ocr_cache 
+                (image_hash, image_path, ocr_result, timestamp, layout)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (image_hash, image_path, ocr_result, int(time.time()), layout_json))
+            self.conn.commit()
     
     def _apply_vocabulary_corrections(self, text):
         """Apply learned vocabulary corrections"""
@@ -144,22 +169,54 @@ class SelfLearningOCR:
     
     def parse_grounding_output(self, raw_output):
         """Parse grounding tags"""
-        import re
-        pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-        matches = re.findall(pattern, raw_output, re.DOTALL)
-        clean_text = '\n'.join([match[0] for match in matches])
-        return clean_text if clean_text else raw_output
+        return parse_grounding_output(raw_output)
+    
+    def _line_streamer(self, on_line, page_index):
+        """
+        Tạo callback on_token: parse grounding tăng dần và gọi on_line(page_index, line)
+        ngay khi mỗi dòng hoàn chỉnh (đã apply vocabulary corrections)
+        """
+        if on_line is None:
+            return None, None
+        parser = GroundingStreamParser(corrector=self._apply_vocabulary_corrections)
+        
+        def on_token(token):
+            for line in parser.feed(token):
+                on_line(page_index, line)
+        
+        def flush():
+            for line in parser.close():
+                on_line(page_index, line)
+        
+        return on_token, flush
     
-    def process_image(self, image_path, use_cache=True, prompt="Free OCR."):
+    def process_image(self, image_path, use_cache=True, prompt="Free OCR.", on_line=None,
+                      cancel_event=None, client=None):
+        """OCR ảnh / PDF -> text (xem process_image_detailed để lấy thêm layout + generation stats)"""
+        return self.process_image_detailed(image_path, use_cache, prompt, on_line, cancel_event, client)['text']
+    
+    def process_image_detailed(self, image_path, use_cache=True, prompt="Free OCR.", on_line=None,
+                               cancel_event=None, client=None):
         """
         Process image với self-learning:
         1. Check cache trước (instant response)
         2. Nếu miss cache → chạy OCR
         3. Apply vocabulary corrections
         4. Save to cache
+        
+        on_line: Callback(page_index, GroundingLine) nhận từng dòng ngay khi model sinh xong
+        (cho phép xử lý downstream trước khi generation kết thúc)
+        
+        cancel_event / client: huỷ giữa chừng (xem ocr_jobs.py); kết quả bị huỷ không được cache
+        
+        Returns:
+            {'text', 'layout' (OcrLayout: text + boxes theo toạ độ trang + page index, hoặc None),
+             'generation' (stats của guarded_chat, None khi cache hit / lỗi), 'cached'}
+            - trả về theo từng lần gọi vì instance dùng chung giữa các request song song
         """
+        result = {'text': None, 'layout': None, 'generation': None, 'cached': False}
         if not os.path.exists(image_path):
-            return f"❌ File not found: {image_path}"
+            return dict(result, text=f"❌ File not found: {image_path}")
         
         start_time = time.time()
         
@@ -170,45 +227,76 @@ class SelfLearningOCR:
             cached = self._check_cache(image_hash)
             if cached:
                 logging.info(f"⚡ CACHE HIT! Instant response in {time.time()-start_time:.3f}s")
-                return cached
+                return dict(result, text=cached, layout=self._load_cached_layout(image_hash), cached=True)
         
         # Step 2: OCR Processing
         # Step 2: OCR Processing (Multi-page PDF Support)
         logging.info(f"📸 Processing: {image_path}")
+        client = client or self.client
+        # Một request (dù PDF nhiều trang) cho keep_alive thích ứng
+        self.models.get(self.model_name)
         try:
             full_text = []
+            page_stats = []
+            page_layouts = []
             
             # Handle PDF - Process ALL pages
             if str(image_path).lower().endswith('.pdf'):
-                doc = fitz.open(image_path)
-                total_pages = len(doc)
+                total_pages = page_count(image_path)
                 
                 if total_pages == 0:
-                    return "❌ Empty PDF"
+                    return dict(result, text="❌ Empty PDF")
                 
                 logging.info(f"📄 PDF has {total_pages} pages. Processing sequentially...")
                 
-                for i, page in enumerate(doc):
-                    logging.info(f"   - Processing page {i+1}/{total_pages}...")
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img_data = pix.tobytes("png")
-                    
-                    response = self.client.chat(
-                        model=self.model_name,
+                def ocr_page(img_data, i):
+                    """Trang scan / vùng ảnh thiếu text layer -> [(text, box pixel)]"""
+                    on_token, flush = self._line_streamer(on_line, i)
+                    page_text, stats = guarded_chat(
+                        client,
+                        self.model_name,
                         messages=[{
                             'role': 'user',
                             'content': prompt + f" (Page {i+1})",
                             'images': [img_data]
                         }],
                         options={'temperature': 0.0},
-                        keep_alive=self.keep_alive
+                        keep_alive=self.keep_alive,
+                        image=img_data,
+                        on_token=on_token,
+                        cancel_event=cancel_event
                     )
+                    page_stats.append(stats)
+                    if flush:
+                        flush()
                     
-                    page_text = response['message']['content']
-                    page_text = self.parse_grounding_output(page_text)
-                    full_text.append(f"--- PAGE {i+1} ---\n{page_text}")
+                    width, height = Image.open(io.BytesIO(img_data)).size
+                    layout = OcrLayout.from_grounding(
+                        parse_grounding_lines(page_text, self._apply_vocabulary_corrections),
+                        width, height
+                    )
+                    return list(zip(layout.texts, layout.boxes))
                 
-                doc.close()
+                # Chỉ trang / vùng ảnh thiếu text layer tốt mới qua model; trang scan được
+                # render song song đi trước trong khi model đọc trang hiện tại
+                pages = iter_pdf_pages(image_path, ocr_image=ocr_page, cache_dir=self.render_cache_dir)
+                for page in pages:
+                    i = page['page']
+                    regions = len(page['quality']['ocr_regions'])
+                    detail = f", {regions} image regions" if page['source'] == 'mixed' else ""
+                    logging.info(f"   - Page {i+1}/{total_pages}: {page['kind']} -> {page['source']}{detail}")
+                    if on_line is not None and page['source'] == 'text_layer':
+                        for text in page['layout'].texts:
+                            on_line(i, GroundingLine(text, []))
+                    
+                    page_layouts.append(page['layout'])
+                    full_text.append(f"--- PAGE {i+1} ---\n{page['text']}")
+                    
+                    if cancel_event is not None and cancel_event.is_set():
+                        logging.info(f"🛑 Cancelled after page {i+1}/{total_pages}")
+                        break
+                
+                pages.close()   # Cancel -> bỏ các trang chưa render
                 ocr_result = "\n\n".join(full_text)
                 
             else:
@@ -216,34 +304,56 @@ class SelfLearningOCR:
                 with open(image_path, 'rb') as f:
                     img_data = f.read()
             
-                response = self.client.chat(
-                    model=self.model_name,
+                on_token, flush = self._line_streamer(on_line, 0)
+                ocr_result, stats = guarded_chat(
+                    client,
+                    self.model_name,
                     messages=[{
                         'role': 'user',
                         'content': prompt,
                         'images': [img_data]
                     }],
                     options={'temperature': 0.0},
-                    keep_alive=self.keep_alive
+                    keep_alive=self.keep_alive,
+                    image=img_data,
+                    on_token=on_token,
+                    cancel_event=cancel_event
                 )
+                page_stats.append(stats)
+                if flush:
+                    flush()
                 
-                ocr_result = response['message']['content']
+                width, height = Image.open(io.BytesIO(img_data)).size
+                page_layouts.append(OcrLayout.from_grounding(
+                    parse_grounding_lines(ocr_result, self._apply_vocabulary_corrections),
+                    width, height
+                ))
                 ocr_result = self.parse_grounding_output(ocr_result)
             
             # Step 3: Apply vocabulary corrections
             corrected_result = self._apply_vocabulary_corrections(ocr_result)
             
-            # Step 4: Save to cache
-            self._save_to_cache(image_hash, image_path, corrected_result)
+            # Step 4: Save to cache (bỏ qua kết quả dở dang khi bị huỷ)
+            layout = OcrLayout.concat(page_layouts)
+            generation = merge_generation_stats(page_stats)
+            result = dict(result, text=corrected_result, layout=layout, generation=generation)
+            
+            if cancel_event is not None and cancel_event.is_set():
+                logging.info(f"🛑 Cancelled after {time.time() - start_time:.2f}s (not cached)")
+                return result
+            
+            self._save_to_cache(image_hash, image_path, corrected_result, layout)
             
             duration = time.time() - start_time
             logging.info(f"✅ Completed in {duration:.2f}s (saved to cache)")
+            logging.info(f"🔢 Tokens generated: {generation['tokens_generated']}, "
+                         f"saved: {generation['tokens_saved']}")
             
-            return corrected_result
+            return result
             
         except Exception as e:
             logging.error(f"❌ Error: {e}")
-            return str(e)
+            return dict(result, text=str(e))
     
     def learn_correction(self, wrong_text, correct_text):
         """
@@ -255,11 +365,30 @@ class SelfLearningOCR:
             self._save_vocabulary()
             logging.info(f"📚 Learned: '{wrong_text}' → '{correct_text}'")
     
+    def export_searchable_pdf(self, pdf_path, output_path, cancel_event=None, client=None):
+        """
+        Bản sao PDF có text layer ẩn từ kết quả OCR (layout trong ocr_cache.db; chưa có thì OCR trước).
+        
+        Returns:
+            Thống kê của add_text_layer() ({'pages', 'lines', 'skipped'}), None nếu không có layout
+        """
+        layout = self._load_cached_layout(self._compute_image_hash(pdf_path))
+        if layout is None or not len(layout):
+            layout = self.process_image_detailed(pdf_path, cancel_event=cancel_event, client=client)['layout']
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+        if layout is None or not len(layout):
+            return None
+        stats = add_text_layer(pdf_path, layout, output_path)
+        logging.info(f"🔎 Searchable PDF: {stats['lines']} lines on {stats['pages']} pages -> {output_path}")
+        return stats
+    
     def get_cache_stats(self):
         """Thống kê cache performance"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*), SUM(usage_count) FROM ocr_cache')
-        count, total_hits = cursor.fetchone()
+        with self.db_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT COUNT(*), SUM(usage_count) FROM ocr_cache')
+            count, total_hits = cursor.fetchone()
         return {
             'cached_documents': count or 0,
             'total_cache_hits': total_hits or 0,
@@ -268,9 +397,10 @@ class SelfLearningOCR:
     
     def clear_cache(self):
         """Xóa cache (khi cần reset)"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM ocr_cache')
-        self.conn.commit()
+        with self.db_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM ocr_cache')
+            self.conn.commit()
         logging.info("🗑️ Cache cleared")
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import shutil
 import logging
 from fast_local_ocr import LocalOCR
 from collections import Counter
+from lexicon_artifact import publish_lexicon
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -50,16 +51,16 @@ class SmartTrainer:
         valid_count = 0
         trash_count = 0
         
-        for filename in files:
-            img_path = os.path.join(folder_path, filename)
+        # Batch OCR: recognition gom dòng của nhiều ảnh -> batch lớn, nhanh hơn nhiều khi bulk
+        # We bypass correct_text to get raw tokens for learning (skip SymSpell for validation phase)
+        img_paths = [os.path.join(folder_path, filename) for filename in files]
+        
+        for img_path, raw_lines in self.engine.ocr_raw_batch(img_paths):
+            filename = os.path.basename(img_path)
+            if raw_lines is None:
+                continue
             
-            # Use Fast Mode to read text quickly
-            # We bypass correct_text to get raw tokens for learning, 
-            # but here let's just use the engine's internal OCR
             try:
-                # Get raw lines from OCR engine directly to skip SymSpell for validation phase
-                # Accessing internal variable _ocr_raw for simplicity as defined in fast_local_ocr.py
-                raw_lines = self.engine._ocr_raw(img_path)
                 full_text = " ".join(raw_lines)
                 
                 is_valid, reason = self.is_valid_document(full_text)
@@ -121,6 +122,9 @@ class SmartTrainer:
         
         logging.info(f"✅ Dictionary updated! Learned {learned_count} new words.")
 
+        # Publish lexicon artifact mới -> API/worker tự hot-reload
+        publish_lexicon()
+
 if __name__ == "__main__":
     trainer = SmartTrainer()
     trainer.train_and_clean()
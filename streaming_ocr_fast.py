@@ -1,19 +1,33 @@
+import asyncio
 import json
 import os
 import time
 import cv2
 import numpy as np
-from paddleocr import PaddleOCR
+from ocr_engine import create_engine
 import re
+from tile_pipeline import TilePipeline, iter_fixed_tiles, plan_gutter_tiles
 
 class StreamingOCR:
-    def __init__(self, map_file='correction_map.json'):
+    def __init__(self, map_file='correction_map.json', ocr_provider=None, use_angle_cls=True):
+        """
+        ocr_provider: Callable() -> PaddleOCR instance dùng chung (ví dụ
+            lambda: model_manager.get('paddle_fast')); None = tự tạo engine riêng
+        """
         self.map_file = map_file
         self.correction_map = self._load_map()
-        print("⚡ Initializing PaddleOCR Engine...")
-        # show_log=False để log sạch sẽ hơn
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='vi', show_log=False)
-        print("✅ Engine Ready!")
+        self.use_angle_cls = use_angle_cls
+        if ocr_provider is None:
+            print("⚡ Initializing PaddleOCR Engine...")
+            # show_log=False để log sạch sẽ hơn
+            engine = create_engine(use_angle_cls=use_angle_cls)
+            ocr_provider = lambda: engine
+            print("✅ Engine Ready!")
+        self.ocr_provider = ocr_provider
+
+    @property
+    def ocr(self):
+        return self.ocr_provider()
 
     def _load_map(self):
         if os.path.exists(self.map_file):
@@ -46,10 +60,12 @@ class StreamingOCR:
                 
         return corrected_text
 
-    def process_stream_tiled(self, img_path, tile_height=1000, overlap=100):
+    def process_stream_tiled(self, img_path, tile_height=1000, overlap=100, snap_to_gutters=True):
         """
         Cắt ảnh thành từng phần (tile) và xử lý streaming từng phần.
         Giúp trả về kết quả ngay lập tức cho ảnh dài.
+
+        snap_to_gutters: Cắt tại khe trắng giữa các dòng; overlap chỉ dùng khi không tìm được khe
         """
         if not os.path.exists(img_path):
             yield f"Error: File {img_path} not found."
@@ -67,64 +83,98 @@ class StreamingOCR:
         h, w, _ = img.shape
         yield f"📏 Image Size: {w}x{h}\n"
 
-        # Chia nhỏ ảnh và xử lý từng phần
-        current_y = 0
-        tile_idx = 0
-        
-        while current_y < h:
-            tile_idx += 1
-            # Tính toán vùng cắt
-            y_end = min(current_y + tile_height, h)
-            # Thêm overlap để tránh cắt đôi chữ ở biên, trừ tile đầu tiên
-            y_start = max(0, current_y - overlap) if current_y > 0 else 0
-            
-            # Cắt tile
-            tile_img = img[y_start:y_end, 0:w]
-            
-            # yield f"   Processing Tile {tile_idx} (Y: {y_start}-{y_end})..."
-            
-            # OCR trên tile này
-            result = self.ocr.ocr(tile_img, cls=True)
-            
-            if result and result[0]:
-                # Sắp xếp và in ra ngay
-                blocks = result[0]
-                blocks.sort(key=lambda x: x[0][1]) # Sort theo Y
-                
-                line_buffer = []
-                curr_line_y = -1
-                
-                for line in blocks:
-                    text_content = line[1][0]
-                    box = line[0]
-                    # Tọa độ Y cục bộ trong tile
-                    local_y = box[0][1]
-                    # Tọa độ Y toàn cục
-                    global_y = local_y + y_start
-                    
-                    # Nếu text nằm trong vùng overlap phía trên (đã xử lý ở tile trước), bỏ qua
-                    # Để tránh in trùng lặp
-                    if current_y > 0 and local_y < overlap:
-                        continue
-                        
-                    # Logic gom dòng
-                    if curr_line_y != -1 and abs(local_y - curr_line_y) > 15:
-                        yield self._process_line_buffer(line_buffer)
-                        line_buffer = []
-                    
-                    line_buffer.append(text_content)
-                    if curr_line_y == -1: curr_line_y = local_y
-                    else: curr_line_y = local_y
-
-                if line_buffer:
-                    yield self._process_line_buffer(line_buffer)
-
-            # Cập nhật Y cho vòng lặp sau
-            current_y += tile_height - overlap if current_y + tile_height < h else tile_height
+        # Dây chuyền: cắt tile N+1 | OCR tile N | sửa lỗi tile N-1 chạy song song
+        pipeline, tiles = self._build_pipeline(img, tile_height, overlap, snap_to_gutters)
+        for line in pipeline.run(img, tiles):
+            yield line
 
         end_time = time.time()
         yield f"\n✅ Done in {end_time - start_time:.2f}s total."
 
+    async def aprocess_stream_tiled(self, img_path, tile_height=1000, overlap=100, snap_to_gutters=True,
+                                    executor=None, progress=True):
+        """
+        Bản async của process_stream_tiled() cho FastAPI: không block event loop,
+        Paddle inference chạy trong inference executor dùng chung (TilePipeline.arun).
+
+        progress=False: chỉ yield các dòng text (lỗi đọc ảnh -> raise thay vì yield)
+        """
+        if not os.path.exists(img_path):
+            if not progress:
+                raise FileNotFoundError(img_path)
+            yield f"Error: File {img_path} not found."
+            return
+
+        if progress:
+            yield f"🚀 Start processing {img_path} (Tiled Streaming)...\n"
+        start_time = time.time()
+
+        loop = asyncio.get_running_loop()
+        img = await loop.run_in_executor(None, cv2.imread, img_path)
+        if img is None:
+            if not progress:
+                raise ValueError(f"Unable to read image: {img_path}")
+            yield "Error: Unable to read image."
+            return
+
+        h, w, _ = img.shape
+        if progress:
+            yield f"📏 Image Size: {w}x{h}\n"
+
+        # Provider có thể phải load model -> không chạy trên event loop
+        pipeline, tiles = await loop.run_in_executor(
+            None, self._build_pipeline, img, tile_height, overlap, snap_to_gutters)
+        async for line in pipeline.arun(img, tiles, executor):
+            yield line
+
+        if progress:
+            yield f"\n✅ Done in {time.time() - start_time:.2f}s total."
+
+    def _build_pipeline(self, img, tile_height, overlap, snap_to_gutters):
+        """Kế hoạch cắt tile + TilePipeline dùng chung cho bản sync và async"""
+        if snap_to_gutters:
+            tiles = plan_gutter_tiles(img, tile_height, overlap)
+        else:
+            tiles = iter_fixed_tiles(img.shape[0], tile_height, overlap)
+
+        # Lấy engine một lần cho cả ảnh (provider có thể load model qua ModelManager)
+        engine = self.ocr
+        pipeline = TilePipeline(
+            ocr_fn=lambda tile_img: engine.ocr(tile_img, cls=self.use_angle_cls),
+            group_fn=self._group_tile_lines,
+            correct_fn=self._process_line_buffer
+        )
+        return pipeline, tiles
+
+    def _group_tile_lines(self, lines):
+        """
+        Gom các box thành dòng (list các line buffer).
+        Box đã ở toạ độ toàn trang và đã khử trùng lặp vùng overlap (TilePipeline).
+        """
+        buffers = []
+
+        # Sắp xếp theo Y của góc trên-trái
+        blocks = sorted(lines, key=lambda x: x[0][0][1])
+
+        line_buffer = []
+        curr_line_y = -1
+
+        for line in blocks:
+            text_content = line[1][0]
+            global_y = line[0][0][1]
+
+            # Logic gom dòng
+            if curr_line_y != -1 and abs(global_y - curr_line_y) > 15:
+                buffers.append(line_buffer)
+                line_buffer = []
+
+            line_buffer.append(text_content)
+            curr_line_y = global_y
+
+        if line_buffer:
+            buffers.append(line_buffer)
+        return buffers
+
     def _process_line_buffer(self, buffer):
         raw_line = " ".join(buffer)
         corrected_line = self.fuzzy_correct(raw_line)
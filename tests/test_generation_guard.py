@@ -0,0 +1,118 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from generation_guard import (RepetitionGuard, estimate_text_chars, estimate_token_budget, guarded_chat,
+                              merge_generation_stats)
+from grounding_parser import parse_grounding_lines
+
+LOOP_LINE = '<|ref|>Dòng lặp<|/ref|><|det|>[[10, 20, 300, 40]]<|/det|>\n'
+
+
+def feed_all(guard, tokens):
+    for token in tokens:
+        if guard.feed(token):
+            break
+    return guard
+
+
+def test_ngram_repeat_keeps_one_copy():
+    guard = feed_all(RepetitionGuard(max_ngram=4, min_repeats=4, min_span=8), ['x', 'y'] + ['a', 'b', 'c', 'd'] * 10)
+
+    assert guard.reason == 'ngram_repeat(n=4×4)'
+    assert guard.text() == 'xyabcd'
+    assert guard.trimmed_tokens == 12
+
+
+def test_line_repeat_trims_to_first_copy():
+    guard = feed_all(RepetitionGuard(), ['Tiêu đề\n'] + ['Dòng lặp\n'] * 10)
+
+    assert guard.reason == 'line_repeat×6'
+    assert guard.text() == 'Tiêu đề\nDòng lặp\n'
+
+
+def test_line_repeat_ignores_det_coordinates():
+    lines = [f'<|ref|>Dòng lặp<|/ref|><|det|>[[10, {y}, 300, {y + 20}]]<|/det|>\n' for y in range(0, 200, 20)]
+    guard = feed_all(RepetitionGuard(), lines)
+
+    assert guard.reason == 'line_repeat×6'
+    assert len(parse_grounding_lines(guard.text())) == 1
+
+
+def test_length_budget_stops_without_trim():
+    guard = feed_all(RepetitionGuard(token_budget=3), ['một ', 'hai ', 'ba ', 'bốn ', 'năm '])
+
+    assert guard.reason == 'length>3'
+    assert guard.trimmed_tokens == 0
+    assert guard.text() == 'một hai ba bốn '
+
+
+def test_normal_text_not_stopped():
+    guard = feed_all(RepetitionGuard(), [f'Dòng {i}\n' for i in range(50)])
+
+    assert guard.reason is None
+    assert guard.trimmed_tokens == 0
+
+
+class FakeStream(list):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, tokens):
+        self.stream = FakeStream({'message': {'content': token}} for token in tokens)
+        self.kwargs = None
+
+    def chat(self, **kwargs):
+        self.kwargs = kwargs
+        return self.stream
+
+
+def test_guarded_chat_streams_tail_that_is_later_trimmed():
+    client = FakeClient(['<|ref|>Tiêu đề<|/ref|><|det|>[[0, 0, 10, 10]]<|/det|>\n'] + [LOOP_LINE] * 10)
+    sent = []
+
+    text, stats = guarded_chat(client, 'deepseek-ocr', [], on_token=sent.append, max_tokens=100)
+
+    assert stats['aborted'] and stats['tokens_trimmed'] == 5
+    assert client.stream.closed
+    assert client.kwargs['options']['num_predict'] == 100
+    # Các token lặp đã gửi cho client trước khi guard dừng -> /ocr/stream phải gửi 'replace'
+    assert len(parse_grounding_lines(''.join(sent))) == 6
+    assert [line.text for line in parse_grounding_lines(text)] == ['Tiêu đề', 'Dòng lặp']
+
+
+def test_merge_generation_stats():
+    stats = [{'tokens_generated': 10, 'tokens_saved': 0, 'tokens_trimmed': 0, 'aborted': False},
+             {'tokens_generated': 20, 'tokens_saved': 5, 'tokens_trimmed': 3, 'aborted': True}]
+
+    assert merge_generation_stats(stats) == {'tokens_generated': 30, 'tokens_saved': 5, 'tokens_trimmed': 3,
+                                             'aborted': 1, 'calls': 2}
+
+
+def text_image(lines=10):
+    img = np.full((600, 800), 255, dtype=np.uint8)
+    for i in range(lines):
+        top = 40 + i * 50
+        img[top:top + 20, 50:750:6] = 0
+    return img
+
+
+def test_estimate_text_chars_counts_lines():
+    chars, lines = estimate_text_chars(Image.fromarray(text_image(10)))
+
+    assert lines == 10
+    assert chars > 0
+
+
+def test_estimate_token_budget_bounds():
+    buffer = io.BytesIO()
+    Image.fromarray(text_image(3)).save(buffer, format='PNG')
+
+    assert 1024 <= estimate_token_budget(buffer.getvalue(), max_tokens=8192) <= 8192
+    # Ảnh đọc lỗi -> dùng trần
+    assert estimate_token_budget(b'not an image', max_tokens=4096) == 4096
@@ -0,0 +1,60 @@
+from grounding_parser import (GroundingStreamParser, parse_det_boxes, parse_grounding_lines,
+                              parse_grounding_output)
+
+RAW = ('<|ref|>CỘNG HÒA<|/ref|><|det|>[[10, 20, 300, 40]]<|/det|>\n'
+       '<|ref|>Độc lập<|/ref|> <|det|>[[12, 50, 200, 70], [210, 50, 290, 70]]<|/det|>\n')
+
+
+def test_parse_det_boxes():
+    assert parse_det_boxes('[[10, 20, 300, 40], [1.5, 2, 3, 4]]') == [[10, 20, 300, 40], [1.5, 2, 3, 4]]
+    assert parse_det_boxes('[[10, 20, 300]]') == []
+
+
+def test_parse_grounding_output():
+    assert parse_grounding_output(RAW) == 'CỘNG HÒA\nĐộc lập'
+    assert parse_grounding_output('văn bản thường') == 'văn bản thường'
+
+
+def test_stream_matches_whole_parse():
+    parser = GroundingStreamParser()
+    streamed = []
+    for char in RAW:
+        streamed.extend(parser.feed(char))
+    streamed.extend(parser.close())
+
+    assert streamed == parse_grounding_lines(RAW)
+    assert [line.boxes for line in streamed] == [[[10, 20, 300, 40]], [[12, 50, 200, 70], [210, 50, 290, 70]]]
+    assert parser.has_grounding
+
+
+def test_line_emitted_when_det_closes():
+    parser = GroundingStreamParser()
+
+    assert parser.feed('<|ref|>Dòng<|/ref|><|de') == []
+    assert parser.feed('t|>[[1, 2, 3, 4]]<|/det|>') == [('Dòng', [[1, 2, 3, 4]])]
+
+
+def test_plain_text_lines():
+    parser = GroundingStreamParser()
+
+    assert parser.feed('dòng một\ndòng ') == [('dòng một', [])]
+    assert parser.close() == [('dòng', [])]
+    assert not parser.has_grounding
+    assert parser.text() == 'dòng một\ndòng'
+
+
+def test_truncated_tag_keeps_text():
+    parser = GroundingStreamParser()
+    parser.feed('<|ref|>bị cắt')
+
+    assert parser.close() == [('bị cắt', [])]
+
+
+def test_ref_without_det():
+    assert parse_grounding_lines('<|ref|>tiêu đề<|/ref|>\nnội dung') == [('tiêu đề', []), ('nội dung', [])]
+
+
+def test_corrector_applied():
+    lines = parse_grounding_lines(RAW, corrector=str.lower)
+
+    assert [line.text for line in lines] == ['cộng hòa', 'độc lập']
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import ROOT
+from lexicon_artifact import (CURRENT_FILE, PUBLISH_LOCK, MappedLexicon, LexiconStore, current_artifact,
+                              publish_lexicon)
+from text_corrector import TextCorrector
+from vn_index import VietnameseIndex
+
+DICTIONARY = os.path.join(ROOT, 'vn_dictionary.txt')
+
+
+@pytest.fixture
+def sources(tmp_path):
+    correction_map = tmp_path / 'correction_map.json'
+    correction_map.write_text(json.dumps({'cong lch': 'công ích'}, ensure_ascii=False), encoding='utf-8')
+    vocabulary = tmp_path / 'learned_vocabulary.json'
+    vocabulary.write_text(json.dumps({'vOn': 'vốn'}, ensure_ascii=False), encoding='utf-8')
+    return {'dictionary_path': DICTIONARY, 'correction_map_path': str(correction_map),
+            'vocabulary_path': str(vocabulary)}
+
+
+def test_mapped_lexicon_matches_in_memory_index(tmp_path, sources):
+    path = publish_lexicon(str(tmp_path / 'lexicon'), **sources)
+    lexicon = MappedLexicon(path)
+    index = VietnameseIndex.from_dictionary(DICTIONARY)
+    assert len(lexicon) == len(index)
+    assert 'định' in lexicon
+    for word in ['djnh', 'cOng', 'nghja', 'của', 'Quảng', 'hàt']:
+        assert lexicon.lookup(word) == index.lookup(word)
+        assert lexicon.candidates(word) == index.candidates(word)
+    assert lexicon.table('correction_map')['cong lch'] == 'công ích'
+    assert lexicon.table('vocabulary').get('vOn') == 'vốn'
+
+
+def test_concurrent_publish_gets_distinct_versions(tmp_path, sources):
+    directory = str(tmp_path / 'lexicon')
+    os.makedirs(directory)
+    paths, errors = [], []
+
+    def publish():
+        try:
+            paths.append(publish_lexicon(directory, keep=10, **sources))
+        except Exception as e:   # pragma: no cover - báo lỗi qua assert bên dưới
+            errors.append(e)
+
+    threads = [threading.Thread(target=publish) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(set(paths)) == 6
+    assert current_artifact(directory) == max(paths)
+    assert MappedLexicon(current_artifact(directory)).version == 6
+    assert not os.path.exists(os.path.join(directory, PUBLISH_LOCK))
+    assert not [f for f in os.listdir(directory) if f.endswith('.tmp')]
+
+
+def test_learned_vocabulary_reaches_fast_path_after_reload(tmp_path, sources):
+    directory = str(tmp_path / 'lexicon')
+    publish_lexicon(directory, **sources)
+    store = LexiconStore(directory)
+    store.check()
+    corrector = TextCorrector(index=store.lexicon)
+    store.subscribe(corrector.swap_index)
+    assert corrector.correct('vOn đầu tư', confidence=0.5) == 'vốn đầu tư'
+    assert corrector.correct('HDND huyện', confidence=0.5) == 'HDND huyện'
+
+    # /vocabulary/learn: thêm từ mới -> publish -> hot-reload
+    with open(sources['vocabulary_path'], 'w', encoding='utf-8') as f:
+        json.dump({'vOn': 'vốn', 'HDND': 'HĐND'}, f, ensure_ascii=False)
+    publish_lexicon(directory, **sources)
+    assert store.check()
+    assert corrector.correct('HDND huyện', confidence=0.5) == 'HĐND huyện'
+    with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as f:
+        assert f.read().strip() == 'lexicon-v000002.bin'
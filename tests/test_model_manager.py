@@ -0,0 +1,117 @@
+import threading
+import time
+
+from model_manager import ModelManager, format_duration, parse_duration
+
+
+def make_manager():
+    manager = ModelManager(memory_budget_mb=None)
+    manager.client = None   # Không gọi Ollama server thật
+    return manager
+
+
+def test_durations():
+    assert parse_duration('60m') == 3600
+    assert parse_duration('30s') == 30
+    assert parse_duration(5) == 5.0
+    assert format_duration(120) == '2m'
+    assert format_duration(45) == '45s'
+
+
+def test_pinned_model_is_not_reaped():
+    manager = make_manager()
+    manager.register_paddle('fast', lambda: object(), pinned=True)
+    manager.register_paddle('other', lambda: object())
+    manager.get('fast')
+    manager.get('other')
+    for name in ('fast', 'other'):
+        manager.models[name].last_used = time.time() - 10 * 3600
+    manager.reap_idle()
+    assert manager.models['fast'].instance is not None
+    assert manager.models['other'].instance is None
+
+
+def test_pinned_model_is_not_evicted_for_memory():
+    manager = make_manager()
+    manager.memory_budget_mb = 1000
+    manager.register_paddle('fast', lambda: object(), est_memory_mb=600, pinned=True)
+    manager.register_paddle('other', lambda: object(), est_memory_mb=600)
+    manager.get('fast')
+    manager.models['fast'].memory_mb = 600
+    manager.get('other')
+    assert manager.models['fast'].resident
+
+
+def test_keep_alive_does_not_record_requests():
+    manager = make_manager()
+    manager.register_ollama('deepseek-ocr', keep_alive='60m')
+    manager.get('deepseek-ocr')
+    for _ in range(20):
+        manager.keep_alive('deepseek-ocr')   # Đọc một lần mỗi trang PDF
+    model = manager.models['deepseek-ocr']
+    assert model.requests == 1
+    assert model.avg_gap is None
+    assert manager.keep_alive('deepseek-ocr') == '60m'
+
+
+def test_get_holds_lock_between_warm_and_return():
+    """Reaper unload ngay sau warm() phải chờ get() trả về instance (trước đây get() trả None)"""
+
+    class RacingManager(ModelManager):
+        def warm(self, name):
+            super().warm(name)
+            reaper = threading.Thread(target=self.unload, args=(name,))
+            reaper.start()
+            reaper.join(0.2)
+            self.reaper = reaper
+
+    manager = RacingManager(memory_budget_mb=None)
+    manager.client = None
+    manager.register_paddle('paddle', lambda: object())
+    assert manager.get('paddle') is not None
+    manager.reaper.join()
+    assert manager.models['paddle'].instance is None
+
+
+def test_concurrent_get_under_tight_budget_does_not_deadlock():
+    """
+    Hai get() cùng lúc, mỗi thread giữ lock model của mình và phải đuổi model của thread kia
+    (Ollama /api/ps vừa báo cả hai resident) - trước đây chờ vòng tròn mãi mãi.
+    """
+    barrier = threading.Barrier(2)
+
+    class RacingManager(ModelManager):
+        def _make_room(self, model):
+            barrier.wait(5)
+            for other in self.models.values():
+                other.resident = True   # _sync_ollama() chạy giữa chừng
+            super()._make_room(model)
+
+    manager = RacingManager(memory_budget_mb=1000)
+    manager.client = None
+    manager.register_ollama('a', est_memory_mb=600)
+    manager.register_ollama('b', est_memory_mb=600)
+
+    threads = [threading.Thread(target=manager.get, args=(name,), daemon=True) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert manager.models['a'].requests == manager.models['b'].requests == 1
+
+
+def test_make_room_evicts_lru_model():
+    manager = make_manager()
+    manager.memory_budget_mb = 1000
+    for name in ('old', 'new', 'next'):
+        manager.register_paddle(name, lambda: object(), est_memory_mb=400)
+    for name in ('old', 'new'):
+        manager.get(name)
+        manager.models[name].memory_mb = 400   # warm() đo RSS nếu có psutil
+    manager.models['old'].last_used -= 100
+    manager.get('next')
+
+    assert not manager.models['old'].resident
+    assert manager.models['new'].resident and manager.models['next'].resident
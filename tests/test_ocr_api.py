@@ -0,0 +1,77 @@
+import json
+
+import fitz  # PyMuPDF
+import pytest
+
+pytest.importorskip('uvicorn')
+pytest.importorskip('ollama')
+pytest.importorskip('paddleocr')
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import ocr_api  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # temp_<filename> ghi vào thư mục hiện tại
+    return TestClient(ocr_api.app)   # Không dùng 'with': bỏ qua startup (không load engine)
+
+
+def pdf_bytes(pages=3):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f'Trang {i + 1}: Cộng hòa xã hội chủ nghĩa Việt Nam')
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.mark.parametrize('pages', ['5-2', 'abc'])
+def test_pdf_text_rejects_malformed_pages(client, tmp_path, pages):
+    response = client.post('/ocr/pdf-text', params={'pages': pages, 'ocr': False},
+                           files={'file': ('doc.pdf', pdf_bytes(), 'application/pdf')})
+    assert response.status_code == 400
+    assert 'Invalid page range' in response.json()['detail']
+    assert not list(tmp_path.iterdir())   # temp file đã xoá
+
+
+def test_pdf_text_selected_pages(client):
+    response = client.post('/ocr/pdf-text', params={'pages': '2-3', 'ocr': False},
+                           files={'file': ('doc.pdf', pdf_bytes(), 'application/pdf')})
+    assert response.status_code == 200
+    assert [page['page'] for page in response.json()['pages']] == [1, 2]
+
+
+class FakeDeepSeek:
+    @staticmethod
+    def _apply_vocabulary_corrections(text):
+        return text
+
+
+def test_stream_accurate_goes_through_model_manager(client, monkeypatch):
+    """/ocr/stream accurate: ghi nhận request + keep_alive thích ứng như /ocr/accurate"""
+    manager = ocr_api.model_manager
+    if 'deepseek-ocr' not in manager.models:
+        manager.register_ollama('deepseek-ocr', keep_alive='60m')
+    monkeypatch.setattr(manager, 'client', None)            # Không gọi Ollama server thật
+    monkeypatch.setattr(manager, 'memory_budget_mb', None)
+    monkeypatch.setattr(ocr_api, 'deepseek_ocr', FakeDeepSeek())
+    calls = []
+
+    def fake_chat(client, model, messages, **kwargs):
+        calls.append(kwargs)
+        kwargs['on_token']('Xin chào')
+        return 'Xin chào', {'tokens_trimmed': 0, 'aborted': False}
+
+    monkeypatch.setattr(ocr_api, 'guarded_chat', fake_chat)
+    requests = manager.models['deepseek-ocr'].requests
+
+    response = client.post('/ocr/stream', params={'mode': 'accurate'},
+                           files={'file': ('page.png', b'not-decoded-on-event-loop', 'image/png')})
+
+    events = [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: ')]
+    assert events[-1]['type'] == 'done'
+    assert manager.models['deepseek-ocr'].requests == requests + 1
+    assert calls[0]['keep_alive'] == manager.keep_alive('deepseek-ocr')
+    assert calls[0]['image'] == b'not-decoded-on-event-loop'   # budget tính trong guarded_chat
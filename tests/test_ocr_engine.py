@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('paddleocr')
+
+from ocr_engine import (INT8_GATE_FILE, INT8_REC_MODEL, ONNX_MODELS, _int8_rec_path,  # noqa: E402
+                        char_error_rate, int8_gate_hashes)
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for name, data in ((ONNX_MODELS['rec'], b'fp32'), (INT8_REC_MODEL, b'int8')):
+        (tmp_path / name).write_bytes(data)
+    return str(tmp_path)
+
+
+def write_gate(model_dir, **report):
+    with open(os.path.join(model_dir, INT8_GATE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(dict({'passed': True, 'cer': 0.001, 'max_cer': 0.01}, **report), f)
+
+
+def test_int8_gate_accepts_matching_models(model_dir):
+    write_gate(model_dir, **int8_gate_hashes(model_dir))
+    assert _int8_rec_path(model_dir, check_gate=True) == os.path.join(model_dir, INT8_REC_MODEL)
+
+
+@pytest.mark.parametrize('changed', [ONNX_MODELS['rec'], INT8_REC_MODEL])
+def test_int8_gate_rejects_changed_models(model_dir, changed):
+    """Export lại rec.onnx (hoặc thay rec_int8.onnx) sau gate -> dùng FP32"""
+    write_gate(model_dir, **int8_gate_hashes(model_dir))
+    with open(os.path.join(model_dir, changed), 'wb') as f:
+        f.write(b're-exported')
+    assert _int8_rec_path(model_dir, check_gate=True) is None
+
+
+def test_int8_gate_rejects_report_without_hashes(model_dir):
+    write_gate(model_dir)
+    assert _int8_rec_path(model_dir, check_gate=True) is None
+    assert _int8_rec_path(model_dir, check_gate=False) is not None
+
+
+def test_int8_gate_rejects_failed_gate(model_dir):
+    write_gate(model_dir, passed=False, cer=0.05, **int8_gate_hashes(model_dir))
+    assert _int8_rec_path(model_dir, check_gate=True) is None
+
+
+def test_char_error_rate():
+    assert char_error_rate('việt', 'việt') == 0.0
+    assert char_error_rate('việt', 'viet') == 0.25
+    assert char_error_rate('', 'a') == 1.0
@@ -0,0 +1,56 @@
+import numpy as np
+
+from grounding_parser import GroundingLine
+from ocr_layout import OcrLayout, cluster_rows
+
+
+def test_cluster_rows_by_vertical_overlap():
+    tops = [100, 103, 130, np.nan, 98]
+    bottoms = [120, 124, 150, np.nan, 118]
+
+    assert cluster_rows(tops, bottoms).tolist() == [0, 0, 1, -1, 0]
+
+
+def test_cluster_rows_tight_line_spacing():
+    # Hai dòng sát nhau (chồng 2px do dấu) vẫn là hai dòng
+    assert cluster_rows([100, 118], [120, 138]).tolist() == [0, 1]
+
+
+def test_reading_order_same_line_across_bucket_boundary():
+    # Bucket cũ (floor(y1 / 10)): y1=99 và y1=101 rơi vào hai hàng -> 'phải' đứng trước 'trái'
+    layout = OcrLayout(['phải', 'trái', 'dưới'],
+                       [[300, 99, 400, 119], [10, 101, 120, 121], [10, 140, 120, 160]])
+
+    assert layout.reading_order().texts == ['trái', 'phải', 'dưới']
+
+
+def test_reading_order_pages_and_missing_boxes():
+    layout = OcrLayout(['p1 không box', 'p1 dưới', 'p0', 'p1 trên'],
+                       [[np.nan] * 4, [0, 200, 50, 220], [0, 500, 50, 520], [0, 10, 50, 30]],
+                       [1, 1, 0, 1])
+
+    assert layout.reading_order().texts == ['p0', 'p1 trên', 'p1 dưới', 'p1 không box']
+
+
+def test_from_grounding_scales_and_offsets():
+    lines = [GroundingLine('a', [[0, 0, 999, 999]]), GroundingLine('b', [])]
+
+    layout = OcrLayout.from_grounding(lines, 2000, 1000, page_index=1, offset=(0, 500), region_size=(2000, 500))
+
+    np.testing.assert_allclose(layout.boxes[0], [0, 500, 2000, 1000])
+    assert np.isnan(layout.boxes[1]).all()
+    assert layout.pages.tolist() == [1, 1]
+    assert layout.page_sizes.tolist() == [[0, 0], [2000, 1000]]
+
+
+def test_concat_and_dict_round_trip():
+    first = OcrLayout.from_grounding([GroundingLine('a', [[0, 0, 500, 500]])], 100, 100, page_index=0)
+    second = OcrLayout.from_grounding([GroundingLine('b', [])], 200, 300, page_index=1)
+
+    layout = OcrLayout.concat([first, None, second])
+    restored = OcrLayout.from_dict(layout.to_dict())
+
+    assert restored.texts == ['a', 'b']
+    assert restored.page_sizes.tolist() == [[100, 100], [200, 300]]
+    assert restored.to_dict() == layout.to_dict()
+    assert layout.page(1).texts == ['b']
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('paddleocr')
+
+from paddle_batch import BatchOCR  # noqa: E402
+
+
+class FakeDetector:
+    preprocess_op = []
+
+    def __call__(self, img):
+        boxes = np.array([[[10, 10], [90, 10], [90, 30], [10, 30]],
+                          [[10, 50], [90, 50], [90, 70], [10, 70]]], dtype=np.float32)
+        return boxes, 0.0
+
+
+class FakeRecognizer:
+    def __init__(self):
+        self.rec_batch_num = 6
+        self.seen = []
+
+    def __call__(self, crops):
+        self.seen.append((self.rec_batch_num, len(crops)))
+        return [(f'line{i}', 0.9) for i in range(len(crops))], 0.0
+
+
+class FakeArgs:
+    det_box_type = 'quad'
+
+
+class FakeEngine:
+    drop_score = 0.5
+    use_angle_cls = False
+    args = FakeArgs()
+
+    def __init__(self):
+        self.text_detector = FakeDetector()
+        self.text_recognizer = FakeRecognizer()
+
+
+def page():
+    return np.full((100, 100, 3), 255, dtype=np.uint8)
+
+
+def test_rec_batch_num_stays_private():
+    engine = FakeEngine()
+    batch = BatchOCR(engine, rec_batch_num=32, adaptive_det=False)
+
+    results = batch.ocr_batch([page(), page(), page()])
+
+    assert engine.text_recognizer.rec_batch_num == 6
+    # Recognition một lần cho crop của cả 3 trang, với batch lớn của BatchOCR
+    assert engine.text_recognizer.seen == [(32, 6)]
+    assert [len(result[0]) for result in results] == [2, 2, 2]
+    assert batch.last_timing['pages'] == 3 and batch.last_timing['crops'] == 6
+
+
+def test_iter_ocr_caps_pages_per_batch():
+    engine = FakeEngine()
+    batch = BatchOCR(engine, adaptive_det=False)
+
+    pages = list(batch.iter_ocr([page() for _ in range(5)], batch_pages=2))
+
+    assert len(pages) == 5
+    assert [crops for _, crops in engine.text_recognizer.seen] == [4, 4, 2]
@@ -0,0 +1,213 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from paddle_pool import PaddleWorkerPool, _Task
+
+
+class FakeProcess:
+    def __init__(self):
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def kill(self):
+        self.alive = False
+        self.exitcode = -9
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeQueue(list):
+    def put(self, item):
+        self.append(item)
+
+
+class FakeShm:
+    name = 'fake'
+
+    def close(self):
+        pass
+
+    def unlink(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool 2 worker không spawn process: supervisor chạy trên process / queue giả"""
+    pool = PaddleWorkerPool(num_workers=2, cpu_threads=1, standby=False, max_retries=1, task_timeout=10)
+
+    def spawn(worker):
+        worker.process = FakeProcess()
+        worker.tasks = FakeQueue()
+        worker.ready.set()
+        pool._by_id[worker.id] = worker
+        return worker
+
+    monkeypatch.setattr(pool, '_spawn', spawn)
+    for worker in pool.workers:
+        spawn(worker)
+    return pool
+
+
+def submit(pool):
+    task = _Task(Future(), FakeShm(), (1, 1, 3), '|u1', False)
+    task_id = next(pool._task_ids)
+    with pool._lock:
+        pool._pending[task_id] = task
+        pool._dispatch(task_id, task)
+    return task_id, task
+
+
+def start(pool, task_id, task, seconds_ago=0.0):
+    """Worker báo 'started' (như collector nhận message)"""
+    task.started_at = time.time() - seconds_ago
+
+
+def test_queued_tasks_do_not_trigger_timeout(pool):
+    worker = pool.workers[0]
+    pool.workers[1].inflight = 100      # Mọi task dồn vào worker 0
+    tasks = [submit(pool) for _ in range(3)]
+    assert all(task.worker is worker for _, task in tasks)
+    for _, task in tasks:
+        task.dispatched_at -= 60        # Xếp hàng lâu hơn task_timeout
+    start(pool, *tasks[0], seconds_ago=1)
+
+    pool._check_workers()
+    assert worker.process.is_alive()
+    assert pool.crashed == 0
+
+
+def test_stuck_task_kills_worker_and_requeues_without_attempts(pool):
+    first = pool.workers[0]
+    pool.workers[1].inflight = 100
+    (running_id, running), (queued_id, queued) = submit(pool), submit(pool)
+    start(pool, running_id, running, seconds_ago=60)
+
+    pool._check_workers()
+    assert not first.process.is_alive()
+    assert pool.crashed == 1
+    assert running.attempts == 1        # Đang chạy khi worker bị kill
+    assert queued.attempts == 0         # Chưa chạy -> không tính lần thử
+    assert running.worker is not first and queued.worker is not first
+    assert running.started_at is None and queued.started_at is None
+    assert not running.future.done() and not queued.future.done()
+
+
+def test_task_fails_after_max_retries(pool):
+    pool.workers[1].inflight = 100
+    task_id, task = submit(pool)
+    for _ in range(2):
+        start(pool, task_id, task, seconds_ago=60)
+        task.worker.process.kill()
+        pool._check_workers()
+    assert task.future.done()
+    with pytest.raises(RuntimeError):
+        task.future.result()
+    assert task_id not in pool._pending
+
+
+def test_collector_records_start_and_result(pool):
+    import queue
+
+    task_id, task = submit(pool)
+    worker = task.worker
+    pool._results = queue.Queue()
+    pool._results.put(('started', worker.id, task_id, None, 0.0, None))
+    pool._results.put(None)
+    pool._collect()
+    assert task.started_at is not None
+
+    pool._results.put((task_id, worker.id, [['lines']], None, 0.5, 100.0))
+    pool._results.put(None)
+    pool._collect()
+    assert task.future.result() == [['lines']]
+    assert worker.inflight == 0 and worker.completed == 1
+
+
+def broken_engine(backend, **kwargs):
+    """engine_factory luôn lỗi (không tải được model) - chạy trong process worker"""
+    raise RuntimeError("cannot create engine")
+
+
+@pytest.fixture
+def failing_pool(monkeypatch):
+    """Worker giả chết ngay khi spawn, trước khi báo 'ready'"""
+    pool = PaddleWorkerPool(num_workers=1, cpu_threads=1, standby=False, max_start_failures=3,
+                            restart_backoff=0.5)
+    monkeypatch.setattr(pool._ctx, 'Queue', FakeQueue)
+
+    def spawn(worker):
+        worker.process = FakeProcess()
+        worker.process.kill()
+        worker.process.exitcode = 1
+        worker.tasks = worker.tasks if worker.tasks is not None else FakeQueue()
+        worker.respawn_at = None
+        pool._by_id[worker.id] = worker
+        return worker
+
+    monkeypatch.setattr(pool, '_spawn', spawn)
+    spawn(pool.workers[0])
+    return pool
+
+
+def test_start_failures_back_off_then_fail_pending(failing_pool):
+    pool = failing_pool
+    task_id, task = submit(pool)
+    delays = []
+    for _ in range(2):
+        pool._check_workers()               # Phát hiện worker chết -> hẹn spawn lại
+        slot = pool.workers[0]
+        assert slot.process is None
+        delays.append(slot.respawn_at - time.time())
+        pool._check_workers()               # Chưa hết backoff -> không spawn
+        assert slot.process is None
+        slot.respawn_at = time.time()
+        pool._check_workers()               # Hết backoff -> spawn (lại chết ngay)
+        assert slot.process is not None
+        assert not task.future.done()
+        assert task.attempts == 0           # Chưa chạy -> không tính lần thử
+
+    assert delays[0] == pytest.approx(0.5, abs=0.1) and delays[1] == pytest.approx(1.0, abs=0.1)
+    pool._check_workers()                   # Lần thứ 3 -> unhealthy
+    assert not pool.healthy
+    with pytest.raises(RuntimeError, match='exit code 1'):
+        task.future.result(0)
+    assert task_id not in pool._pending
+    assert pool.stats()['healthy'] is False
+
+    spawned = pool.workers[0]
+    pool._check_workers()
+    assert spawned.process is None and spawned.respawn_at is None   # Không spawn nữa
+
+
+def test_ready_worker_death_resets_start_failures(pool):
+    worker = pool.workers[0]
+    worker.failures = 2
+    worker.process.kill()
+    pool._check_workers()
+    assert pool.healthy
+    assert pool.workers[0].failures == 0 and pool.workers[0].process is not None
+
+
+def test_engine_factory_always_raises_fails_futures():
+    pytest.importorskip('paddleocr')   # submit() decode ảnh bằng paddle_batch.load_image
+    import numpy as np
+
+    pool = PaddleWorkerPool(num_workers=1, cpu_threads=1, standby=False, check_interval=0.05,
+                            max_start_failures=3, restart_backoff=0.05, engine_factory=broken_engine)
+    pool.start(wait=False)
+    try:
+        future = pool.submit(np.zeros((8, 8, 3), dtype=np.uint8))
+        with pytest.raises(RuntimeError, match='failed to start 3 times'):
+            future.result(120)
+        assert not pool.healthy
+        with pytest.raises(RuntimeError):
+            pool.submit(np.zeros((8, 8, 3), dtype=np.uint8))
+    finally:
+        pool.shutdown()
@@ -0,0 +1,41 @@
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+
+from pdf_docx import apply_document_font, page_ranges
+
+
+@pytest.mark.parametrize('total, workers, expected', [
+    (0, 4, [(0, 0)]),
+    (3, 4, [(0, 3)]),
+    (8, 4, [(0, 4), (4, 8)]),
+    (10, 3, [(0, 5), (5, 10)]),
+    (14, 3, [(0, 5), (5, 10), (10, 14)]),
+    (100, 4, [(0, 25), (25, 50), (50, 75), (75, 100)]),
+])
+def test_page_ranges(total, workers, expected):
+    assert page_ranges(total, workers) == expected
+
+
+@pytest.mark.parametrize('total, workers', [(1, 1), (17, 4), (33, 8), (5, 2)])
+def test_page_ranges_cover_all_pages(total, workers):
+    ranges = page_ranges(total, workers)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == total
+    assert all(prev[1] == curr[0] for prev, curr in zip(ranges, ranges[1:]))
+    assert len(ranges) <= workers
+    assert len(ranges) == 1 or min(end - start for start, end in ranges) >= 4
+
+
+def test_apply_document_font_moves_fonts_to_styles():
+    doc = Document()
+    run = doc.add_paragraph().add_run('Cộng hòa')
+    run.font.name = 'Arial'
+    run.font.size = 200000
+
+    removed = apply_document_font(doc, 'Times New Roman', 13)
+
+    assert removed >= 2
+    assert run._element.rPr.find(qn('w:rFonts')) is None
+    assert doc.styles['Normal'].font.name == 'Times New Roman'
+    assert doc.styles['Normal'].font.size.pt == 13
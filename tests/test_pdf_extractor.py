@@ -0,0 +1,138 @@
+import os
+
+import fitz
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from pdf_extractor import (classify_page, get_render_executor, iter_pdf_images, parse_page_range,
+                           text_layer_quality)
+
+BODY = ('Ban hanh quy dinh ve cong tac giam sat cua hoi dong nhan dan tinh trong nam nay, '
+        'theo doi viec thuc hien cac nghi quyet va bao cao ket qua cho thuong truc.')
+
+
+def test_text_layer_quality_clean_text():
+    text = 'Cộng hòa xã hội chủ nghĩa Việt Nam\nĐộc lập - Tự do - Hạnh phúc'
+    quality = text_layer_quality(text)
+
+    assert quality['glyph_validity'] == 1.0
+    assert quality['vietnamese'] == 1.0
+    assert quality['chars'] == len(''.join(text.split()))
+
+
+def test_text_layer_quality_legacy_font_encoding():
+    # Font TCVN3 / VNI không có ToUnicode: 'Cộng hòa xã hội' -> 'Céng hßa x· héi'
+    assert text_layer_quality('Céng hßa x· héi chñ nghÜa ViÖt Nam')['vietnamese'] < 0.5
+
+
+def test_text_layer_quality_broken_glyphs():
+    assert text_layer_quality('���� abc')['glyph_validity'] == pytest.approx(3 / 7)
+
+
+def image_bytes(width, height):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    pix.set_rect(pix.irect, (200, 200, 200))
+    return pix.tobytes('png')
+
+
+@pytest.fixture
+def doc():
+    document = fitz.open()
+    yield document
+    document.close()
+
+
+def test_classify_text_page(doc):
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 550, 300), BODY, fontsize=11)
+
+    info = classify_page(page)
+
+    assert info['kind'] == 'text'
+    assert info['ocr_regions'] == []
+
+
+def test_classify_empty_page(doc):
+    assert classify_page(doc.new_page())['kind'] == 'empty'
+
+
+def test_classify_scanned_page(doc):
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=image_bytes(600, 800))
+
+    info = classify_page(page)
+
+    assert info['kind'] == 'scan'
+    assert info['coverage'] == 0.0
+
+
+def test_classify_mixed_page_returns_image_region(doc):
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 550, 300), BODY, fontsize=11)
+    region = fitz.Rect(50, 400, 550, 700)
+    page.insert_image(region, stream=image_bytes(1000, 600))
+
+    info = classify_page(page)
+
+    assert info['kind'] == 'mixed'
+    assert len(info['ocr_regions']) == 1
+    assert np.allclose(info['ocr_regions'][0]['bbox'], tuple(region))
+    assert info['ocr_regions'][0]['dpi'] == 150
+
+
+def test_classify_legacy_encoded_text_as_scan(doc):
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 550, 300), 'Céng hßa x· héi chñ nghÜa ViÖt Nam ' * 4, fontsize=11)
+
+    assert classify_page(page)['kind'] == 'scan'
+
+
+@pytest.mark.parametrize('name, kind', [
+    ('bao-cao-ket-qua-thuc-hien-chuong-trinh-giam-sat-nam-2022-cua-tt-hdnd_trongtb-11-07-2023_08h54p4411.07.2023_14h31p10_signed.pdf', 'text'),
+    ('dongdau6016_06-07-2023-14-56-28_bc-hoi-dong_0001.pdf', 'scan'),
+])
+def test_classify_sample_pdfs(name, kind):
+    path = os.path.join(ROOT, name)
+    if not os.path.exists(path):
+        pytest.skip(f'{name} not available')
+    with fitz.open(path) as sample:
+        assert classify_page(sample[0])['kind'] == kind
+
+
+@pytest.mark.parametrize('spec, expected', [
+    (None, list(range(10))),
+    ('  ', list(range(10))),
+    ('1-3,5', [0, 1, 2, 4]),
+    ('8-', [7, 8, 9]),
+    ('-2', [0, 1]),
+    ('3, 1-2, 2', [0, 1, 2]),
+    ('9-20', [8, 9]),
+    ('11', []),
+])
+def test_parse_page_range(spec, expected):
+    assert parse_page_range(spec, 10) == expected
+
+
+@pytest.mark.parametrize('spec', ['a', '-', '1-x', '2:5', '1-2-3', '5-2'])
+def test_parse_page_range_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_page_range(spec, 10)
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='cần /proc để xem file đang mở')
+def test_render_workers_release_pdf_after_iteration(tmp_path):
+    """Worker không giữ handle file PDF tạm sau khi iter_pdf_images() xong (ocr_api xoá file ngay)"""
+    path = tmp_path / 'temp_doc.pdf'
+    with fitz.open() as doc:
+        for i in range(6):
+            doc.new_page(width=200, height=200).insert_text((20, 40), f'Trang {i + 1}')
+        doc.save(path)
+
+    images = list(iter_pdf_images(str(path), dpi=72, workers=2, chunk_pages=2))
+
+    assert [image['page'] for image in images] == list(range(6))
+    for process in get_render_executor()._processes.values():
+        fd_dir = f'/proc/{process.pid}/fd'
+        targets = {os.readlink(os.path.join(fd_dir, fd)) for fd in os.listdir(fd_dir)}
+        assert str(path) not in targets
@@ -0,0 +1,79 @@
+import os
+import threading
+
+import pytest
+
+from conftest import ROOT
+from text_corrector import TextCorrector
+
+DICTIONARY = os.path.join(ROOT, 'vn_dictionary.txt')
+
+# Văn bản đúng, phần lớn từ không có trong vn_dictionary.txt
+CLEAN_LINES = [
+    'Tỉnh ủy Quảng Ninh',
+    'Báo cáo của Thường trực Hội đồng nhân dân huyện khóa XXI',
+    'Văn hóa và bạn bè',
+    'UBND HĐND',
+]
+
+
+@pytest.fixture(params=[True, False], ids=['vn_index', 'symspell'])
+def corrector(request):
+    return TextCorrector.from_dictionary(DICTIONARY, use_vn_index=request.param)
+
+
+@pytest.mark.parametrize('line', CLEAN_LINES)
+def test_correct_text_is_not_rewritten(corrector, line):
+    """Regression: dòng confidence thấp không bị 'sửa' thành từ khác trong từ điển"""
+    assert corrector.correct(line, confidence=0.5) == line
+
+
+def test_real_errors_are_corrected(corrector):
+    assert corrector.correct('cOng trình', confidence=0.5) == 'công trình'
+    if corrector.index is not None:
+        assert corrector.correct('Nghị djnh', confidence=0.5) == 'Nghị định'
+    else:
+        # SymSpell: 'djnh' cách 7 từ đúng 2 edit, tần suất sát nhau -> không đoán
+        assert corrector.correct('Nghị djnh', confidence=0.5) == 'Nghị djnh'
+
+
+def test_case_is_preserved():
+    corrector = TextCorrector.from_dictionary(DICTIONARY)
+    assert corrector.correct('NGHỊ DJNH', confidence=0.5) == 'NGHỊ ĐỊNH'
+    assert corrector.correct('cOng trình', confidence=0.5) == 'công trình'
+
+
+def test_confident_lines_are_skipped():
+    corrector = TextCorrector.from_dictionary(DICTIONARY)
+    assert corrector.correct('djnh', confidence=0.99) == 'djnh'
+
+
+def test_correct_page_returns_stats():
+    corrector = TextCorrector.from_dictionary(DICTIONARY)
+    lines, stats = corrector.correct_page(['djnh', 'công trình', 'djnh'], [0.5, 0.99, 0.5])
+    assert lines == ['định', 'công trình', 'định']
+    assert stats['lines'] == 3
+    assert stats['skipped'] == 1
+    assert stats['cache_hits'] == 1
+    assert not hasattr(corrector, 'last_page_stats')
+
+
+def test_correct_result_stats_are_per_call():
+    """Các request chạy song song nhận stats của chính mình"""
+    corrector = TextCorrector.from_dictionary(DICTIONARY)
+    results = {}
+
+    def run(n):
+        result = [[[None, (f'dòng {i}', 0.5)] for i in range(n)]]
+        for _ in range(50):
+            _, stats = corrector.correct_result(result)
+            assert stats['lines'] == n
+        results[n] = stats['lines']
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(1, 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {n: n for n in range(1, 6)}
+    assert corrector.correct_result([[]]) == ([], {'lines': 0, 'skipped': 0, 'cache_hits': 0, 'duration': 0.0})
@@ -0,0 +1,120 @@
+import asyncio
+
+import numpy as np
+
+from tile_pipeline import (TileBlocks, TilePipeline, box_overlap, dedupe_blocks, held_lines, iter_fixed_tiles,
+                           plan_gutter_tiles)
+
+
+def quad(x1, y1, x2, y2):
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def blocks(*rects, scores=None, truncated=None):
+    quads = np.array([quad(*r) for r in rects], dtype=np.float32).reshape(-1, 4, 2)
+    n = len(rects)
+    return TileBlocks(quads, [f'b{i}' for i in range(n)],
+                      np.array(scores if scores is not None else [0.9] * n, dtype=np.float32),
+                      np.array(truncated if truncated is not None else [False] * n, dtype=bool))
+
+
+def test_box_overlap_uses_smaller_box():
+    a = np.array([[0, 0, 100, 20]], dtype=np.float32)
+    b = np.array([[10, 0, 60, 20], [200, 0, 300, 20]], dtype=np.float32)
+
+    np.testing.assert_allclose(box_overlap(a, b), [[1.0, 0.0]])
+
+
+def test_dedupe_prefers_untruncated_box():
+    previous = blocks((0, 90, 100, 110), truncated=[True], scores=[0.99])
+    current = blocks((0, 90, 100, 112), (0, 150, 100, 170))
+
+    keep_prev, keep_curr = dedupe_blocks(previous, current)
+
+    assert keep_prev.tolist() == [False]
+    assert keep_curr.tolist() == [True, True]
+
+
+def test_held_lines_keeps_whole_line_together():
+    # Cùng một dòng: box đầu chỉ chạm tới 898, box sau lấn qua next_start=900
+    line = blocks((0, 880, 100, 898), (110, 882, 200, 905), (0, 700, 100, 720))
+
+    held = held_lines(line, next_start=900, y_end=1000)
+
+    assert held.tolist() == [True, True, False]
+
+
+def test_held_lines_without_next_tile():
+    line = blocks((0, 880, 100, 898))
+
+    assert not held_lines(line, None, 1000).any()
+    assert not held_lines(line, 1000, 1000).any()
+
+
+def test_iter_fixed_tiles_overlap():
+    assert list(iter_fixed_tiles(2500, tile_height=1000, overlap=100)) == [
+        (0, 1000, 0), (800, 1900, 100), (1700, 2500, 100)]
+
+
+def test_plan_gutter_tiles_cuts_in_blank_rows():
+    img = np.full((2000, 400), 255, dtype=np.uint8)
+    for top in range(20, 2000, 40):
+        img[top:top + 20, 20:380] = 0
+
+    tiles = list(plan_gutter_tiles(img, tile_height=1000))
+
+    assert tiles[0][0] == 0 and tiles[-1][1] == 2000
+    for (_, end, _), (start, _, skip) in zip(tiles, tiles[1:]):
+        assert end == start and skip == 0
+        assert (img[end] == 255).all()
+
+
+def fake_ocr(page_lines):
+    """ocr_fn trả box của các dòng nằm trong tile (toạ độ tile)"""
+    def ocr_fn(tile_img):
+        y_start = int(tile_img[0, 0])
+        y_end = y_start + tile_img.shape[0]
+        lines = [[quad(x1, y1 - y_start, x2, y2 - y_start), (text, 0.9)]
+                 for text, (x1, y1, x2, y2) in page_lines if y1 >= y_start and y2 <= y_end]
+        return [lines]
+    return ocr_fn
+
+
+def group_by_row(lines):
+    if not lines:
+        return []
+    boxes = np.array([np.array(line[0]).reshape(-1, 2)[:, 1] for line in lines])
+    rows = {}
+    for line, ys in zip(lines, boxes):
+        rows.setdefault(round(ys.min() / 40), []).append(line)
+    return [[line[1][0] for line in sorted(row, key=lambda l: l[0][0][0])] for _, row in sorted(rows.items())]
+
+
+def page_image(height):
+    # Hàng y có giá trị y -> ocr_fn biết tile bắt đầu ở đâu
+    return np.repeat(np.arange(height, dtype=np.float32)[:, None], 10, axis=1)
+
+
+PAGE_LINES = [
+    ('một', (0, 100, 100, 120)),
+    ('hai', (0, 880, 100, 898)),
+    ('ba', (110, 882, 200, 905)),
+    ('bốn', (0, 1200, 100, 1220)),
+]
+
+
+def test_pipeline_line_not_split_across_tiles():
+    pipeline = TilePipeline(fake_ocr(PAGE_LINES), group_by_row, ' '.join)
+    tiles = [(0, 1000, 0), (900, 1500, 100)]
+
+    assert list(pipeline.run(page_image(1500), tiles)) == ['một', 'hai ba', 'bốn']
+
+
+def test_pipeline_async_matches_sync():
+    pipeline = TilePipeline(fake_ocr(PAGE_LINES), group_by_row, ' '.join)
+    tiles = [(0, 1000, 0), (900, 1500, 100)]
+
+    async def collect():
+        return [line async for line in pipeline.arun(page_image(1500), tiles)]
+
+    assert asyncio.run(collect()) == list(pipeline.run(page_image(1500), tiles))
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from vn_index import (VietnameseIndex, clear_winner, has_error_signal, is_valid_syllable,
+                      mark_distance, skeleton)
+
+# Từ đúng không có trong vn_dictionary.txt - bản cũ sửa sai thành 'trình', 'chữa', 'hòa', ...
+CORRECT_OUT_OF_DICTIONARY = ['Tỉnh', 'ủy', 'Quảng', 'Ninh', 'của', 'hóa', 'bạn', 'Thường', 'khóa', 'huyện']
+
+
+@pytest.fixture(scope='module')
+def index():
+    return VietnameseIndex.from_dictionary(os.path.join(ROOT, 'vn_dictionary.txt'))
+
+
+def test_skeleton():
+    assert skeleton('Định') == 'dinh'
+    assert skeleton('djnh') == 'dinh'
+    assert skeleton('vOn') == 'von'
+
+
+def test_mark_distance_missing_cheaper_than_wrong():
+    assert mark_distance('dinh', 'định') == 1.0      # thiếu đ + thiếu dấu nặng
+    assert mark_distance('đính', 'định') == 1.0      # sai dấu thanh
+    assert mark_distance('đinh', 'định') == 0.5
+
+
+@pytest.mark.parametrize('word', ['của', 'Thường', 'nghiêng', 'khuya', 'quốc', 'gì', 'ban', 'hoá'])
+def test_valid_syllables(word):
+    assert is_valid_syllable(word)
+    assert not has_error_signal(word)
+
+
+@pytest.mark.parametrize('word', ['djnh', 'hdnd', 'tiếq', 'hàt', 'nghĩã', 'fan'])
+def test_invalid_syllables(word):
+    assert not is_valid_syllable(word)
+    assert has_error_signal(word)
+
+
+def test_mixed_case_is_error_signal():
+    assert has_error_signal('vOn')
+    assert not has_error_signal('VIỆT')
+    assert not has_error_signal('Việt')
+
+
+def test_clear_winner():
+    assert clear_winner([]) is None
+    assert clear_winner([('định', 1.0, 10)]) == 'định'
+    assert clear_winner([('công', 0.5, 10), ('cộng', 1.0, 100)]) == 'công'
+    assert clear_winner([('bản', 1.0, 900), ('ban', 1.0, 600)]) is None
+    assert clear_winner([('bản', 1.0, 1200), ('ban', 1.0, 600)]) == 'bản'
+
+
+def test_lookup_corrects_real_errors(index):
+    assert index.lookup('djnh') == 'định'
+    assert index.lookup('cOng') == 'công'
+    assert index.lookup('nghja') == 'nghĩa'
+    assert index.lookup('Định') == 'định'
+
+
+@pytest.mark.parametrize('word', CORRECT_OUT_OF_DICTIONARY)
+def test_lookup_leaves_correct_words_alone(index, word):
+    """Regression: từ đúng ngoài từ điển không bị thay bằng từ cùng skeleton / cách 1 edit"""
+    assert index.lookup(word) in (None, word.lower())
+
+
+def test_fallback_requires_margin():
+    index = VietnameseIndex()
+    index.add('tỉnhx', 100)
+    index.add('tỉnhy', 90)
+    index.finalize()
+    # 'tinhz' không hợp lệ, hai ứng viên delete-1 ngang tần suất -> không đoán
+    assert index.lookup('tinhz') is None
+    index.add('tỉnhx', 1000)
+    index.finalize()
+    assert index.lookup('tinhz') == 'tỉnhx'
+
+
+def test_lookup_recovers_stripped_marks():
+    """Token mất hết dấu là âm tiết hợp lệ - sửa khi skeleton có ứng viên duy nhất / trội hẳn"""
+    index = VietnameseIndex()
+    index.add('định', 100)
+    index.add('công', 3200)
+    index.add('cộng', 1000)
+    index.add('bản', 900)
+    index.add('ban', 600)
+    index.add('ý', 100)
+    index.finalize()
+    assert index.lookup('dinh') == 'định'
+    assert index.lookup('Cong') == 'công'
+    assert index.lookup('ban') == 'ban'     # có trong từ điển
+    assert index.lookup('y') is None        # 1 chữ cái: không đoán
+
+
+def test_lookup_never_changes_marked_valid_word():
+    index = VietnameseIndex()
+    index.add('định', 100)
+    index.finalize()
+    assert index.lookup('đinh') is None
+    assert index.lookup('dính') is None
@@ -0,0 +1,251 @@
+"""
+Text Corrector - sửa lỗi chính tả SymSpell có cache + bỏ qua dòng tin cậy
+
+lookup_compound() trên mọi dòng là bước tốn CPU nhất sau inference, trong khi:
+- Phần lớn dòng Paddle đọc với confidence ~0.99 -> không cần sửa
+- Văn bản hành chính lặp lại rất nhiều (quốc hiệu, tiêu ngữ, tiêu đề mẫu)
+- Đa số từ đã có sẵn trong từ điển
+
+TextCorrector:
+1. Bỏ qua dòng có confidence >= ngưỡng
+2. Chỉ sửa từ chưa có trong từ điển VÀ có tín hiệu lỗi (không phải âm tiết tiếng Việt
+   hợp lệ, hoa/thường lẫn lộn) VÀ ứng viên thắng rõ - từ đúng ngoài từ điển giữ nguyên
+3. Cache LRU theo dòng (đã chuẩn hoá) và theo từ
+4. Giữ nguyên dấu câu, khoảng trắng và kiểu chữ hoa/thường của dòng gốc
+5. Thống kê thời gian sửa lỗi của từng trang (tách khỏi thời gian OCR), trả về cùng kết quả
+
+Mặc định ứng viên lấy từ VietnameseIndex (key theo skeleton bỏ dấu, xem vn_index.py);
+use_vn_index=False -> SymSpell lookup như cũ. from_lexicon() dùng artifact đã biên dịch
+(mmap, chia sẻ RAM giữa các worker, hot-reload khi trainer publish version mới); bảng
+'vocabulary' của artifact (từ user dạy qua /vocabulary/learn) được áp trước mọi tra cứu.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+from symspellpy import SymSpell, Verbosity
+
+from lexicon_artifact import LEXICON_DIR, LexiconStore, ensure_lexicon
+from vn_index import (OCR_CONFUSIONS, VietnameseIndex, clear_winner, has_error_signal, is_valid_syllable,
+                      iter_dictionary_entries)
+
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+SPACE_PATTERN = re.compile(r'\s+')
+
+
+def load_dictionary(sym_spell, path, encoding='utf-8'):
+    """
+    Nạp vn_dictionary.txt (mỗi dòng: 'cụm từ nhiều chữ <count>').
+
+    SymSpell.load_dictionary(separator=" ") bỏ qua mọi mục nhiều chữ vì cột thứ 2
+    không phải số -> từ điển rỗng. Ở đây tách cụm từ thành từng từ đơn.
+
+    Returns:
+        Số mục đã nạp
+    """
+    loaded = 0
+    for words, count in iter_dictionary_entries(path, encoding):
+        for word in words:
+            sym_spell.create_dictionary_entry(unicodedata.normalize('NFC', word.lower()), count)
+        loaded += 1
+    return loaded
+
+
+class TextCorrector:
+    """
+    Usage:
+        corrector = TextCorrector.from_dictionary('vn_dictionary.txt')
+        text = corrector.correct(line_text, confidence=score)
+        lines, page_stats = corrector.correct_page(texts, scores)   # {'lines', 'skipped', 'duration', ...}
+    """
+
+    def __init__(self, sym_spell=None, index=None, max_edit_distance=2, confidence_threshold=0.95,
+                 line_cache_size=20000, token_cache_size=50000):
+        self.index = index
+        self.vocabulary = self._vocabulary_of(index)
+        if sym_spell is None and index is None:
+            sym_spell = SymSpell(max_dictionary_edit_distance=max_edit_distance, prefix_length=7)
+        self.sym_spell = sym_spell
+        self.max_edit_distance = max_edit_distance
+        self.confidence_threshold = confidence_threshold
+        self.lexicon_store = None
+        self._stats_lock = threading.Lock()
+        self.lines_total = 0
+        self.lines_skipped = 0
+        self.correction_time = 0.0
+
+        # Cache bound method theo instance (không giữ tham chiếu chéo giữa các corrector)
+        self._correct_line = lru_cache(maxsize=line_cache_size)(self._correct_line_uncached)
+        self._correct_token = lru_cache(maxsize=token_cache_size)(self._correct_token_uncached)
+
+    @classmethod
+    def from_dictionary(cls, dictionary_path='vn_dictionary.txt', use_vn_index=True, **kwargs):
+        if not os.path.exists(dictionary_path):
+            logging.warning(f"⚠️ Dictionary not found: {dictionary_path}")
+            return cls(index=VietnameseIndex() if use_vn_index else None, **kwargs)
+
+        if use_vn_index:
+            corrector = cls(index=VietnameseIndex.from_dictionary(dictionary_path), **kwargs)
+        else:
+            corrector = cls(**kwargs)
+            load_dictionary(corrector.sym_spell, dictionary_path)
+        logging.info(f"✅ Dictionary loaded: {dictionary_path} ({corrector.dictionary_size} words)")
+        return corrector
+
+    @classmethod
+    def from_lexicon(cls, directory=LEXICON_DIR, dictionary_path='vn_dictionary.txt', watch=False, **kwargs):
+        """
+        Dùng lexicon artifact (mmap) thay vì dựng index từ vn_dictionary.txt.
+        Build artifact nếu chưa có / file nguồn mới hơn.
+
+        watch=True: theo dõi version mới và tự swap (corrector.lexicon_store)
+        """
+        try:
+            ensure_lexicon(directory, dictionary_path=dictionary_path)
+        except OSError as e:
+            logging.warning(f"⚠️ Cannot build lexicon artifact ({e}), using in-memory dictionary")
+            return cls.from_dictionary(dictionary_path, **kwargs)
+
+        store = LexiconStore(directory)
+        store.check()
+        if store.lexicon is None:
+            return cls.from_dictionary(dictionary_path, **kwargs)
+
+        corrector = cls(index=store.lexicon, **kwargs)
+        corrector.lexicon_store = store
+        if watch:
+            store.subscribe(corrector.swap_index)
+            store.start()
+        logging.info(f"✅ Lexicon v{store.lexicon.version} mapped: {store.lexicon.path} ({len(store.lexicon)} words)")
+        return corrector
+
+    @staticmethod
+    def _vocabulary_of(index):
+        """Bảng từ học được (token sai -> token đúng, phân biệt hoa/thường) của lexicon artifact"""
+        table = getattr(index, 'table', None)
+        return table('vocabulary') if table is not None else {}
+
+    def swap_index(self, index):
+        """Hot-reload: đổi index + bảng từ học được (gán tham chiếu là atomic) rồi bỏ cache của bản cũ"""
+        if index is self.index:
+            return
+        self.vocabulary = self._vocabulary_of(index)
+        self.index = index
+        self.clear_cache()
+
+    @property
+    def dictionary_size(self):
+        return len(self.index) if self.index is not None else len(self.sym_spell.words)
+
+    # ----- Correction -----
+
+    def _lookup(self, token):
+        """
+        Token (giữ hoa/thường) -> từ sửa (lowercase) hoặc None = giữ nguyên.
+        Chỉ sửa khi token có tín hiệu lỗi và ứng viên thắng rõ (xem vn_index.py).
+        """
+        if self.index is not None:
+            return self.index.lookup(token)
+        lower = unicodedata.normalize('NFC', token.lower())
+        if lower in self.sym_spell.words:
+            return lower
+        if not has_error_signal(token):
+            return None
+        suggestions = self.sym_spell.lookup(lower, Verbosity.CLOSEST, max_edit_distance=self.max_edit_distance)
+        return clear_winner([(s.term, s.distance, s.count) for s in suggestions])
+
+    def _correct_token_uncached(self, token):
+        # User đã dạy đúng token này (/vocabulary/learn) -> dùng nguyên văn
+        learned = self.vocabulary.get(token)
+        if learned is not None:
+            return learned
+        # Viết tắt toàn chữ hoa (UBND, HĐND) không phải âm tiết -> không sửa (trừ nhầm lẫn OCR: DJNH)
+        if (len(token) > 1 and token.isupper() and not is_valid_syllable(token)
+                and not any(ch in OCR_CONFUSIONS for ch in token.lower())):
+            return token
+        lower = unicodedata.normalize('NFC', token.lower())
+        term = self._lookup(token)
+        if term is None or term == lower:
+            return token
+        # Giữ kiểu chữ của token gốc (VIỆT NAM / Việt Nam / việt nam)
+        if token.isupper():
+            return term.upper()
+        if token[0].isupper():
+            return term[0].upper() + term[1:]
+        return term
+
+    def _correct_line_uncached(self, line):
+        return WORD_PATTERN.sub(lambda m: self._correct_token(m.group(0)), line)
+
+    def correct(self, text, confidence=None):
+        """Sửa một dòng. confidence >= confidence_threshold -> giữ nguyên."""
+        skipped = confidence is not None and confidence >= self.confidence_threshold
+        with self._stats_lock:
+            self.lines_total += 1
+            self.lines_skipped += skipped
+        if skipped or not text:
+            return text
+        # Chuẩn hoá: NFC (Paddle đôi khi trả dấu tổ hợp) + gộp khoảng trắng
+        line = SPACE_PATTERN.sub(' ', unicodedata.normalize('NFC', text)).strip()
+        return self._correct_line(line)
+
+    def correct_page(self, texts, confidences=None):
+        """
+        Sửa các dòng của một trang.
+
+        Args:
+            texts: list[str]
+            confidences: list[float] cùng độ dài (None = sửa tất cả)
+
+        Returns:
+            (list dòng đã sửa, {'lines', 'skipped', 'cache_hits', 'duration'}) - stats trả về
+            theo từng lần gọi (không lưu trên instance) vì corrector dùng chung giữa các request
+        """
+        start = time.time()
+        line_hits = self._correct_line.cache_info().hits
+        confidences = confidences if confidences is not None else [None] * len(texts)
+        skipped = sum(1 for c in confidences if c is not None and c >= self.confidence_threshold)
+
+        corrected = [self.correct(text, conf) for text, conf in zip(texts, confidences)]
+
+        duration = time.time() - start
+        with self._stats_lock:
+            self.correction_time += duration
+        stats = {
+            'lines': len(texts),
+            'skipped': skipped,
+            'cache_hits': self._correct_line.cache_info().hits - line_hits,
+            'duration': round(duration, 4),
+        }
+        return corrected, stats
+
+    def correct_result(self, result):
+        """Kết quả PaddleOCR (result[0] = [[box, (text, score)], ...]) -> (list dòng đã sửa, stats)"""
+        if not result or not result[0]:
+            return [], {'lines': 0, 'skipped': 0, 'cache_hits': 0, 'duration': 0.0}
+        return self.correct_page([line[1][0] for line in result[0]],
+                                 [line[1][1] for line in result[0]])
+
+    # ----- Stats -----
+
+    def stats(self):
+        line_info = self._correct_line.cache_info()
+        token_info = self._correct_token.cache_info()
+        return {
+            'lines_total': self.lines_total,
+            'lines_skipped': self.lines_skipped,
+            'line_cache': {'hits': line_info.hits, 'misses': line_info.misses, 'size': line_info.currsize},
+            'token_cache': {'hits': token_info.hits, 'misses': token_info.misses, 'size': token_info.currsize},
+            'correction_time': round(self.correction_time, 3),
+            'dictionary_words': self.dictionary_size,
+            'lexicon_version': getattr(self.index, 'version', None),
+        }
+
+    def clear_cache(self):
+        """Gọi sau khi cập nhật từ điển"""
+        self._correct_line.cache_clear()
+        self._correct_token.cache_clear()
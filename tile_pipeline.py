@@ -0,0 +1,466 @@
+"""
+Tile Pipeline - xử lý tiled streaming theo kiểu dây chuyền (pipelined)
+
+Thay vì xử lý tuần tự từng tile (cắt -> OCR -> sửa lỗi -> tile tiếp theo),
+mỗi công đoạn chạy trên một worker thread riêng, nối với nhau bằng queue có giới hạn:
+
+    [prefetch: cắt + chuẩn bị tile N+1] -> [Paddle det + rec: tile N] -> [correction: tile N-1]
+
+Paddle inference nhả GIL khi chạy C++ kernel nên correction (Python thuần)
+chạy song song được -> một trang nhiều tile dùng được hơn một core.
+Mỗi công đoạn chỉ có một worker nên thứ tự dòng output được giữ nguyên.
+
+Khi hai tile liền kề chồng lên nhau (overlap), mọi box được đưa về toạ độ
+toàn trang và khử trùng lặp bằng IoU/NMS vector hoá trước khi gom dòng.
+
+TilePipeline.arun() là bản async của cùng dây chuyền cho FastAPI: các công đoạn
+là asyncio task nối bằng asyncio.Queue có giới hạn (backpressure), phần blocking
+chạy trong inference executor dùng chung -> không tạo thread riêng cho mỗi client.
+"""
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ocr_layout import cluster_rows
+
+_DONE = object()
+
+# Số thread chạy Paddle inference dùng chung cho mọi request async.
+# Mặc định 1: PaddleOCR instance không thread-safe và bản thân Paddle đã dùng
+# nhiều core (cpu_threads) cho mỗi lần predict.
+INFERENCE_WORKERS = int(os.environ.get('OCR_INFERENCE_WORKERS', '1'))
+
+_inference_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor():
+    """Executor dùng chung cho Paddle inference (tạo lần đầu khi cần)"""
+    global _inference_executor
+    with _executor_lock:
+        if _inference_executor is None:
+            _inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS,
+                                                     thread_name_prefix="ocr-inference")
+        return _inference_executor
+
+
+# Box cách mép cắt của tile <= EDGE_MARGIN px coi như bị cắt cụt
+EDGE_MARGIN = 2
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def box_overlap(a, b):
+    """
+    Ma trận overlap (A × B) giữa hai tập box x1, y1, x2, y2.
+    Dùng intersection / diện tích box nhỏ hơn (IoMin) thay vì IoU thuần:
+    box bị cắt cụt ở mép tile nằm gọn trong box đầy đủ vẫn được coi là trùng.
+    """
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(np.minimum(area_a[:, None], area_b[None, :]), 1e-6)
+
+
+class TileBlocks:
+    """Các box của một (hoặc nhiều) tile theo toạ độ toàn trang, dạng mảng"""
+
+    def __init__(self, quads=None, texts=None, scores=None, truncated=None):
+        self.quads = quads if quads is not None else np.empty((0, 4, 2), dtype=np.float32)
+        self.texts = texts or []
+        self.scores = scores if scores is not None else np.empty(0, dtype=np.float32)
+        self.truncated = truncated if truncated is not None else np.empty(0, dtype=bool)
+        self.boxes = np.concatenate([self.quads.min(axis=1), self.quads.max(axis=1)], axis=1)
+
+    @classmethod
+    def from_result(cls, result, y_start, y_end):
+        """Kết quả PaddleOCR của tile -> toạ độ toàn trang"""
+        if not result or not result[0]:
+            return cls()
+        quads = np.array([line[0] for line in result[0]], dtype=np.float32).reshape(-1, 4, 2)
+        quads[:, :, 1] += y_start
+        top = quads[:, :, 1].min(axis=1)
+        bottom = quads[:, :, 1].max(axis=1)
+        truncated = ((top <= y_start + EDGE_MARGIN) & (y_start > 0)) | (bottom >= y_end - EDGE_MARGIN)
+        return cls(quads,
+                   [line[1][0] for line in result[0]],
+                   np.array([line[1][1] for line in result[0]], dtype=np.float32),
+                   truncated)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def take(self, mask):
+        idx = np.flatnonzero(mask)
+        return TileBlocks(self.quads[idx], [self.texts[i] for i in idx], self.scores[idx], self.truncated[idx])
+
+    def concat(self, other):
+        return TileBlocks(np.concatenate([self.quads, other.quads]),
+                          self.texts + other.texts,
+                          np.concatenate([self.scores, other.scores]),
+                          np.concatenate([self.truncated, other.truncated]))
+
+    def to_result_lines(self):
+        """-> định dạng dòng của PaddleOCR: [quad, (text, score)] (toạ độ toàn trang)"""
+        return [[self.quads[i].tolist(), (self.texts[i], float(self.scores[i]))] for i in range(len(self))]
+
+
+def dedupe_blocks(previous, current, threshold=0.5):
+    """
+    NMS giữa box giữ lại từ tile trước và box của tile hiện tại.
+    Mỗi cặp trùng (overlap > threshold) giữ box tốt hơn: box không bị cắt cụt
+    ở mép tile được ưu tiên, sau đó tới confidence cao hơn.
+
+    Returns:
+        (previous_keep, current_keep) - mask bool
+    """
+    keep_prev = np.ones(len(previous), dtype=bool)
+    keep_curr = np.ones(len(current), dtype=bool)
+    if not len(previous) or not len(current):
+        return keep_prev, keep_curr
+
+    overlap = box_overlap(previous.boxes, current.boxes)
+    quality_prev = previous.scores - previous.truncated
+    quality_curr = current.scores - current.truncated
+
+    for i, j in np.argwhere(overlap > threshold):
+        if not (keep_prev[i] and keep_curr[j]):
+            continue
+        if quality_prev[i] >= quality_curr[j]:
+            keep_curr[j] = False
+        else:
+            keep_prev[i] = False
+    return keep_prev, keep_curr
+
+
+def held_lines(blocks, next_start, y_end):
+    """
+    Mask các box giữ lại cho tile kế tiếp: cả dòng (gom theo chồng lấn dọc) bị giữ nếu
+    một box của dòng lấn vào vùng chồng lấn [next_start, y_end) -> một dòng không bị
+    tách thành hai buffer chỉ vì các box của nó cao thấp khác nhau.
+    """
+    held = np.zeros(len(blocks), dtype=bool)
+    if next_start is None or next_start >= y_end or not len(blocks):
+        return held
+    rows = cluster_rows(blocks.boxes[:, 1], blocks.boxes[:, 3])
+    return np.isin(rows, rows[blocks.boxes[:, 3] > next_start])
+
+
+def iter_fixed_tiles(height, tile_height=1000, overlap=100):
+    """
+    Chia ảnh theo chiều dọc thành các tile cố định có overlap.
+
+    Yields:
+        (y_start, y_end, skip_above) - skip_above: số pixel phía trên tile đã được
+        tile trước xử lý (vùng overlap), 0 nếu không có overlap
+    """
+    current_y = 0
+    while current_y < height:
+        y_end = min(current_y + tile_height, height)
+        # Thêm overlap để tránh cắt đôi chữ ở biên, trừ tile đầu tiên
+        y_start = max(0, current_y - overlap) if current_y > 0 else 0
+        yield y_start, y_end, current_y - y_start
+        current_y += tile_height - overlap if current_y + tile_height < height else tile_height
+
+
+def find_blank_rows(img, sample_step=4, noise_ratio=0.005):
+    """
+    Row projection profile: True cho các hàng không có chữ (chỉ toàn nền).
+
+    Args:
+        img: numpy array (H, W) hoặc (H, W, C)
+        sample_step: Lấy mẫu 1/sample_step cột cho nhanh
+        noise_ratio: Cho phép tỉ lệ pixel tối nhỏ (nhiễu scan, đường kẻ dọc của bảng)
+    """
+    sample = img[:, ::sample_step]
+    if sample.ndim == 3:
+        sample = sample[:, :, 1]  # kênh G ~ độ sáng
+    threshold = min(128, float(np.median(sample)) * 0.6)
+    dark = (sample < threshold).sum(axis=1)
+    return dark <= max(2, sample.shape[1] * noise_ratio)
+
+
+def plan_gutter_tiles(img, tile_height=1000, overlap=100, min_gutter=3, search_ratio=0.4):
+    """
+    Chia tile tại các khe trắng nằm ngang (gutter) thay vì cắt cố định.
+
+    Với mỗi biên, tìm khe trắng cao >= min_gutter px trong khoảng
+    [tile_height × (1 - search_ratio), tile_height] tính từ đầu tile, gần biên nhất.
+    Cắt ở giữa khe -> không dòng chữ nào bị cắt đôi, không cần overlap.
+    Nếu không có khe (ảnh chữ dày đặc / ảnh chụp nhiễu) -> fallback cắt cố định + overlap.
+
+    Yields:
+        (y_start, y_end, skip_above) như iter_fixed_tiles
+    """
+    height = img.shape[0]
+    blank = find_blank_rows(img)
+
+    # Các đoạn hàng trắng liên tiếp: [start, end)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], blank.astype(np.int8), [0]))))
+    runs = [(s, e) for s, e in zip(edges[::2], edges[1::2]) if e - s >= min_gutter]
+    centers = np.array([(s + e) // 2 for s, e in runs], dtype=np.int64)
+
+    y_start = 0
+    skip_above = 0
+    while y_start < height:
+        target = y_start + tile_height
+        if target >= height:
+            yield y_start, height, skip_above
+            return
+
+        lo = y_start + int(tile_height * (1 - search_ratio))
+        candidates = centers[(centers >= lo) & (centers <= target)]
+        if len(candidates):
+            cut = int(candidates[-1])
+            yield y_start, cut, skip_above
+            y_start, skip_above = cut, 0
+        else:
+            yield y_start, target, skip_above
+            y_start, skip_above = target - overlap, overlap
+
+
+class TilePipeline:
+    """
+    Dây chuyền 3 công đoạn cho tiled OCR.
+
+    Args:
+        ocr_fn: Callable(tile_img) -> kết quả PaddleOCR của tile
+        group_fn: Callable(lines) -> list các line buffer (list[str]) theo thứ tự;
+            lines theo định dạng PaddleOCR, toạ độ toàn trang, đã khử trùng lặp
+        correct_fn: Callable(line_buffer) -> dòng đã sửa
+        queue_size: Số tile tối đa nằm chờ giữa hai công đoạn (giới hạn RAM)
+        iou_threshold: Ngưỡng overlap để coi hai box ở vùng chồng lấn là một
+    """
+
+    def __init__(self, ocr_fn, group_fn, correct_fn, queue_size=2, iou_threshold=0.5):
+        self.ocr_fn = ocr_fn
+        self.group_fn = group_fn
+        self.correct_fn = correct_fn
+        self.queue_size = queue_size
+        self.iou_threshold = iou_threshold
+
+    def _put(self, q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, stop):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    @staticmethod
+    def _iter_items(img, tiles):
+        """(tile, next_start, tile_img) cho từng tile"""
+        tiles = iter(tiles)
+        tile = next(tiles, None)
+        while tile is not None:
+            # Nhìn trước một tile để biết vùng chồng lấn với tile kế tiếp
+            next_tile = next(tiles, None)
+            next_start = next_tile[0] if next_tile is not None else None
+            y_start, y_end = tile[0], tile[1]
+            # Copy liên tục trong RAM -> Paddle không phải copy lại view
+            yield tile, next_start, np.ascontiguousarray(img[y_start:y_end])
+            tile = next_tile
+
+    def _prefetch(self, img, tiles, out_q, stop):
+        try:
+            for item in self._iter_items(img, tiles):
+                if not self._put(out_q, item, stop):
+                    return
+        except Exception as e:
+            self._put(out_q, _StageError(e), stop)
+            return
+        self._put(out_q, _DONE, stop)
+
+    def _recognize_tile(self, carry, item):
+        """
+        OCR một tile + NMS với box giữ lại từ tile trước.
+
+        Returns:
+            (carry, buffers) - carry: box nằm trong vùng chồng lấn với tile kế tiếp,
+            giữ lại để NMS với tile đó; buffers: các dòng đã chốt của tile này
+        """
+        tile, next_start, tile_img = item
+        y_start, y_end = tile[0], tile[1]
+        current = TileBlocks.from_result(self.ocr_fn(tile_img), y_start, y_end)
+        keep_prev, keep_curr = dedupe_blocks(carry, current, self.iou_threshold)
+        blocks = carry.take(keep_prev).concat(current.take(keep_curr))
+
+        held = held_lines(blocks, next_start, y_end)
+        return blocks.take(held), self.group_fn(blocks.take(~held).to_result_lines())
+
+    def _flush_carry(self, carry):
+        return self.group_fn(carry.to_result_lines()) if len(carry) else []
+
+    def _recognize(self, in_q, out_q, stop):
+        carry = TileBlocks()
+        while True:
+            item = self._get(in_q, stop)
+            if isinstance(item, _StageError):
+                self._put(out_q, item, stop)
+                return
+            if item is _DONE:
+                buffers = self._flush_carry(carry)
+                if buffers:
+                    self._put(out_q, buffers, stop)
+                self._put(out_q, _DONE, stop)
+                return
+
+            try:
+                carry, buffers = self._recognize_tile(carry, item)
+            except Exception as e:
+                self._put(out_q, _StageError(e), stop)
+                return
+            if not self._put(out_q, buffers, stop):
+                return
+
+    def _correct(self, in_q, out_q, stop):
+        while True:
+            item = self._get(in_q, stop)
+            if item is _DONE or isinstance(item, _StageError):
+                self._put(out_q, item, stop)
+                return
+            try:
+                for buffer in item:
+                    if not self._put(out_q, self.correct_fn(buffer), stop):
+                        return
+            except Exception as e:
+                self._put(out_q, _StageError(e), stop)
+                return
+
+    def run(self, img, tiles):
+        """
+        Chạy dây chuyền trên ảnh đã decode.
+
+        Args:
+            img: numpy array (H, W, C)
+            tiles: iterable các tuple bắt đầu bằng (y_start, y_end, ...) - truyền nguyên cho group_fn
+
+        Yields:
+            Từng dòng đã sửa, đúng thứ tự
+        """
+        stop = threading.Event()
+        tile_q = queue.Queue(maxsize=self.queue_size)
+        line_q = queue.Queue(maxsize=self.queue_size)
+        out_q = queue.Queue(maxsize=self.queue_size * 32)
+
+        workers = [
+            threading.Thread(target=self._prefetch, args=(img, tiles, tile_q, stop), name="tile-prefetch", daemon=True),
+            threading.Thread(target=self._recognize, args=(tile_q, line_q, stop), name="tile-ocr", daemon=True),
+            threading.Thread(target=self._correct, args=(line_q, out_q, stop), name="tile-correct", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while True:
+                item = out_q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exc
+                yield item
+        finally:
+            # Consumer dừng sớm (client ngắt) -> giải phóng các worker
+            stop.set()
+
+    async def arun(self, img, tiles, executor=None):
+        """
+        Bản async của run() cho event loop (FastAPI StreamingResponse).
+
+        Paddle inference chạy trong inference executor dùng chung; cắt tile và
+        correction chạy trong default executor của loop. Queue giữa các công đoạn
+        có giới hạn nên consumer chậm (client đọc chậm) sẽ làm dây chuyền dừng chờ
+        thay vì OCR trước cả trang vào RAM.
+
+        Args:
+            img, tiles: như run()
+            executor: Executor cho Paddle inference (mặc định get_inference_executor())
+
+        Yields:
+            Từng dòng đã sửa, đúng thứ tự
+        """
+        loop = asyncio.get_running_loop()
+        executor = executor or get_inference_executor()
+        tile_q = asyncio.Queue(maxsize=self.queue_size)
+        line_q = asyncio.Queue(maxsize=self.queue_size)
+        out_q = asyncio.Queue(maxsize=self.queue_size * 32)
+
+        async def prefetch():
+            items = self._iter_items(img, tiles)
+            try:
+                while True:
+                    item = await loop.run_in_executor(None, next, items, _DONE)
+                    await tile_q.put(item)
+                    if item is _DONE:
+                        return
+            except Exception as e:
+                await tile_q.put(_StageError(e))
+
+        async def recognize():
+            carry = TileBlocks()
+            while True:
+                item = await tile_q.get()
+                if isinstance(item, _StageError):
+                    await line_q.put(item)
+                    return
+                try:
+                    if item is _DONE:
+                        buffers = self._flush_carry(carry)
+                        if buffers:
+                            await line_q.put(buffers)
+                        await line_q.put(_DONE)
+                        return
+                    carry, buffers = await loop.run_in_executor(executor, self._recognize_tile, carry, item)
+                except Exception as e:
+                    await line_q.put(_StageError(e))
+                    return
+                await line_q.put(buffers)
+
+        async def correct():
+            while True:
+                item = await line_q.get()
+                if item is _DONE or isinstance(item, _StageError):
+                    await out_q.put(item)
+                    return
+                try:
+                    lines = await loop.run_in_executor(None, lambda: [self.correct_fn(b) for b in item])
+                except Exception as e:
+                    await out_q.put(_StageError(e))
+                    return
+                for line in lines:
+                    await out_q.put(line)
+
+        stages = [asyncio.ensure_future(stage()) for stage in (prefetch, recognize, correct)]
+        try:
+            while True:
+                item = await out_q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exc
+                yield item
+        finally:
+            # Consumer dừng sớm (client ngắt / aclose) -> huỷ các công đoạn.
+            # Tile đang chạy trong executor vẫn chạy hết nhưng không có tile mới.
+            for stage in stages:
+                stage.cancel()
@@ -1,6 +1,8 @@
 import os
 from hybrid_ocr_corrector import HybridOCR
 from collections import Counter
+from lexicon_artifact import publish_lexicon
+from paddle_batch import BatchOCR
 
 class AutoTrainer:
     def __init__(self):
@@ -14,33 +16,31 @@ class AutoTrainer:
 
         print(f"🔄 Scanning folder {folder_path} for training...")
         
-        for filename in os.listdir(folder_path):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                img_path = os.path.join(folder_path, filename)
-                print(f"   - Learning from {filename}...")
-                
-                # Chạy OCR
-                # Ở đây ta chỉ cần lấy text thô để phân tích tần suất từ
-                # Thay vì gọi process_tiled_stream (trả về string đã sửa), 
-                # ta cần can thiệp để lấy text GỐC từ PaddleOCR trước khi sửa
-                # Tuy nhiên, để đơn giản, ta dùng kết quả đã sửa để củng cố từ điển
-                
-                # Logic thông minh: 
-                # Nếu PaddleOCR nhận ra 1 từ với confidence > 0.95 -> Coi là từ đúng
-                # Thêm từ đó vào từ điển với tần suất +1
+        img_paths = [os.path.join(folder_path, filename) for filename in os.listdir(folder_path)
+                     if filename.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        
+        # Chạy OCR theo batch: detection từng ảnh, recognition gom dòng của nhiều ảnh
+        # Ở đây ta chỉ cần lấy text thô để phân tích tần suất từ
+        # (text GỐC từ PaddleOCR trước khi sửa, không qua process_tiled_stream)
+        batch = BatchOCR(self.engine.ocr, cls=True)
+        
+        for img_path, img in batch.iter_ocr(img_paths):
+            print(f"   - Learning from {os.path.basename(img_path)}...")
                 
-                img = self.engine.ocr.ocr(img_path, cls=True)
-                if img and img[0]:
-                    for line in img[0]:
-                        text = line[1][0]
-                        score = line[1][1]
-                        
-                        if score > 0.95: # Chỉ học từ những từ model chắc chắn đúng
-                            words = text.split()
-                            for word in words:
-                                # Chỉ học từ có tiếng Việt (bỏ qua số, ký tự lạ)
-                                if any(c.isalpha() for c in word):
-                                    self.new_words[word.lower()] += 1
+            # Logic thông minh: 
+            # Nếu PaddleOCR nhận ra 1 từ với confidence > 0.95 -> Coi là từ đúng
+            # Thêm từ đó vào từ điển với tần suất +1
+            if img and img[0]:
+                for line in img[0]:
+                    text = line[1][0]
+                    score = line[1][1]
+                    
+                    if score > 0.95: # Chỉ học từ những từ model chắc chắn đúng
+                        words = text.split()
+                        for word in words:
+                            # Chỉ học từ có tiếng Việt (bỏ qua số, ký tự lạ)
+                            if any(c.isalpha() for c in word):
+                                self.new_words[word.lower()] += 1
 
         self.update_dictionary()
 
@@ -73,6 +73,9 @@ class AutoTrainer:
         
         print("✅ Dictionary updated successfully!")
 
+        # Publish lexicon artifact mới -> API/worker tự hot-reload
+        publish_lexicon()
+
 if __name__ == "__main__":
     trainer = AutoTrainer()
     trainer.train_from_folder()
@@ -2,6 +2,8 @@ import os
 import time
 import ollama
 import logging
+from generation_guard import guarded_chat
+from grounding_parser import parse_grounding_output
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -10,6 +12,7 @@ class VlmOCR:
     def __init__(self, model_name="deepseek-ocr"):
         self.client = ollama.Client(host='http://127.0.0.1:11434')
         self.model_name = model_name
+        self.last_generation_stats = None
         logging.info(f"🚀 Initialized VlmOCR with model: {self.model_name}")
 
     def parse_grounding_output(self, raw_output):
@@ -18,17 +21,7 @@ class VlmOCR:
         Input: text with <|ref|>content<|/ref|><|det|>coords<|/det|> tags
         Output: clean text without tags
         """
-        import re
-        # Pattern to match paired grounding tags
-        pattern = r'<\|ref\|\>(.*?)<\|/ref\|\>\s*<\|det\|\>(.*?)<\|/det\|\>'
-        
-        # Extract all ref content (the actual text)
-        matches = re.findall(pattern, raw_output, re.DOTALL)
-        
-        # Combine all text parts
-        clean_text = '\n'.join([match[0] for match in matches])
-        
-        return clean_text if clean_text else raw_output
+        return parse_grounding_output(raw_output)
 
     def process_image(self, image_path, prompt="Free OCR.", clean_output=True):
         if not os.path.exists(image_path):
@@ -39,17 +32,18 @@ class VlmOCR:
         
         try:
             # Send to Ollama (VLM mode)
-            response = self.client.chat(
-                model=self.model_name,
+            content, self.last_generation_stats = guarded_chat(
+                self.client,
+                self.model_name,
                 messages=[{
                     'role': 'user',
                     'content': prompt,
                     'images': [image_path] # Ollama python lib handles file reading if path is provided
-                }]
+                }],
+                image=image_path
             )
             
             duration = time.time() - start_time
-            content = response['message']['content']
             
             # Parse grounding tags if requested
             if clean_output:
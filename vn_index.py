@@ -0,0 +1,253 @@
+"""
+Vietnamese Skeleton Index - tra ứng viên sửa lỗi không phân biệt dấu
+
+SymSpell (delete index, edit distance 2) coi mỗi dấu thanh / dấu mũ là một
+edit -> tập ứng viên rất lớn, trong khi lỗi OCR tiếng Việt phổ biến nhất là
+sai hoặc mất dấu: 'djnh' -> 'định', 'vOn' -> 'vốn'.
+
+Index này key theo "skeleton" của từ: bỏ dấu, đ -> d, chữ thường, chuẩn hoá
+nhầm lẫn OCR (j -> i). Mọi biến thể dấu của một từ rơi vào cùng một key nên
+tra cứu là một lần dict lookup. Ứng viên được xếp theo khoảng cách dấu
+(mất dấu rẻ hơn sai dấu) rồi theo tần suất.
+
+Lỗi chữ cái thật (không phải dấu) được bắt bằng delete index khoảng cách 1
+trên skeleton - nhỏ hơn nhiều so với delete index trên từ có dấu.
+
+Từ điển không bao giờ đủ: từ không có trong từ điển chưa chắc là lỗi. lookup() chỉ
+sửa khi có tín hiệu lỗi thật (không phải âm tiết tiếng Việt hợp lệ: 'djnh', 'cOng',
+'vOn' - hoa/thường lẫn lộn) và ứng viên thắng rõ (khoảng cách nhỏ hơn hoặc tần suất
+gấp FREQUENCY_MARGIN lần ứng viên kế tiếp). 'của', 'hóa', 'Quảng' giữ nguyên.
+
+Từ mất hết dấu ('dinh', 'quyet') vẫn là âm tiết hợp lệ nên không có tín hiệu lỗi, nhưng
+đây là lỗi OCR phổ biến nhất: token không dấu được sửa khi skeleton của nó chỉ có một
+từ trong từ điển hoặc một từ trội hẳn về tần suất (FREQUENCY_MARGIN). Token đã có dấu
+mà hợp lệ thì không bao giờ bị đổi, token 1 chữ cái ('y', 'a') cũng không.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+# Nhầm lẫn OCR -> chữ cái gốc (tiếng Việt không dùng 'j')
+OCR_CONFUSIONS = {'j': 'i'}
+
+# Dấu thanh (tone) và dấu biến âm (mũ, móc, trăng) - tách riêng để tính khoảng cách
+TONE_MARKS = {'\u0300', '\u0301', '\u0303', '\u0309', '\u0323'}   # huyền, sắc, ngã, hỏi, nặng
+SHAPE_MARKS = {'\u0302', '\u0306', '\u031b'}                      # mũ, trăng, móc
+
+# Chi phí khi từ OCR thiếu dấu mà ứng viên có (lỗi phổ biến nhất) / khi dấu khác nhau
+MISSING_MARK_COST = 0.5
+WRONG_MARK_COST = 1.0
+
+# Ứng viên tốt nhất phải có count >= FREQUENCY_MARGIN x ứng viên kế tiếp (khi cùng khoảng cách)
+FREQUENCY_MARGIN = 2.0
+
+# Cấu trúc âm tiết (trên chữ gốc, đ -> d): phụ âm đầu? + nguyên âm (1-3) + phụ âm cuối?
+SYLLABLE_PATTERN = re.compile(
+    r'(ngh|ng|nh|ch|gh|gi|kh|ph|qu|th|tr|[bcdghklmnprstvx])?'
+    r'(?P<vowels>[aeiouy]{1,3})'
+    r'(?P<final>ch|ng|nh|[cmnpt])?'
+)
+# Âm tiết tắc (kết thúc p/t/c/ch) chỉ mang thanh sắc hoặc nặng
+STOP_FINALS = {'c', 'ch', 'p', 't'}
+STOP_TONES = {'\u0301', '\u0323'}
+
+
+def iter_dictionary_entries(path, encoding='utf-8'):
+    """vn_dictionary.txt (mỗi dòng: 'cụm từ <count>') -> (list từ, count)"""
+    with open(path, 'r', encoding=encoding) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 2 or not parts[-1].isdigit():
+                continue
+            yield parts[:-1], int(parts[-1])
+
+
+def _decompose(ch):
+    """Ký tự (NFC) -> (chữ gốc skeleton, dấu thanh, dấu biến âm)"""
+    lower = ch.lower()
+    if lower == 'đ':
+        return 'd', None, 'đ'
+    decomposed = unicodedata.normalize('NFD', lower)
+    base = OCR_CONFUSIONS.get(decomposed[0], decomposed[0])
+    tone = shape = None
+    for mark in decomposed[1:]:
+        if mark in TONE_MARKS:
+            tone = mark
+        elif mark in SHAPE_MARKS:
+            shape = mark
+    return base, tone, shape
+
+
+def skeleton(word):
+    """'Định' -> 'dinh', 'djnh' -> 'dinh', 'vOn' -> 'von'"""
+    return ''.join(_decompose(ch)[0] for ch in unicodedata.normalize('NFC', word))
+
+
+def mark_distance(word, candidate):
+    """
+    Khoảng cách dấu giữa hai từ cùng skeleton (cùng độ dài sau NFC).
+    Thiếu dấu: MISSING_MARK_COST, sai dấu: WRONG_MARK_COST, cho dấu thanh và dấu biến âm riêng.
+    """
+    distance = 0.0
+    for a, b in zip(unicodedata.normalize('NFC', word), candidate):
+        if a == b:
+            continue
+        _, tone_a, shape_a = _decompose(a)
+        _, tone_b, shape_b = _decompose(b)
+        for mark_a, mark_b in ((tone_a, tone_b), (shape_a, shape_b)):
+            if mark_a != mark_b:
+                distance += MISSING_MARK_COST if mark_a is None else WRONG_MARK_COST
+    return distance
+
+
+def is_valid_syllable(word):
+    """
+    Âm tiết tiếng Việt hợp lệ về cấu trúc ('của', 'Thường', 'ban') - không cần có trong từ điển.
+    'djnh' (j), 'hdnd', 'tiếq', 'hàt' (thanh huyền + âm tắc) không hợp lệ.
+    """
+    bases, tones = [], []
+    for ch in unicodedata.normalize('NFC', word.lower()):
+        if ch == 'đ':
+            bases.append('d')
+            continue
+        decomposed = unicodedata.normalize('NFD', ch)
+        bases.append(decomposed[0])
+        tones.extend(mark for mark in decomposed[1:] if mark in TONE_MARKS)
+    match = SYLLABLE_PATTERN.fullmatch(''.join(bases))
+    if match is None or len(tones) > 1:
+        return False
+    if match.group('final') in STOP_FINALS and tones and tones[0] not in STOP_TONES:
+        return False
+    return True
+
+
+def has_marks(word):
+    """Token có dấu thanh / dấu biến âm / đ (OCR không làm mất hết dấu)"""
+    return any(_decompose(ch)[1:] != (None, None) for ch in unicodedata.normalize('NFC', word))
+
+
+def has_error_signal(word):
+    """Token OCR (giữ hoa/thường) có dấu hiệu lỗi: hoa/thường lẫn lộn giữa từ hoặc không phải âm tiết hợp lệ"""
+    if not word.isupper() and any(ch.isupper() for ch in word[1:]):
+        return True
+    return not is_valid_syllable(word)
+
+
+def clear_winner(ranked, margin=FREQUENCY_MARGIN):
+    """
+    [(từ, distance, count)] đã xếp hạng -> từ tốt nhất nếu thắng rõ, ngược lại None.
+    Thắng rõ: là ứng viên duy nhất, gần hơn ứng viên kế tiếp, hoặc count >= margin x count kế tiếp.
+    """
+    if not ranked:
+        return None
+    if len(ranked) == 1:
+        return ranked[0][0]
+    (best, distance, count), (_, next_distance, next_count) = ranked[0], ranked[1]
+    if distance < next_distance or count >= margin * next_count:
+        return best
+    return None
+
+
+def _deletes(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class VietnameseIndex:
+    """
+    Usage:
+        index = VietnameseIndex.from_dictionary('vn_dictionary.txt')
+        index.lookup('djnh')   # -> 'định'
+        index.lookup('của')    # -> None (âm tiết hợp lệ, không sửa)
+        'định' in index        # từ đã có trong từ điển
+    """
+
+    def __init__(self, max_fallback_distance=1, min_fallback_length=4, margin=FREQUENCY_MARGIN):
+        self.words = {}                      # từ (NFC, lowercase) -> count
+        self.skeletons = defaultdict(list)   # skeleton -> [từ], sắp theo count giảm dần
+        self.deletes = defaultdict(set)      # skeleton bỏ 1 ký tự -> {skeleton}
+        self.max_fallback_distance = max_fallback_distance
+        # Từ ngắn: delete-1 cho ra quá nhiều ứng viên vô nghĩa -> không fallback
+        self.min_fallback_length = min_fallback_length
+        self.margin = margin
+
+    @classmethod
+    def from_dictionary(cls, path, **kwargs):
+        index = cls(**kwargs)
+        for words, count in iter_dictionary_entries(path):
+            for word in words:
+                index.add(word, count)
+        index.finalize()
+        return index
+
+    def add(self, word, count=1):
+        word = unicodedata.normalize('NFC', word.lower())
+        self.words[word] = self.words.get(word, 0) + count
+
+    def finalize(self):
+        """Xây lại các bảng tra sau khi add()"""
+        self.skeletons.clear()
+        self.deletes.clear()
+        for word in self.words:
+            self.skeletons[skeleton(word)].append(word)
+        for key, words in self.skeletons.items():
+            words.sort(key=lambda w: -self.words[w])
+            if self.max_fallback_distance and len(key) >= self.min_fallback_length:
+                for deleted in _deletes(key):
+                    self.deletes[deleted].add(key)
+
+    def __contains__(self, word):
+        return unicodedata.normalize('NFC', word.lower()) in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    def _fallback_keys(self, key):
+        """Skeleton cách key đúng 1 edit (thay / thêm / bớt ký tự)"""
+        if len(key) < self.min_fallback_length - 1 or not self.max_fallback_distance:
+            return set()
+        keys = set(self.deletes.get(key, ()))                  # key thiếu 1 ký tự
+        for deleted in _deletes(key):
+            if deleted in self.skeletons and len(deleted) >= self.min_fallback_length:
+                keys.add(deleted)                              # key thừa 1 ký tự
+            keys.update(self.deletes.get(deleted, ()))         # thay 1 ký tự
+        keys.discard(key)
+        return keys
+
+    def candidates(self, word):
+        """
+        Ứng viên đã xếp hạng: [(từ, distance, count)].
+        Cùng skeleton: distance = mark_distance; không có -> skeleton khác 1 chữ cái, distance = 1.
+        """
+        word = unicodedata.normalize('NFC', word.lower())
+        key = skeleton(word)
+        ranked = [(c, mark_distance(word, c), self.words[c]) for c in self.skeletons.get(key, ())]
+        if not ranked:
+            for other in sorted(self._fallback_keys(key)):
+                ranked.extend((c, 1.0, self.words[c]) for c in self.skeletons[other])
+        ranked.sort(key=lambda item: (item[1], -item[2]))
+        return ranked
+
+    def lookup(self, word):
+        """
+        Từ đã sửa (lowercase) hoặc None.
+        Có trong từ điển -> chính nó; có tín hiệu lỗi (has_error_signal) -> ứng viên thắng
+        rõ (clear_winner); âm tiết hợp lệ không dấu -> ứng viên cùng skeleton duy nhất /
+        trội hẳn về tần suất; còn lại None, tức là giữ nguyên token.
+        """
+        lower = unicodedata.normalize('NFC', word.lower())
+        if lower in self.words:
+            return lower
+        if has_error_signal(word):
+            return clear_winner(self.candidates(lower), self.margin)
+        if has_marks(lower) or len(lower) < 2:
+            return None
+        # Mất hết dấu: chỉ xét từ cùng skeleton (đã sắp theo count), không fallback 1 chữ cái
+        same = self.skeletons.get(skeleton(lower), ())
+        return clear_winner([(c, 0.0, self.words[c]) for c in same], self.margin)
+
+    def stats(self):
+        return {
+            'words': len(self.words),
+            'skeletons': len(self.skeletons),
+            'delete_keys': len(self.deletes),
+        }